@@ -0,0 +1,108 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+from app.tree_templates import is_admin
+from app.auth import principal_cache, invalidate_principal
+from app.database import pool_metrics
+from app import repository, catalog, simulator, scheduler
+from app.scrapers import audio_pool
+
+router = APIRouter()
+
+class AdminFlag(BaseModel):
+    is_admin: bool
+
+class DropSimulation(BaseModel):
+    draws: int = Field(1_000_000, ge=1, le=simulator.MAX_SIMULATION_DRAWS)
+    seed: Optional[int] = None
+    # Probabilidades propuestas por id de plantilla (o nombre); el resto se mantiene
+    probabilities: Dict[str, float] = {}
+
+@router.get("/admin/indexes")
+async def get_index_report(current_user = Depends(is_admin)):
+    """
+    Informe de índices faltantes, no declarados y sin uso (solo admin)
+    """
+    return await repository.find_index_report()
+
+@router.get("/admin/cache-stats")
+async def get_cache_stats(current_user = Depends(is_admin)):
+    """
+    Aciertos, fallos y ocupación de las cachés en memoria de este worker (solo admin)
+    """
+    return {"principal": principal_cache.stats()}
+
+@router.get("/admin/db-pool")
+async def get_db_pool_metrics(current_user = Depends(is_admin)):
+    """
+    Ocupación del pool de conexiones de MongoDB de este worker (solo admin)
+    """
+    return pool_metrics.snapshot()
+
+@router.get("/admin/propagation-jobs")
+async def get_propagation_jobs(current_user = Depends(is_admin)):
+    """
+    Progreso de la propagación de cambios de plantillas a los árboles (solo admin)
+    """
+    return await repository.find_propagation_jobs()
+
+@router.get("/admin/drop-analytics")
+async def get_drop_analytics(hours: int = Query(24, ge=1, le=24 * 90), current_user = Depends(is_admin)):
+    """
+    Árboles otorgados frente a los esperados por plantilla en las últimas
+    `hours` horas, con una prueba chi-cuadrado de desviación (solo admin)
+    """
+    return await repository.find_drop_report(hours)
+
+@router.get("/admin/audio-pool")
+async def get_audio_pool(current_user = Depends(is_admin)):
+    """
+    URLs de audio de bosque disponibles y cuándo se comprobaron (solo admin)
+    """
+    return audio_pool.pool_status()
+
+@router.get("/admin/scheduler")
+async def get_scheduler(current_user = Depends(is_admin)):
+    """
+    Estado de las tareas programadas del worker: última ejecución, errores y
+    próxima ejecución (solo admin)
+    """
+    return scheduler.scheduler_status()
+
+@router.post("/admin/simulate-drops")
+async def simulate_drops(simulation: DropSimulation, current_user = Depends(is_admin)):
+    """
+    Simula los árboles otorgados con el catálogo actual o con probabilidades
+    propuestas, sin guardar nada (solo admin)
+    """
+    tree_catalog = await catalog.get_catalog()
+    try:
+        if simulation.probabilities:
+            tree_catalog = simulator.with_probabilities(tree_catalog, simulation.probabilities)
+        # La simulación usa la CPU: se ejecuta fuera del bucle de eventos
+        return await run_in_threadpool(simulator.simulate, tree_catalog, simulation.draws, simulation.seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.put("/admin/users/{username}/admin")
+async def set_user_admin(username: str, flag: AdminFlag, current_user = Depends(is_admin)):
+    """
+    Concede o retira los privilegios de administrador de un usuario (solo admin)
+    """
+    result = await repository.set_user_admin(username, flag.is_admin)
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    invalidate_principal(username)
+    return {"message": "Permisos actualizados correctamente"}
+
+@router.delete("/admin/users/{username}")
+async def delete_user(username: str, current_user = Depends(is_admin)):
+    """
+    Elimina un usuario, su bosque y su archivo (solo admin)
+    """
+    deleted = await repository.delete_user(username)
+    invalidate_principal(username)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return {"message": "Usuario eliminado correctamente"}
@@ -0,0 +1,147 @@
+"""
+Analítica de los árboles otorgados frente a las probabilidades configuradas.
+
+Cada pomodoro completado deja:
+
+- Un evento compacto en drop_events {u, k, v, at} (usuario, clave de la entrada
+  del catálogo, versión del catálogo y fecha), que caduca a los
+  DROP_EVENTS_TTL_DAYS días gracias a un índice TTL.
+- Un incremento en el contador horario de drop_stats. Hay un documento por hora
+  y versión del catálogo, con el número de árboles de cada entrada y, la primera
+  vez, una copia de las probabilidades de esa versión. Así el número esperado de
+  cada plantilla en una ventana de tiempo es exacto aunque las probabilidades
+  hayan cambiado dentro de ella.
+
+El informe solo lee los contadores de la ventana pedida (un documento por hora
+y versión), nunca los inventarios de los usuarios.
+"""
+import asyncio
+import math
+import os
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+# Días que se conservan los eventos individuales
+DROP_EVENTS_TTL_DAYS = int(os.getenv("DROP_EVENTS_TTL_DAYS", "90"))
+
+# Nivel de significación por debajo del cual se marca una desviación
+DEVIATION_P_VALUE = 0.001
+
+# La prueba chi-cuadrado no es fiable con menos árboles esperados por entrada
+MIN_EXPECTED_COUNT = 5
+
+def hour_bucket(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+async def record_drops(db, user_id, tree_catalog, entries: list, tree_ids: list):
+    """Registra los árboles otorgados en una petición (eventos y contadores)"""
+    now = datetime.utcnow()
+    hour = hour_bucket(now)
+
+    events = db.drop_events.insert_many([
+        {"_id": tree_id, "u": ObjectId(user_id), "k": entry.key, "v": tree_catalog.version, "at": now}
+        for tree_id, entry in zip(tree_ids, entries)
+    ], ordered=False)
+
+    increments = {"total": len(entries)}
+    for entry in entries:
+        increments[f"counts.{entry.key}"] = increments.get(f"counts.{entry.key}", 0) + 1
+    total_weight = tree_catalog.total
+    counters = db.drop_stats.update_one(
+        {"_id": f"{hour:%Y-%m-%dT%H}:{tree_catalog.version}"},
+        {
+            "$inc": increments,
+            "$setOnInsert": {
+                "hour": hour,
+                "version": tree_catalog.version,
+                "catalog": {
+                    entry.key: {
+                        "name": entry.name,
+                        "p": max(entry.probability, 0.0) / total_weight if total_weight > 0 else 1 / len(tree_catalog)
+                    }
+                    for entry in tree_catalog.entries
+                }
+            }
+        },
+        upsert=True
+    )
+
+    # Las dos escrituras son independientes
+    await asyncio.gather(events, counters)
+
+def chi_square_p_value(statistic: float, degrees: int) -> float:
+    """
+    Probabilidad de obtener un estadístico chi-cuadrado mayor o igual por azar
+    (aproximación de Wilson-Hilferty, suficiente para marcar desviaciones).
+    """
+    if degrees <= 0:
+        return 1.0
+    scale = 2 / (9 * degrees)
+    z = ((statistic / degrees) ** (1 / 3) - (1 - scale)) / math.sqrt(scale)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+async def drop_report(db, hours: int = 24) -> dict:
+    """
+    Compara los árboles otorgados en las últimas `hours` horas con los que
+    se esperaban según las probabilidades vigentes en cada momento.
+
+    low_counts indica que alguna entrada esperaba menos de MIN_EXPECTED_COUNT
+    árboles; esas entradas se agrupan en la prueba chi-cuadrado para que no
+    marquen una desviación que solo es ruido.
+    """
+    since = hour_bucket(datetime.utcnow() - timedelta(hours=hours - 1))
+    observed = {}
+    expected = {}
+    names = {}
+    total = 0
+    async for bucket in db.drop_stats.find({"hour": {"$gte": since}}):
+        total += bucket.get("total", 0)
+        for key, info in bucket.get("catalog", {}).items():
+            names[key] = info["name"]
+            expected[key] = expected.get(key, 0.0) + bucket.get("total", 0) * info["p"]
+        for key, count in bucket.get("counts", {}).items():
+            observed[key] = observed.get(key, 0) + count
+
+    templates = []
+    # Celdas de la prueba chi-cuadrado: (observados, esperados). Las entradas con
+    # menos de MIN_EXPECTED_COUNT árboles esperados se agrupan en una sola celda
+    cells = []
+    pooled_count = 0
+    pooled_mean = 0.0
+    for key in sorted(set(expected) | set(observed), key=lambda key: -expected.get(key, 0.0)):
+        count = observed.get(key, 0)
+        mean = expected.get(key, 0.0)
+        residual = (count - mean) / math.sqrt(mean) if mean > 0 else None
+        if mean >= MIN_EXPECTED_COUNT:
+            cells.append((count, mean))
+        elif mean > 0:
+            pooled_count += count
+            pooled_mean += mean
+        templates.append({
+            "key": key,
+            "name": names.get(key, key),
+            "observed": count,
+            "expected": mean,
+            "observed_rate": count / total if total else 0.0,
+            "expected_rate": mean / total if total else 0.0,
+            # Residuo estandarizado: más de 3 en valor absoluto es sospechoso
+            "residual": residual
+        })
+
+    # Si ni agrupadas llegan al mínimo, esas entradas quedan fuera de la prueba
+    if pooled_mean >= MIN_EXPECTED_COUNT:
+        cells.append((pooled_count, pooled_mean))
+    statistic = sum((count - mean) ** 2 / mean for count, mean in cells)
+    degrees = len(cells) - 1
+    p_value = chi_square_p_value(statistic, degrees) if total else 1.0
+    return {
+        "since": since.isoformat(),
+        "hours": hours,
+        "total": total,
+        "templates": templates,
+        "chi_square": statistic,
+        "degrees_of_freedom": max(degrees, 0),
+        "p_value": p_value,
+        "deviation": p_value < DEVIATION_P_VALUE,
+        "low_counts": any(0 < template["expected"] < MIN_EXPECTED_COUNT for template in templates)
+    }
@@ -0,0 +1,171 @@
+"""
+Archivo en frío de los árboles antiguos.
+
+Los árboles con más de TREE_ARCHIVE_AFTER_DAYS días salen de user_trees y se
+guardan en la colección tree_archive en lotes comprimidos (BSON + zlib) por
+usuario y mes. Así la colección caliente y su índice solo contienen el bosque
+reciente, sin importar la antigüedad de la cuenta.
+
+Los árboles compactos (template_id) se archivan con los datos de su plantilla
+copiados, de modo que el archivo no depende de plantillas que pueden
+editarse o eliminarse después. Los árboles archivados son de solo lectura:
+cada lote guarda sus _id sin comprimir (tree_ids) para que la API pueda
+reconocerlos y rechazar su edición o borrado.
+
+Ejecución manual:
+
+    python -m app.archive              # Archiva con la antigüedad configurada
+    python -m app.archive --days 60    # Archiva árboles con más de 60 días
+    python -m app.archive --dry-run    # Solo muestra lo que se archivaría
+"""
+import os
+import zlib
+from datetime import datetime, timedelta
+import bson
+from bson import Binary
+
+# Antigüedad (en días) a partir de la cual un árbol pasa al archivo
+ARCHIVE_AFTER_DAYS = int(os.getenv("TREE_ARCHIVE_AFTER_DAYS", "30"))
+
+# Número máximo de árboles por lote comprimido (también es el tamaño de página al leer)
+ARCHIVE_CHUNK_SIZE = 500
+
+# Campos de detalle de un árbol que puede aportar su plantilla
+TREE_DETAIL_FIELDS = ("name", "category", "description", "image_url")
+
+def compress_trees(trees: list) -> Binary:
+    """Serializa y comprime una lista de árboles"""
+    return Binary(zlib.compress(bson.encode({"trees": trees})))
+
+def decompress_trees(data: bytes) -> list:
+    """Operación inversa de compress_trees"""
+    return bson.decode(zlib.decompress(data))["trees"]
+
+def expand_tree(tree: dict, templates: dict) -> dict:
+    """
+    Copia en un árbol compacto los datos de su plantilla y quita template_id.
+    Los campos propios del árbol tienen prioridad; si la plantilla no está en
+    templates el árbol se deja como está.
+    """
+    template = templates.get(tree.get("template_id"))
+    if template is None:
+        return tree
+    expanded = {key: value for key, value in tree.items() if key != "template_id"}
+    for field in TREE_DETAIL_FIELDS:
+        if field not in expanded and field in template:
+            expanded[field] = template[field]
+    return expanded
+
+async def find_templates(db, trees: list, templates: dict) -> dict:
+    """Añade a templates (caché de la ejecución) las plantillas de los árboles que falten"""
+    missing = {tree["template_id"] for tree in trees if tree.get("template_id")} - templates.keys()
+    if missing:
+        projection = {field: 1 for field in TREE_DETAIL_FIELDS}
+        async for template in db.trees.find({"_id": {"$in": list(missing)}}, projection):
+            templates[template["_id"]] = template
+    return templates
+
+def build_chunk(user_id, month: str, trees: list, templates: dict = None) -> dict:
+    """
+    Construye el documento de archivo de un lote de árboles de un usuario y mes.
+
+    Los árboles compactos se guardan con los datos de su plantilla (templates:
+    {_id: plantilla}). El _id es determinista, de modo que repetir un lote
+    interrumpido lo reemplaza en lugar de duplicarlo.
+    """
+    templates = templates or {}
+    stored = [
+        {key: value for key, value in expand_tree(tree, templates).items() if key != "user_id"}
+        for tree in trees
+    ]
+    return {
+        "_id": f"{user_id}:{month}:{trees[0]['_id']}",
+        "user_id": user_id,
+        "month": month,
+        "count": len(trees),
+        "tree_ids": [tree["_id"] for tree in trees],
+        "first_at": trees[0]["created_at"],
+        "last_at": trees[-1]["created_at"],
+        "data": compress_trees(stored)
+    }
+
+async def _flush(db, user_id, month: str, trees: list, templates: dict, dry_run: bool):
+    if dry_run:
+        return
+    chunk = build_chunk(user_id, month, trees, await find_templates(db, trees, templates))
+    tree_ids = [tree["_id"] for tree in trees]
+    # Primero se guarda el lote y después se borran los árboles calientes
+    await db.tree_archive.replace_one({"_id": chunk["_id"]}, chunk, upsert=True)
+    await db.user_trees.delete_many({"_id": {"$in": tree_ids}})
+
+async def archive_old_trees(db, older_than_days: int = ARCHIVE_AFTER_DAYS, dry_run: bool = False):
+    """
+    Mueve al archivo los árboles creados hace más de older_than_days días.
+
+    Returns:
+        Un diccionario con el número de árboles y lotes archivados.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    # Este orden recorre el índice user_trees_by_date al revés, sin ordenar en memoria
+    cursor = db.user_trees.find({"created_at": {"$lt": cutoff}}).sort(
+        [("user_id", -1), ("created_at", 1), ("_id", 1)]
+    )
+
+    archived_trees = 0
+    chunks = 0
+    pending = []
+    pending_key = None
+    templates = {}
+
+    async for tree in cursor:
+        key = (tree["user_id"], tree["created_at"].strftime("%Y-%m"))
+        if pending and (key != pending_key or len(pending) >= ARCHIVE_CHUNK_SIZE):
+            await _flush(db, *pending_key, pending, templates, dry_run)
+            archived_trees += len(pending)
+            chunks += 1
+            pending = []
+        pending_key = key
+        pending.append(tree)
+
+    if pending:
+        await _flush(db, *pending_key, pending, templates, dry_run)
+        archived_trees += len(pending)
+        chunks += 1
+
+    return {"archived_trees": archived_trees, "chunks": chunks, "cutoff": cutoff.isoformat(), "dry_run": dry_run}
+
+async def find_archive_chunk(db, user_id, before: str = None):
+    """
+    Devuelve el lote archivado más reciente del usuario, o el anterior a `before`.
+
+    Los lotes se recorren del mes más reciente al más antiguo; cada lote
+    contiene como máximo ARCHIVE_CHUNK_SIZE árboles.
+    """
+    query = {"user_id": user_id}
+    if before:
+        previous = await db.tree_archive.find_one({"_id": before, "user_id": user_id}, {"month": 1})
+        if not previous:
+            return None
+        query["$or"] = [
+            {"month": {"$lt": previous["month"]}},
+            {"month": previous["month"], "_id": {"$lt": before}}
+        ]
+    return await db.tree_archive.find_one(query, sort=[("month", -1), ("_id", -1)])
+
+async def is_archived_tree(db, user_id, tree_id) -> bool:
+    """Indica si el árbol está en algún lote archivado del usuario"""
+    return await db.tree_archive.find_one({"user_id": user_id, "tree_ids": tree_id}, {"_id": 1}) is not None
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import json
+    from app.database import get_async_db
+
+    parser = argparse.ArgumentParser(description="Archiva los árboles antiguos en lotes comprimidos")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="Antigüedad mínima en días")
+    parser.add_argument("--dry-run", action="store_true", help="No modificar la base de datos")
+    args = parser.parse_args()
+
+    result = asyncio.run(archive_old_trees(get_async_db(), args.days, args.dry_run))
+    print(json.dumps(result, indent=4, ensure_ascii=False))
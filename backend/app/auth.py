@@ -5,7 +5,9 @@ from typing import Optional
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from app.database import db
+import os
+from app import repository
+from app.cache import TTLCache
 
 router = APIRouter()
 
@@ -20,6 +22,12 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Caché de principales por nombre de usuario: evita consultar MongoDB en cada petición
+principal_cache = TTLCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+)
+
 # Models
 class User(BaseModel):
     username: str
@@ -40,20 +48,53 @@ def get_password_hash(password):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_user(username: str):
-    user_data = db.users.find_one({"username": username})
+# Campos del principal: identidad y contadores, nunca datos que crecen con el usuario
+PRINCIPAL_FIELDS = ("username", "is_admin", "token_version", "pomodoros_completed", "total_focus_minutes", "total_trees")
+
+async def get_user(username: str, fields=PRINCIPAL_FIELDS):
+    """
+    Carga un usuario con solo los campos indicados (además de _id).
+    Con fields=None se carga el documento completo.
+    """
+    projection = list(fields) if fields is not None else None
+    user_data = await repository.find_user_by_username(username, projection)
     if user_data:
+        # Asegurar que el usuario tenga un campo id (para compatibilidad)
+        user_data["id"] = str(user_data["_id"])
         return user_data
     return None
 
-def authenticate_user(username: str, password: str):
-    user = get_user(username)
+async def load_user_fields(current_user: dict, *fields):
+    """
+    Carga bajo demanda campos del usuario que no forman parte del principal.
+
+    Returns:
+        Un diccionario con los campos pedidos (los que no existan se omiten).
+    """
+    user_data = await repository.find_user_by_id(current_user["id"], list(fields))
+    return user_data or {}
+
+async def authenticate_user(username: str, password: str):
+    user = await get_user(username, PRINCIPAL_FIELDS + ("hashed_password",))
     if not user:
         return False
     if not verify_password(password, user["hashed_password"]):
         return False
     return user
 
+def token_claims(user: dict) -> dict:
+    """
+    Claims del token: además del nombre de usuario incluyen su id, si es
+    administrador y su versión de token. get_current_identity comprueba la
+    versión (y el rol) con el principal en caché, no con estos claims.
+    """
+    return {
+        "sub": user["username"],
+        "uid": str(user["_id"]),
+        "adm": bool(user.get("is_admin", False)),
+        "ver": user.get("token_version", 0)
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -64,29 +105,84 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def decode_token(token: str) -> dict:
+    """Verifica la firma y la caducidad del token y devuelve sus claims"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = get_user(username=token_data.username)
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
+
+def check_token_version(payload: dict, user: dict):
+    """Rechaza los tokens emitidos antes del último incremento de token_version"""
+    if payload.get("ver", 0) < user.get("token_version", 0):
+        raise credentials_exception
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    payload = decode_token(token)
+    token_data = TokenData(username=payload["sub"])
+    # Los contadores del principal pueden tener hasta PRINCIPAL_CACHE_TTL segundos de
+    # antigüedad; los endpoints que los muestran los leen con load_user_fields
+    cached = principal_cache.get(token_data.username)
+    if cached is not None:
+        check_token_version(payload, cached)
+        # Copia para que los handlers no modifiquen la entrada de la caché
+        return dict(cached)
+    
+    # Solo se carga el principal ligero; los campos pesados se piden con load_user_fields
+    user = await get_user(username=token_data.username)
     if user is None:
         raise credentials_exception
     
-    # Asegurar que el usuario tenga un campo id (para compatibilidad)
-    if "id" not in user and "_id" in user:
-        user["id"] = str(user["_id"])
-        
-    return user
+    principal_cache.set(token_data.username, user)
+    check_token_version(payload, user)
+    return dict(user)
+
+async def get_current_identity(token: str = Depends(oauth2_scheme)):
+    """
+    Autenticación ligera para los endpoints que solo necesitan saber quién es
+    el usuario (id, username e is_admin).
+
+    Comparte con get_current_user la caché de principales: si el principal no
+    está en la caché de este worker se carga (solo los campos ligeros) y se
+    guarda. Así siempre se comprueba token_version y is_admin sale del registro
+    del usuario, no del token: un token revocado, de un usuario borrado o con
+    un rol de administrador retirado deja de valer como mucho tras
+    PRINCIPAL_CACHE_TTL segundos en cualquier worker.
+    Los tokens antiguos, sin uid, pasan por get_current_user.
+    """
+    payload = decode_token(token)
+    if "uid" not in payload:
+        return await get_current_user(token)
+
+    principal = principal_cache.get(payload["sub"])
+    if principal is None:
+        principal = await get_user(username=payload["sub"])
+        if principal is None:
+            raise credentials_exception
+        principal_cache.set(payload["sub"], principal)
+    # Un usuario borrado y vuelto a crear con el mismo nombre es otro usuario
+    if principal["id"] != payload["uid"]:
+        raise credentials_exception
+    check_token_version(payload, principal)
+
+    return {
+        "id": principal["id"],
+        "username": principal["username"],
+        "is_admin": bool(principal.get("is_admin", False))
+    }
+
+def invalidate_principal(username: str):
+    """Descarta el principal cacheado tras cambiar el registro del usuario"""
+    principal_cache.invalidate(username)
 
 async def is_admin(current_user = Depends(get_current_user)):
     """
@@ -98,34 +194,35 @@ async def is_admin(current_user = Depends(get_current_user)):
 # Endpoints
 @router.post("/register", response_model=Token)
 async def register_user(user: User):
-    db_user = get_user(user.username)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
     hashed_password = get_password_hash(user.password)
     user_data = {
         "username": user.username,
         "hashed_password": hashed_password,
         "email": user.email,
-        "trees": [],
+        "total_trees": 0,
+        "token_version": 0,
         # Añadir campos de estadísticas inicializados
         "pomodoros_completed": 0,
         "total_focus_minutes": 0
     }
     
-    result = db.users.insert_one(user_data)
+    # Una sola escritura: el índice único de username detecta los duplicados
+    user_data["_id"] = await repository.insert_user(user_data)
+    if user_data["_id"] is None:
+        raise HTTPException(status_code=400, detail="Username already registered")
+    invalidate_principal(user.username)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=token_claims(user_data), expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -134,6 +231,19 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user["username"]}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/logout-all")
+async def logout_all_sessions(current_user = Depends(get_current_user)):
+    """
+    Revoca todos los tokens emitidos hasta ahora para el usuario actual
+    incrementando su token_version
+    """
+    user = await repository.bump_token_version(current_user["username"], list(PRINCIPAL_FIELDS))
+    if user:
+        # El principal actualizado permite rechazar los tokens antiguos sin consultar MongoDB
+        user["id"] = str(user["_id"])
+        principal_cache.set(current_user["username"], user)
+    return {"message": "Sesiones cerradas correctamente"}
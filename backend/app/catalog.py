@@ -0,0 +1,244 @@
+"""
+Catálogo en memoria de los tipos de árbol que se pueden conseguir.
+
+El catálogo es una instantánea inmutable: las plantillas se guardan en tuplas
+compactas junto a una tabla alias (app.sampler), de modo que elegir un árbol
+cuesta O(1) y no consulta la base de datos. Se construye al arrancar y se
+reconstruye entero cuando un administrador modifica las plantillas; las
+peticiones en curso siguen usando la instantánea anterior.
+
+Cada worker tiene su propia instantánea. Para que todos vean los cambios, cada
+cambio de plantillas incrementa la versión guardada en catalog_meta y los
+workers la comparan con la de su instantánea como mucho cada
+CATALOG_CHECK_INTERVAL segundos (una lectura por _id de un documento mínimo).
+Con CATALOG_CHANGE_STREAM=true se escucha además un change stream sobre ese
+documento y la recarga es inmediata; si el servidor no lo admite (no es un
+replica set) se sigue comprobando la versión periódicamente.
+"""
+import asyncio
+import os
+import random
+import time
+from typing import NamedTuple, Optional
+from bson import ObjectId
+from app import repository, sprites
+from app.sampler import AliasSampler
+
+# Segundos entre comprobaciones de la versión del catálogo
+CATALOG_CHECK_INTERVAL = float(os.getenv("CATALOG_CHECK_INTERVAL", "5"))
+
+# Escuchar los cambios de versión con un change stream
+CATALOG_CHANGE_STREAM = os.getenv("CATALOG_CHANGE_STREAM", "false").lower() == "true"
+
+# Probabilidad que se asigna a las plantillas que no la tienen
+DEFAULT_PROBABILITY = 20.0
+
+# Árboles que se ofrecen cuando la colección trees está vacía
+DEFAULT_TREE_TYPES = [
+    {
+        "name": "Pino",
+        "category": "Coníferas",
+        "description": "Un majestuoso pino que simboliza tu enfoque y resistencia.",
+        "image_url": "https://cdn-icons-png.flaticon.com/512/628/628283.png",
+        "probability": 20.0
+    },
+    {
+        "name": "Roble",
+        "category": "Caducifolios",
+        "description": "Un fuerte roble que representa la solidez de tu trabajo.",
+        "image_url": "https://cdn-icons-png.flaticon.com/512/1245/1245042.png",
+        "probability": 20.0
+    },
+    {
+        "name": "Cerezo",
+        "category": "Florales",
+        "description": "Un hermoso cerezo en flor que simboliza el progreso y la belleza de tu esfuerzo.",
+        "image_url": "https://cdn-icons-png.flaticon.com/512/1466/1466332.png",
+        "probability": 20.0
+    },
+    {
+        "name": "Palmera",
+        "category": "Tropicales",
+        "description": "Una palmera tropical que representa la calma y el equilibrio en tu trabajo.",
+        "image_url": "https://cdn-icons-png.flaticon.com/512/2826/2826838.png",
+        "probability": 20.0
+    },
+    {
+        "name": "Sauce",
+        "category": "Ribereños",
+        "description": "Un tranquilo sauce que simboliza la flexibilidad y adaptabilidad.",
+        "image_url": "https://cdn-icons-png.flaticon.com/512/1466/1466538.png",
+        "probability": 20.0
+    }
+]
+
+class CatalogEntry(NamedTuple):
+    id: Optional[ObjectId]
+    name: str
+    category: str
+    description: str
+    image_url: str
+    probability: float
+    is_template: bool
+
+    @classmethod
+    def from_document(cls, tree: dict) -> "CatalogEntry":
+        probability = tree.get("probability")
+        return cls(
+            id=tree.get("_id"),
+            name=tree.get("name", "Árbol"),
+            category=tree.get("category", "General"),
+            description=tree.get("description", "Un nuevo árbol en tu bosque"),
+            image_url=tree.get("image_url", "https://cdn-icons-png.flaticon.com/512/628/628283.png"),
+            probability=DEFAULT_PROBABILITY if probability is None else float(probability),
+            is_template=bool(tree.get("is_template"))
+        )
+
+    @property
+    def key(self) -> str:
+        """Identificador de la entrada que se puede usar como nombre de campo en MongoDB"""
+        if self.id is not None:
+            return str(self.id)
+        return self.name.replace(".", "_").replace("$", "_")
+
+    def to_dict(self) -> dict:
+        """Representación JSON de la entrada (la que devuelve /api/tree-types)"""
+        tree = {
+            "name": self.name,
+            "category": self.category,
+            "description": self.description,
+            "image_url": self.image_url,
+            "probability": self.probability
+        }
+        if self.id is not None:
+            tree["_id"] = str(self.id)
+        if self.is_template:
+            tree["is_template"] = True
+        return tree
+
+class Catalog:
+    __slots__ = ("entries", "version", "total", "sampler", "_by_id")
+
+    def __init__(self, entries, version: int = 0):
+        self.entries = tuple(entries)
+        self.version = version
+        # Los pesos negativos no se pueden elegir
+        self.total = sum(max(entry.probability, 0.0) for entry in self.entries)
+        self.sampler = AliasSampler(entry.probability for entry in self.entries) if self.entries else None
+        self._by_id = {entry.id: entry for entry in self.entries if entry.id is not None}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def pick(self, rng=random) -> CatalogEntry:
+        """Elige una entrada al azar con probabilidad proporcional a su peso"""
+        if not self.entries:
+            return None
+        return self.entries[self.sampler.draw(rng)]
+
+    def pick_many(self, k: int, rng=random) -> list:
+        """Elige k entradas independientes en una sola pasada"""
+        if not self.entries:
+            return []
+        return [self.entries[index] for index in self.sampler.draw_many(k, rng)]
+
+    def get(self, template_id) -> Optional[CatalogEntry]:
+        return self._by_id.get(template_id)
+
+    def details(self, template_ids) -> dict:
+        """
+        Devuelve {_id: campos de detalle} de las plantillas indicadas que están
+        en el catálogo, con el mismo formato que repository.find_templates_by_ids.
+        """
+        found = {}
+        for template_id in template_ids:
+            entry = self._by_id.get(template_id)
+            if entry is not None:
+                found[template_id] = {field: getattr(entry, field) for field in repository.TREE_DETAIL_FIELDS}
+        return found
+
+    def to_list(self) -> list:
+        atlas = sprites.get_atlas()
+        trees = []
+        for entry in self.entries:
+            tree = entry.to_dict()
+            # Posición en el atlas de sprites, si la imagen ya está en él
+            sprite = atlas.coordinates(entry.image_url) if atlas else None
+            if sprite:
+                tree["sprite"] = sprite
+            trees.append(tree)
+        return trees
+
+_catalog: Optional[Catalog] = None
+_last_check = 0.0
+_check_lock = asyncio.Lock()
+_watching = False
+
+async def load_catalog(version: int = 0) -> Catalog:
+    """Lee los tipos de árbol de la vista tree_catalog y construye un catálogo nuevo"""
+    trees = await repository.find_tree_catalog()
+    if not trees:
+        trees = DEFAULT_TREE_TYPES
+    return Catalog((CatalogEntry.from_document(tree) for tree in trees), version)
+
+async def rebuild() -> Catalog:
+    """Reconstruye el catálogo y lo publica sustituyendo la instantánea anterior"""
+    global _catalog, _last_check
+    # La versión se lee antes que las plantillas: si cambian entretanto, la
+    # siguiente comprobación verá una versión distinta y volverá a cargar
+    version = await repository.find_catalog_version()
+    _catalog = await load_catalog(version)
+    _last_check = time.monotonic()
+    sprites.schedule_refresh(_catalog)
+    print(f"Catálogo de árboles reconstruido con {len(_catalog)} tipos (versión {version})")
+    return _catalog
+
+async def refresh_if_changed():
+    """Recarga el catálogo solo si otro proceso ha publicado una versión nueva"""
+    global _last_check
+    # Si otra petición ya está comprobando, se sigue con la instantánea actual
+    if _check_lock.locked():
+        return
+    async with _check_lock:
+        _last_check = time.monotonic()
+        if await repository.find_catalog_version() != _catalog.version:
+            await rebuild()
+
+async def get_catalog() -> Catalog:
+    """
+    Devuelve el catálogo actual. Solo consulta la base de datos si aún no existe
+    o si toca comprobar la versión (y no hay un change stream activo).
+    """
+    if _catalog is None:
+        return await rebuild()
+    if not _watching and time.monotonic() - _last_check >= CATALOG_CHECK_INTERVAL:
+        try:
+            await refresh_if_changed()
+        except Exception as e:
+            # Mejor servir el catálogo anterior que fallar la petición
+            print(f"Error al comprobar la versión del catálogo: {e}")
+    return _catalog
+
+async def publish_change(template_ids=None) -> Catalog:
+    """
+    Actualiza la vista tree_catalog con las plantillas que han cambiado (todas
+    si no se indican), avisa a los workers y recarga el catálogo de este proceso.
+    """
+    await repository.publish_tree_catalog(template_ids)
+    return await rebuild()
+
+async def watch_changes():
+    """Tarea de fondo: recarga el catálogo con cada cambio de versión"""
+    global _watching
+    try:
+        async with repository.watch_catalog_version() as stream:
+            _watching = True
+            print("Escuchando cambios del catálogo de árboles (change stream)")
+            async for _change in stream:
+                await rebuild()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"ADVERTENCIA: Change stream del catálogo no disponible, se comprobará la versión periódicamente: {e}")
+    finally:
+        _watching = False
@@ -1,5 +1,9 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
+from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -11,5 +15,151 @@ if not MONGO_URI:
     print("ADVERTENCIA: MONGO_URI no está configurada en database.py. Usando una conexión de respaldo.")
     MONGO_URI = "mongodb://localhost:27017/"
 
-client = MongoClient(MONGO_URI)
-db = client["pomodoro_forest"]
+DB_NAME = "pomodoro_forest"
+
+# Configuración del pool de conexiones y de los timeouts
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+
+# Tiempo máximo (segundos) que el apagado espera a las operaciones en curso
+MONGO_DRAIN_TIMEOUT = float(os.getenv("MONGO_DRAIN_TIMEOUT", "10"))
+
+class PoolMetrics(monitoring.ConnectionPoolListener, monitoring.CommandListener):
+    """
+    Métricas del pool de conexiones y de las operaciones en curso.
+
+    Los eventos llegan desde los hilos de pymongo, por eso se protegen con un lock.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections_open = 0
+        self.connections_in_use = 0
+        self.max_connections_in_use = 0
+        self.checkouts_waiting = 0
+        self.checkout_failures = 0
+        self.operations_in_flight = 0
+
+    def _add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+            self.max_connections_in_use = max(self.max_connections_in_use, self.connections_in_use)
+
+    # Eventos del pool
+    def connection_created(self, event):
+        self._add(connections_open=1)
+
+    def connection_closed(self, event):
+        self._add(connections_open=-1)
+
+    def connection_check_out_started(self, event):
+        self._add(checkouts_waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._add(checkouts_waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(checkouts_waiting=-1, connections_in_use=1)
+
+    def connection_checked_in(self, event):
+        self._add(connections_in_use=-1)
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+
+    # Eventos de comandos
+    def started(self, event):
+        self._add(operations_in_flight=1)
+
+    def succeeded(self, event):
+        self._add(operations_in_flight=-1)
+
+    def failed(self, event):
+        self._add(operations_in_flight=-1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "max_pool_size": MONGO_MAX_POOL_SIZE,
+                "min_pool_size": MONGO_MIN_POOL_SIZE,
+                "connections_open": self.connections_open,
+                "connections_in_use": self.connections_in_use,
+                "max_connections_in_use": self.max_connections_in_use,
+                "checkouts_waiting": self.checkouts_waiting,
+                "checkout_failures": self.checkout_failures,
+                "operations_in_flight": self.operations_in_flight,
+                "saturation": self.connections_in_use / MONGO_MAX_POOL_SIZE if MONGO_MAX_POOL_SIZE else 0.0
+            }
+
+pool_metrics = PoolMetrics()
+
+def client_options() -> dict:
+    return {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    }
+
+# Cliente asíncrono (Motor) usado por la API a través de app.repository.
+# Lo crea y lo cierra el lifespan de FastAPI (ver app.lifespan); los scripts
+# y las pruebas que no arrancan el lifespan lo crean al primer uso.
+async_client = None
+async_db = None
+
+def get_async_db():
+    """Devuelve la base de datos asíncrona que usan los repositorios"""
+    global async_client, async_db
+    if async_db is None:
+        async_client = AsyncIOMotorClient(MONGO_URI, event_listeners=[pool_metrics], **client_options())
+        async_db = async_client[DB_NAME]
+    return async_db
+
+async def connect():
+    """Crea el cliente y precalienta el pool comprobando que el servidor responde"""
+    db = get_async_db()
+    await db.command("ping")
+
+async def close():
+    """
+    Espera a que terminen las operaciones en curso (como mucho MONGO_DRAIN_TIMEOUT
+    segundos) y cierra el cliente.
+    """
+    global async_client, async_db
+    if async_client is None:
+        return
+    deadline = time.monotonic() + MONGO_DRAIN_TIMEOUT
+    while pool_metrics.snapshot()["operations_in_flight"] > 0 and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    async_client.close()
+    async_client = None
+    async_db = None
+
+async def ping() -> bool:
+    """Comprueba si MongoDB responde (para la sonda de disponibilidad)"""
+    try:
+        await get_async_db().command("ping")
+        return True
+    except Exception:
+        return False
+
+# Cliente síncrono: solo para scripts de mantenimiento y pruebas.
+# Se crea al importar `client` o `db` para no abrir conexiones en la API.
+_sync_client = None
+
+def __getattr__(name):
+    global _sync_client
+    if name in ("client", "db"):
+        if _sync_client is None:
+            _sync_client = MongoClient(MONGO_URI, **client_options())
+        return _sync_client if name == "client" else _sync_client[DB_NAME]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
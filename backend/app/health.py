@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app import database
+
+router = APIRouter()
+
+@router.get("/health")
+async def health():
+    """
+    Sonda de vida: el proceso responde
+    """
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def ready():
+    """
+    Sonda de disponibilidad: MongoDB responde y el pool está operativo
+    """
+    if not await database.ping():
+        return JSONResponse(status_code=503, content={"status": "unavailable"})
+    return {"status": "ready"}
@@ -0,0 +1,117 @@
+"""
+Declaración de los índices que necesita la aplicación.
+
+Los índices se crean al arrancar la API (ver app.lifespan) y se pueden
+revisar con el endpoint /api/admin/indexes o desde la línea de comandos:
+
+    python -m app.indexes            # Informe de índices faltantes y sin uso
+    python -m app.indexes --ensure   # Crea los índices faltantes y muestra el informe
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from app.analytics import DROP_EVENTS_TTL_DAYS
+
+# Índices requeridos por colección
+INDEXES = {
+    "users": [
+        # get_user se ejecuta en cada petición autenticada
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "user_trees": [
+        # Paginación por cursor del bosque de cada usuario
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="user_trees_by_date",
+        ),
+        # Árboles compactos que referencian una plantilla
+        IndexModel(
+            [("template_id", ASCENDING)],
+            name="user_trees_by_template",
+            partialFilterExpression={"template_id": {"$exists": True}},
+        ),
+    ],
+    "tree_archive": [
+        # Lotes archivados de cada usuario, del mes más reciente al más antiguo
+        IndexModel(
+            [("user_id", ASCENDING), ("month", DESCENDING), ("_id", DESCENDING)],
+            name="tree_archive_by_month",
+        ),
+    ],
+    "drop_events": [
+        # Los eventos individuales caducan solos (ver app.analytics)
+        IndexModel([("at", ASCENDING)], name="drop_events_ttl", expireAfterSeconds=DROP_EVENTS_TTL_DAYS * 86400),
+    ],
+    "drop_stats": [
+        # Contadores horarios de la ventana que pide el informe
+        IndexModel([("hour", ASCENDING)], name="drop_stats_by_hour"),
+    ],
+    "propagation_jobs": [
+        # Trabajo pendiente más antiguo (ver app.propagation)
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="propagation_jobs_by_status"),
+    ],
+    "trees": [
+        # Solo las plantillas entran en el índice; los árboles heredados no ocupan espacio.
+        # Es único para que el upsert por nombre no pueda crear plantillas duplicadas
+        IndexModel(
+            [("is_template", ASCENDING), ("name", ASCENDING)],
+            name="templates_by_name",
+            unique=True,
+            partialFilterExpression={"is_template": True},
+        ),
+    ],
+}
+
+async def ensure_indexes(db):
+    """Crea los índices declarados que no existan todavía"""
+    created = {}
+    for collection, models in INDEXES.items():
+        try:
+            created[collection] = await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            # Por ejemplo, usuarios duplicados que impiden crear el índice único
+            print(f"ADVERTENCIA: No se pudieron crear los índices de '{collection}': {e}")
+            created[collection] = []
+    return created
+
+async def index_report(db):
+    """
+    Compara los índices declarados con los existentes.
+
+    Returns:
+        Un diccionario por colección con los índices faltantes, los que no están
+        declarados y los que no se han usado desde el último arranque del servidor.
+    """
+    report = {}
+    for collection, models in INDEXES.items():
+        declared = {model.document["name"] for model in models}
+        existing = await db[collection].index_information()
+        stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(length=None)
+
+        unused = sorted(
+            stat["name"] for stat in stats
+            if stat["name"] != "_id_" and stat.get("accesses", {}).get("ops", 0) == 0
+        )
+        report[collection] = {
+            "missing": sorted(declared - set(existing)),
+            "undeclared": sorted(set(existing) - declared - {"_id_"}),
+            "unused": unused,
+        }
+    return report
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import json
+    from app.database import get_async_db
+
+    parser = argparse.ArgumentParser(description="Verifica los índices de MongoDB")
+    parser.add_argument("--ensure", action="store_true", help="Crear los índices faltantes antes del informe")
+    args = parser.parse_args()
+
+    async def main():
+        db = get_async_db()
+        if args.ensure:
+            await ensure_indexes(db)
+        print(json.dumps(await index_report(db), indent=4, ensure_ascii=False))
+
+    asyncio.run(main())
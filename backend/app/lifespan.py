@@ -0,0 +1,52 @@
+"""
+Ciclo de vida de la API: tareas de arranque y apagado compartidas por
+app/main.py y backend/main.py.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from app import indexes, database, catalog, repository, propagation, scheduler
+from app.scrapers import http_client
+
+@asynccontextmanager
+async def lifespan(app):
+    # Un único cliente de MongoDB por proceso, con el pool precalentado
+    try:
+        await database.connect()
+    except Exception as e:
+        # La API arranca igualmente; /api/ready indicará que no está disponible
+        print(f"ADVERTENCIA: No se pudo conectar con MongoDB al arrancar: {e}")
+
+    # Asegurar que los índices existen antes de atender peticiones
+    try:
+        await indexes.ensure_indexes(database.get_async_db())
+    except Exception as e:
+        print(f"ADVERTENCIA: No se pudieron verificar los índices al arrancar: {e}")
+
+    # Cargar el catálogo de árboles para que los pomodoros no lo consulten
+    try:
+        await repository.ensure_tree_catalog()
+        await catalog.rebuild()
+    except Exception as e:
+        print(f"ADVERTENCIA: No se pudo cargar el catálogo de árboles al arrancar: {e}")
+
+    # Recarga inmediata del catálogo cuando otro worker lo cambia
+    watcher = asyncio.create_task(catalog.watch_changes()) if catalog.CATALOG_CHANGE_STREAM else None
+
+    # Propagación de los cambios de plantillas a los árboles antiguos
+    propagation_worker = asyncio.create_task(propagation.run_worker(database.get_async_db))
+
+    # Frases y audios de bosque refrescados en segundo plano
+    scheduled = scheduler.start()
+
+    yield
+
+    # Cancelar las tareas en segundo plano y esperar a que terminen, para que
+    # ninguna use la base de datos o el cliente HTTP ya cerrados
+    background = [propagation_worker] + ([watcher] if watcher else [])
+    for task in background:
+        task.cancel()
+    await scheduler.stop(scheduled)
+    await asyncio.gather(*background, return_exceptions=True)
+
+    await database.close()
+    await http_client.close()
@@ -3,9 +3,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 import os
-from app import auth, trees, pomodoro, stats, tree_templates
+from app import auth, trees, pomodoro, stats, tree_templates, admin, health, sprites
+from app.lifespan import lifespan
 
-app = FastAPI(title="Pomodoro Forest API")
+app = FastAPI(title="Pomodoro Forest API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -22,6 +23,9 @@ app.include_router(trees.router, prefix="/api", tags=["Trees"])
 app.include_router(pomodoro.router, prefix="/api", tags=["Pomodoro"])
 app.include_router(stats.router, prefix="/api", tags=["User Statistics"])
 app.include_router(tree_templates.router, prefix="/api", tags=["Tree Templates"])
+app.include_router(admin.router, prefix="/api", tags=["Administration"])
+app.include_router(health.router, prefix="/api", tags=["Health"])
+app.include_router(sprites.router, prefix="/api", tags=["Tree Types"])
 
 # Verificar si estamos en desarrollo local
 is_dev = os.environ.get('ENV', 'development') == 'development'
@@ -0,0 +1,436 @@
+"""
+Migraciones de datos versionadas, por lotes y reanudables.
+
+Cada migración recorre una fuente ordenada por _id (una consulta o un pipeline)
+en lotes de MIGRATION_BATCH_SIZE documentos y aplica cada lote con una sola
+operación masiva (bulk_write, insert_many o update_many). Tras cada lote se
+guarda un checkpoint en la colección migrations, de modo que si una ejecución
+falla la siguiente continúa desde el último _id procesado. Las migraciones ya
+completadas no se repiten salvo que se pida con --rerun.
+
+Ejecución manual:
+
+    python -m app.migrations --list        # Estado de cada migración
+    python -m app.migrations               # Aplica las migraciones pendientes
+    python -m app.migrations --dry-run     # Muestra lo que haría sin escribir
+    python -m app.migrations --only 3 4    # Solo las migraciones indicadas
+    python -m app.migrations --rerun       # Repite también las ya completadas
+"""
+import asyncio
+import os
+from abc import ABC, abstractmethod
+import random
+import time
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from app import archive
+from app.repository import TREE_DETAIL_FIELDS, embedded_tree_to_document, publish_tree_catalog
+
+# Documentos por lote
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+
+# Segundos entre mensajes de progreso
+PROGRESS_INTERVAL = 5
+
+def bulk_write(collection, operations: list, dry_run: bool) -> int:
+    """
+    Ejecuta un bulk_write desordenado y devuelve cuántos documentos ha escrito.
+    Los duplicados (_id ya insertado en una ejecución anterior) se ignoran.
+    """
+    if not operations or dry_run:
+        return len(operations)
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        return result.inserted_count + result.upserted_count + result.modified_count
+    except BulkWriteError as e:
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+        details = e.details
+        return details.get("nInserted", 0) + details.get("nUpserted", 0) + details.get("nModified", 0)
+
+def recount_total_trees(db, user_ids: list, dry_run: bool) -> int:
+    """Recalcula total_trees (árboles activos y archivados) de varios usuarios a la vez"""
+    totals = {user_id: 0 for user_id in user_ids}
+    for row in db.user_trees.aggregate([
+        {"$match": {"user_id": {"$in": user_ids}}},
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+    ]):
+        totals[row["_id"]] += row["count"]
+    for row in db.tree_archive.aggregate([
+        {"$match": {"user_id": {"$in": user_ids}}},
+        {"$group": {"_id": "$user_id", "count": {"$sum": "$count"}}}
+    ]):
+        totals[row["_id"]] += row["count"]
+    operations = [UpdateOne({"_id": user_id}, {"$set": {"total_trees": total}}) for user_id, total in totals.items()]
+    return bulk_write(db.users, operations, dry_run)
+
+class Migration(ABC):
+    """
+    Un paso de migración. Las subclases definen:
+
+    - version y description
+    - source(db, after): documentos a procesar ordenados por _id, con _id > after
+    - apply(db, batch, dry_run): aplica un lote y devuelve cuántos documentos escribe
+
+    Los documentos que no se pueden migrar se descartan con skip() y se cuentan
+    en el resumen en lugar de detener la migración.
+    """
+    version = 0
+    description = ""
+    # Si cambia las plantillas hay que actualizar tree_catalog al terminar
+    changes_catalog = False
+    # Documentos descartados en la ejecución actual (lo reinicia run_migration)
+    skipped = 0
+
+    @abstractmethod
+    def source(self, db, after):
+        ...
+
+    @abstractmethod
+    def apply(self, db, batch: list, dry_run: bool) -> int:
+        ...
+
+    def skip(self, document: dict, reason: str):
+        self.skipped += 1
+        print(f"  [{self.version}] Se omite {document.get('_id')}: {reason}")
+
+    @staticmethod
+    def after(after) -> dict:
+        return {"_id": {"$gt": after}} if after is not None else {}
+
+class TemplatesFromLegacyTrees(Migration):
+    version = 1
+    description = "Crea o actualiza una plantilla por cada nombre de árbol de la colección trees"
+    changes_catalog = True
+
+    def source(self, db, after):
+        pipeline = [
+            {"$match": {"is_template": {"$ne": True}}},
+            {"$group": {"_id": "$name", "tree": {"$first": "$$ROOT"}}},
+            {"$match": self.after(after)},
+            {"$sort": {"_id": 1}}
+        ]
+        return db.trees.aggregate(pipeline, allowDiskUse=True)
+
+    def apply(self, db, batch, dry_run):
+        now = datetime.utcnow()
+        operations = []
+        for group in batch:
+            tree = group["tree"]
+            operations.append(UpdateOne(
+                {"name": tree["name"], "is_template": True},
+                {
+                    "$set": {
+                        "category": tree.get("category", "Sin categoría"),
+                        "description": tree.get("description", f"Plantilla de {tree['name']}"),
+                        "image_url": tree.get("image_url", ""),
+                        "updated_at": now
+                    },
+                    "$setOnInsert": {"created_at": now}
+                },
+                upsert=True
+            ))
+        return bulk_write(db.trees, operations, dry_run)
+
+class LegacyTreesToUserTrees(Migration):
+    version = 2
+    description = "Copia los árboles de usuario de la colección trees a user_trees"
+
+    def source(self, db, after):
+        query = {"is_template": {"$ne": True}, "user_id": {"$exists": True}, **self.after(after)}
+        return db.trees.find(query).sort("_id", 1)
+
+    def apply(self, db, batch, dry_run):
+        operations = []
+        user_ids = set()
+        for tree in batch:
+            try:
+                user_id = tree["user_id"] if isinstance(tree["user_id"], ObjectId) else ObjectId(tree["user_id"])
+            except (InvalidId, TypeError):
+                self.skip(tree, f"user_id no válido ({tree['user_id']!r})")
+                continue
+            user_ids.add(user_id)
+            # Se conserva el _id del árbol, así repetir el lote no lo duplica
+            operations.append(InsertOne(embedded_tree_to_document(user_id, tree)))
+        written = bulk_write(db.user_trees, operations, dry_run)
+        recount_total_trees(db, list(user_ids), dry_run)
+        return written
+
+class EmbeddedTreesToUserTrees(Migration):
+    version = 3
+    description = "Mueve el array users.trees a la colección user_trees"
+
+    def source(self, db, after):
+        query = {"trees.0": {"$exists": True}, **self.after(after)}
+        return db.users.find(query, {"trees": 1}).sort("_id", 1)
+
+    def apply(self, db, batch, dry_run):
+        operations = [
+            InsertOne(embedded_tree_to_document(user["_id"], tree))
+            for user in batch for tree in user["trees"]
+        ]
+        written = bulk_write(db.user_trees, operations, dry_run)
+        user_ids = [user["_id"] for user in batch]
+        if not dry_run:
+            db.users.update_many({"_id": {"$in": user_ids}}, {"$unset": {"trees": ""}})
+        recount_total_trees(db, user_ids, dry_run)
+        return written
+
+class TemplateProbabilities(Migration):
+    version = 4
+    description = "Asigna una probabilidad aleatoria (5-25) a las plantillas que no la tienen"
+    changes_catalog = True
+
+    def source(self, db, after):
+        query = {"is_template": True, "probability": {"$exists": False}, **self.after(after)}
+        return db.trees.find(query, {"name": 1}).sort("_id", 1)
+
+    def apply(self, db, batch, dry_run):
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne({"_id": template["_id"]}, {"$set": {"probability": random.uniform(5.0, 25.0), "updated_at": now}})
+            for template in batch
+        ]
+        return bulk_write(db.trees, operations, dry_run)
+
+class CompactUserTrees(Migration):
+    version = 5
+    description = "Convierte las copias exactas de una plantilla al formato compacto (template_id)"
+
+    def source(self, db, after):
+        # Plantillas por sus datos de detalle; se cargan una vez por ejecución
+        self.templates = {
+            tuple(template.get(field) for field in TREE_DETAIL_FIELDS): template["_id"]
+            for template in db.trees.find({"is_template": True}, {field: 1 for field in TREE_DETAIL_FIELDS})
+        }
+        query = {"template_id": {"$exists": False}, **self.after(after)}
+        return db.user_trees.find(query, {field: 1 for field in TREE_DETAIL_FIELDS}).sort("_id", 1)
+
+    def apply(self, db, batch, dry_run):
+        operations = []
+        for tree in batch:
+            # Solo se compactan las copias idénticas a una plantilla
+            template_id = self.templates.get(tuple(tree.get(field) for field in TREE_DETAIL_FIELDS))
+            if template_id is None:
+                continue
+            operations.append(UpdateOne(
+                {"_id": tree["_id"], "template_id": {"$exists": False}},
+                {
+                    "$set": {"template_id": template_id},
+                    "$unset": {field: "" for field in TREE_DETAIL_FIELDS}
+                }
+            ))
+        return bulk_write(db.user_trees, operations, dry_run)
+
+class RebuildTreeCounts(Migration):
+    version = 6
+    description = "Recalcula el resumen users.tree_counts a partir de user_trees"
+
+    def source(self, db, after):
+        pipeline = [
+            {"$match": {"template_id": {"$exists": True}}},
+            {"$group": {
+                "_id": {"user_id": "$user_id", "template_id": "$template_id"},
+                "count": {"$sum": 1},
+                "first_at": {"$min": "$created_at"},
+                "last_at": {"$max": "$created_at"}
+            }},
+            {"$group": {
+                "_id": "$_id.user_id",
+                "counts": {"$push": {
+                    "template_id": "$_id.template_id",
+                    "count": "$count",
+                    "first_at": "$first_at",
+                    "last_at": "$last_at"
+                }}
+            }},
+            {"$match": self.after(after)},
+            {"$sort": {"_id": 1}}
+        ]
+        return db.user_trees.aggregate(pipeline, allowDiskUse=True)
+
+    def apply(self, db, batch, dry_run):
+        operations = []
+        for user in batch:
+            tree_counts = {
+                str(entry["template_id"]): {
+                    "count": entry["count"],
+                    "first_at": entry["first_at"],
+                    "last_at": entry["last_at"]
+                }
+                for entry in user["counts"]
+            }
+            operations.append(UpdateOne({"_id": user["_id"]}, {"$set": {"tree_counts": tree_counts}}))
+        return bulk_write(db.users, operations, dry_run)
+
+class ExpandArchivedTrees(Migration):
+    version = 7
+    description = "Copia los datos de la plantilla en los árboles compactos ya archivados y guarda sus _id"
+
+    def source(self, db, after):
+        return db.tree_archive.find(self.after(after), {"data": 1, "tree_ids": 1}).sort("_id", 1)
+
+    def apply(self, db, batch, dry_run):
+        chunks = {chunk["_id"]: archive.decompress_trees(chunk["data"]) for chunk in batch}
+        template_ids = {tree["template_id"] for trees in chunks.values() for tree in trees if tree.get("template_id")}
+        projection = {field: 1 for field in TREE_DETAIL_FIELDS}
+        templates = {template["_id"]: template for template in db.trees.find({"_id": {"$in": list(template_ids)}}, projection)} if template_ids else {}
+        operations = []
+        for chunk in batch:
+            trees = chunks[chunk["_id"]]
+            fields = {}
+            expanded = [archive.expand_tree(tree, templates) for tree in trees]
+            if expanded != trees:
+                fields["data"] = archive.compress_trees(expanded)
+            if "tree_ids" not in chunk:
+                fields["tree_ids"] = [tree["_id"] for tree in trees]
+            if fields:
+                operations.append(UpdateOne({"_id": chunk["_id"]}, {"$set": fields}))
+        return bulk_write(db.tree_archive, operations, dry_run)
+
+# Migraciones registradas, en orden de versión
+MIGRATIONS = [
+    TemplatesFromLegacyTrees(),
+    LegacyTreesToUserTrees(),
+    EmbeddedTreesToUserTrees(),
+    TemplateProbabilities(),
+    CompactUserTrees(),
+    RebuildTreeCounts(),
+    ExpandArchivedTrees(),
+]
+
+def run_migration(db, migration: Migration, dry_run: bool = False, rerun: bool = False,
+                  batch_size: int = MIGRATION_BATCH_SIZE) -> dict:
+    """
+    Ejecuta una migración desde su último checkpoint.
+
+    Returns:
+        Resumen con documentos procesados y escritos, duración y velocidad.
+    """
+    state = db.migrations.find_one({"_id": migration.version}) or {}
+    if state.get("status") == "done" and not rerun:
+        return {"version": migration.version, "status": "skipped"}
+
+    # Una migración terminada que se repite empieza desde el principio
+    after = None if state.get("status") == "done" else state.get("last_id")
+    processed = 0 if after is None else state.get("processed", 0)
+    written = 0 if after is None else state.get("written", 0)
+    migration.skipped = 0 if after is None else state.get("skipped", 0)
+    now = datetime.utcnow()
+    if not dry_run:
+        db.migrations.update_one(
+            {"_id": migration.version},
+            {"$set": {"description": migration.description, "status": "running", "last_id": after,
+                      "processed": processed, "written": written, "skipped": migration.skipped,
+                      "started_at": now, "updated_at": now}},
+            upsert=True
+        )
+
+    label = f"[{migration.version}] {migration.description}"
+    print(f"{label}{' (simulación)' if dry_run else ''}{f' - reanudando tras {after}' if after is not None else ''}")
+    started = time.perf_counter()
+    last_report = started
+    batch = []
+
+    def flush():
+        nonlocal processed, written, batch, last_report
+        written += migration.apply(db, batch, dry_run)
+        processed += len(batch)
+        if not dry_run:
+            db.migrations.update_one(
+                {"_id": migration.version},
+                {"$set": {"last_id": batch[-1]["_id"], "processed": processed, "written": written,
+                          "skipped": migration.skipped, "updated_at": datetime.utcnow()}}
+            )
+        batch = []
+        if time.perf_counter() - last_report >= PROGRESS_INTERVAL:
+            last_report = time.perf_counter()
+            rate = processed / (last_report - started)
+            print(f"  {processed} procesados, {written} escritos ({rate:.0f} docs/s)")
+
+    try:
+        for document in migration.source(db, after):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    except Exception as e:
+        if not dry_run:
+            db.migrations.update_one({"_id": migration.version}, {"$set": {"status": "failed", "error": str(e)}})
+        print(f"  Error: {e}. Se reanudará desde el último lote completado.")
+        raise
+
+    elapsed = time.perf_counter() - started
+    if not dry_run:
+        db.migrations.update_one(
+            {"_id": migration.version},
+            {"$set": {"status": "done", "finished_at": datetime.utcnow(), "seconds": elapsed},
+             "$unset": {"error": ""}}
+        )
+    summary = {
+        "version": migration.version,
+        "status": "dry-run" if dry_run else "done",
+        "processed": processed,
+        "written": written,
+        "skipped": migration.skipped,
+        "seconds": round(elapsed, 2),
+        "docs_per_second": round(processed / elapsed) if elapsed > 0 else processed
+    }
+    print(f"  {processed} procesados, {written} escritos, {migration.skipped} omitidos en {elapsed:.1f}s")
+    return summary
+
+def run_migrations(db, versions=None, dry_run: bool = False, rerun: bool = False,
+                   batch_size: int = MIGRATION_BATCH_SIZE) -> list:
+    """Ejecuta en orden las migraciones indicadas (todas si versions es None)"""
+    results = []
+    catalog_changed = False
+    for migration in MIGRATIONS:
+        if versions is not None and migration.version not in versions:
+            continue
+        result = run_migration(db, migration, dry_run, rerun, batch_size)
+        results.append(result)
+        catalog_changed = catalog_changed or (migration.changes_catalog and result.get("written"))
+
+    if catalog_changed and not dry_run:
+        # Actualizar la vista tree_catalog y avisar a los workers de la API
+        asyncio.run(publish_tree_catalog())
+    return results
+
+def migration_status(db) -> list:
+    states = {state["_id"]: state for state in db.migrations.find()}
+    return [
+        {
+            "version": migration.version,
+            "description": migration.description,
+            "status": states.get(migration.version, {}).get("status", "pending"),
+            "processed": states.get(migration.version, {}).get("processed", 0),
+            "written": states.get(migration.version, {}).get("written", 0)
+        }
+        for migration in MIGRATIONS
+    ]
+
+if __name__ == "__main__":
+    import argparse
+    from app.database import db
+
+    parser = argparse.ArgumentParser(description="Ejecuta las migraciones de datos pendientes")
+    parser.add_argument("--list", action="store_true", help="Muestra el estado de las migraciones")
+    parser.add_argument("--dry-run", action="store_true", help="No modificar la base de datos")
+    parser.add_argument("--rerun", action="store_true", help="Repetir también las migraciones completadas")
+    parser.add_argument("--only", type=int, nargs="+", metavar="VERSION", help="Versiones a ejecutar")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE, help="Documentos por lote")
+    args = parser.parse_args()
+
+    if args.list:
+        for state in migration_status(db):
+            print(f"[{state['version']}] {state['status']:8} {state['description']} "
+                  f"({state['processed']} procesados, {state['written']} escritos)")
+    else:
+        results = run_migrations(db, args.only, args.dry_run, args.rerun, args.batch_size)
+        print("\nResumen:")
+        for result in results:
+            print(f"  {result}")
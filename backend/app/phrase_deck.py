@@ -0,0 +1,72 @@
+"""
+Rotación de frases motivacionales por usuario, sin repeticiones.
+
+Cada usuario tiene un mazo: una permutación barajada del corpus de frases
+(sampler.ShuffledDeck) que se guarda en su documento de forma compacta,
+users.phrase_deck = {s: semilla, c: cursor, d: huella del corpus, w: intercambio}.
+No se guarda la lista barajada: la frase de cada posición se calcula en O(1).
+
+- Cada frase avanza el cursor con un $inc atómico, así que varios workers
+  nunca entregan la misma posición y el estado sobrevive a los reinicios.
+- Cuando el mazo se agota o cambia el corpus (otra huella) se baraja uno nuevo
+  con una semilla aleatoria. Si su primera frase es la última del mazo
+  anterior, el mazo se guarda con w = True y sus dos primeras posiciones se
+  intercambian, de modo que no se repite y el ciclo sigue mostrando todas.
+"""
+import random
+from app import repository
+from app.sampler import ShuffledDeck
+
+# Intentos de barajar un mazo nuevo cuando otro worker lo cambia a la vez
+MAX_SHUFFLE_ATTEMPTS = 3
+
+def new_seed(rng=random) -> int:
+    return rng.getrandbits(63)
+
+def card(deck: dict, size: int, position: int) -> int:
+    """Índice de la frase en una posición del mazo, con el intercambio inicial si lo tiene"""
+    if deck.get("w") and position < 2:
+        position = 1 - position
+    return ShuffledDeck(size, deck["s"])[position]
+
+def _last_drawn(deck, size: int, digest: str):
+    """Índice de la última frase que entregó un mazo agotado del mismo corpus"""
+    if not deck or deck.get("d") != digest or not 0 < deck.get("c", 0) <= size:
+        return None
+    return card(deck, size, deck["c"] - 1)
+
+async def next_phrase_index(user_id: str, size: int, digest: str, rng=random):
+    """
+    Índice de la siguiente frase del mazo del usuario, o None si no se ha
+    podido guardar el estado (el llamador elige una al azar)
+    """
+    for _ in range(MAX_SHUFFLE_ATTEMPTS):
+        deck = await repository.advance_phrase_deck(user_id, size, digest)
+        if deck is not None:
+            return card(deck, size, deck["c"])
+
+        # Sin mazo, agotado o de otro corpus: barajar uno nuevo
+        previous = await repository.find_phrase_deck(user_id)
+        if previous and previous.get("d") == digest and previous.get("c", 0) < size:
+            # Otro worker acaba de barajar: se usa su mazo
+            continue
+        seed = new_seed(rng)
+        deck = {"s": seed, "c": 1, "d": digest}
+        if size > 1 and ShuffledDeck(size, seed)[0] == _last_drawn(previous, size, digest):
+            deck["w"] = True
+        if await repository.replace_phrase_deck(user_id, previous, deck):
+            return card(deck, size, 0)
+    return None
+
+async def next_phrase(user_id: str, phrases: tuple, digest: str, rng=random) -> str:
+    """Siguiente frase del usuario; nunca repite hasta haber mostrado todo el corpus"""
+    if len(phrases) == 1:
+        return phrases[0]
+    try:
+        index = await next_phrase_index(user_id, len(phrases), digest, rng)
+    except Exception as e:
+        print(f"Error al avanzar el mazo de frases del usuario {user_id}: {e}")
+        index = None
+    if index is None:
+        return rng.choice(phrases)
+    return phrases[index]
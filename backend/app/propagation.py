@@ -0,0 +1,283 @@
+"""
+Propagación en segundo plano de los cambios de plantillas.
+
+Los árboles compactos (solo template_id) leen siempre la plantilla actual, pero
+las copias completas antiguas (documentos de user_trees sin template_id y el
+array users.trees de los usuarios aún no migrados) guardan su propia copia de
+los datos. Cuando una o varias plantillas cambian se crea un trabajo en la
+colección propagation_jobs que actualiza esas copias:
+
+- Se recorren las colecciones por rangos de _id de PROPAGATION_BATCH_SIZE
+  documentos, con una actualización acotada por rango y una pausa entre lotes
+  para no penalizar al primario.
+- Solo se modifican las copias idénticas a la versión anterior de la plantilla;
+  los árboles que el usuario ha editado se dejan como están.
+- Un trabajo lleva todos los cambios (anterior -> nuevo) de una misma edición
+  o importación, hasta PROPAGATION_MAX_CHANGES, y los aplica en cada lote con
+  una sola actualización. Así un cambio que afecta a todo el catálogo (por
+  ejemplo, mover las imágenes a otro CDN) recorre las colecciones una vez y no
+  una por plantilla.
+- Tras cada lote se guarda un checkpoint (fase y último _id), así que un
+  trabajo interrumpido continúa donde se quedó.
+- Los trabajos se ejecutan de uno en uno y por orden de creación, de modo que
+  dos ediciones seguidas de la misma plantilla se aplican en orden. Un lease
+  evita que dos workers ejecuten el mismo trabajo.
+
+Ejecución manual (procesa todos los trabajos pendientes y termina):
+
+    python -m app.propagation
+"""
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+
+# Documentos por lote y pausa (segundos) entre lotes
+PROPAGATION_BATCH_SIZE = int(os.getenv("PROPAGATION_BATCH_SIZE", "500"))
+PROPAGATION_PAUSE = float(os.getenv("PROPAGATION_PAUSE", "0.2"))
+
+# Segundos entre comprobaciones de trabajos pendientes en la API
+PROPAGATION_POLL_INTERVAL = float(os.getenv("PROPAGATION_POLL_INTERVAL", "10"))
+
+# Un trabajo cuyo lease caduca (worker caído) lo retoma otro worker
+PROPAGATION_LEASE_SECONDS = 60
+
+# Intentos antes de marcar un trabajo como fallido
+PROPAGATION_MAX_ATTEMPTS = 5
+
+# Cambios de plantilla por trabajo (acota el tamaño de la actualización de cada lote)
+PROPAGATION_MAX_CHANGES = 500
+
+# Campos que se copian a los árboles de los usuarios
+PROPAGATED_FIELDS = ("name", "category", "description", "image_url")
+
+# Fases de un trabajo, en orden
+PHASES = ("user_trees", "users")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+def changed_fields(old: dict, new: dict) -> dict:
+    """Campos propagables que cambian entre dos versiones de una plantilla"""
+    return {field: new.get(field) for field in PROPAGATED_FIELDS if old.get(field) != new.get(field)}
+
+async def enqueue(db, template_id, old: dict, new: dict):
+    """
+    Crea un trabajo de propagación si la edición cambia algún campo copiado
+    en los árboles. Devuelve el _id del trabajo o None si no hace falta.
+    """
+    job_ids = await enqueue_many(db, [(template_id, old, new)])
+    return job_ids[0] if job_ids else None
+
+async def enqueue_many(db, edits: list):
+    """
+    Crea los trabajos de propagación de varias ediciones [(template_id, old, new)]
+    agrupadas de PROPAGATION_MAX_CHANGES en PROPAGATION_MAX_CHANGES. Las
+    ediciones que no cambian ningún campo copiado se ignoran.
+    Devuelve los _id de los trabajos creados.
+    """
+    changes = [
+        {
+            "template_id": template_id,
+            "old": {field: old.get(field) for field in PROPAGATED_FIELDS},
+            "new": {field: new.get(field) for field in PROPAGATED_FIELDS}
+        }
+        for template_id, old, new in edits if changed_fields(old, new)
+    ]
+    job_ids = []
+    for start in range(0, len(changes), PROPAGATION_MAX_CHANGES):
+        now = datetime.utcnow()
+        result = await db.propagation_jobs.insert_one({
+            "changes": changes[start:start + PROPAGATION_MAX_CHANGES],
+            "status": "pending",
+            "phase": PHASES[0],
+            "last_id": None,
+            "batches": 0,
+            "modified": 0,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now
+        })
+        job_ids.append(result.inserted_id)
+    return job_ids
+
+def job_changes(job: dict) -> list:
+    """Cambios de un trabajo (los trabajos antiguos llevan un único cambio)"""
+    if "changes" in job:
+        return job["changes"]
+    return [{"template_id": job["template_id"], "old": job["old"], "new": job["new"]}]
+
+def _range(last_id, boundary) -> dict:
+    id_range = {}
+    if last_id is not None:
+        id_range["$gt"] = last_id
+    if boundary is not None:
+        id_range["$lte"] = boundary
+    return {"_id": id_range} if id_range else {}
+
+async def _next_boundary(collection, last_id):
+    """_id del último documento del siguiente lote, o None si es el último lote"""
+    documents = await collection.find(_range(last_id, None), {"_id": 1}).sort("_id", 1) \
+        .skip(PROPAGATION_BATCH_SIZE - 1).limit(1).to_list(length=1)
+    return documents[0]["_id"] if documents else None
+
+def _matches(old: dict) -> dict:
+    """Expresión de agregación: el árbol es una copia idéntica de la versión old"""
+    return {"$and": [{"$eq": [{"$ifNull": [f"${field}", None]}, value]} for field, value in old.items()]}
+
+async def _update_batch(db, job: dict, id_range: dict) -> int:
+    """Actualiza con una sola operación las copias de las plantillas del trabajo dentro de un rango de _id"""
+    changes = job_changes(job)
+    if job["phase"] == "user_trees":
+        query = {**id_range, "template_id": {"$exists": False}, "$or": [change["old"] for change in changes]}
+        # Cada campo toma el valor nuevo del cambio cuya versión anterior coincide con el árbol
+        result = await db.user_trees.update_many(query, [{"$set": {
+            field: {"$switch": {
+                "branches": [
+                    {"case": _matches(change["old"]), "then": {"$literal": change["new"][field]}}
+                    for change in changes
+                ],
+                "default": f"${field}"
+            }}
+            for field in PROPAGATED_FIELDS
+        }}])
+    else:
+        # Árboles embebidos de usuarios que aún no se han migrado a user_trees
+        query = {**id_range, "$or": [{"trees": {"$elemMatch": change["old"]}} for change in changes]}
+        update = {}
+        array_filters = []
+        for index, change in enumerate(changes):
+            update.update({
+                f"trees.$[tree{index}].{field}": value
+                for field, value in changed_fields(change["old"], change["new"]).items()
+            })
+            array_filters.append({f"tree{index}.{field}": value for field, value in change["old"].items()})
+        result = await db.users.update_many(query, {"$set": update}, array_filters=array_filters)
+    return result.modified_count
+
+async def claim_next_job(db):
+    """
+    Reserva el trabajo pendiente más antiguo. Devuelve None si no hay ninguno
+    o si otro worker lo tiene reservado.
+    """
+    now = datetime.utcnow()
+    job = await db.propagation_jobs.find_one(
+        {"status": {"$in": ["pending", "running"]}},
+        sort=[("created_at", 1), ("_id", 1)]
+    )
+    if not job:
+        return None
+    return await db.propagation_jobs.find_one_and_update(
+        {
+            "_id": job["_id"],
+            "status": {"$in": ["pending", "running"]},
+            "$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lt": now}}]
+        },
+        {"$set": {
+            "status": "running",
+            "worker": WORKER_ID,
+            "lease_until": now + timedelta(seconds=PROPAGATION_LEASE_SECONDS),
+            "started_at": job.get("started_at") or now,
+            "updated_at": now
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+
+async def run_job(db, job: dict) -> dict:
+    """Ejecuta un trabajo reservado desde su último checkpoint hasta el final"""
+    while job["phase"] is not None:
+        collection = db[job["phase"]]
+        boundary = await _next_boundary(collection, job["last_id"])
+        modified = await _update_batch(db, job, _range(job["last_id"], boundary))
+
+        if boundary is None:
+            # Último lote de la fase: pasar a la siguiente
+            index = PHASES.index(job["phase"]) + 1
+            checkpoint = {"phase": PHASES[index] if index < len(PHASES) else None, "last_id": None}
+        else:
+            checkpoint = {"phase": job["phase"], "last_id": boundary}
+
+        now = datetime.utcnow()
+        update = {
+            "$set": {
+                **checkpoint,
+                "updated_at": now,
+                "lease_until": now + timedelta(seconds=PROPAGATION_LEASE_SECONDS)
+            },
+            "$inc": {"batches": 1, "modified": modified}
+        }
+        if checkpoint["phase"] is None:
+            update["$set"].update({"status": "done", "finished_at": now})
+        job = await db.propagation_jobs.find_one_and_update(
+            {"_id": job["_id"], "worker": WORKER_ID},
+            update,
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            # Otro worker ha retomado el trabajo (nuestro lease caducó)
+            return None
+        if job["phase"] is not None:
+            await asyncio.sleep(PROPAGATION_PAUSE)
+    return job
+
+async def _fail(db, job: dict, error: Exception):
+    attempts = job.get("attempts", 0) + 1
+    status = "failed" if attempts >= PROPAGATION_MAX_ATTEMPTS else "running"
+    # Se libera el lease para reintentar desde el último checkpoint
+    await db.propagation_jobs.update_one(
+        {"_id": job["_id"]},
+        {"$set": {"status": status, "attempts": attempts, "error": str(error),
+                  "lease_until": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+    )
+
+async def run_pending_jobs(db) -> int:
+    """Ejecuta los trabajos pendientes uno tras otro. Devuelve cuántos se han completado"""
+    completed = 0
+    while True:
+        job = await claim_next_job(db)
+        if not job:
+            return completed
+        print(f"Propagando cambios de {len(job_changes(job))} plantillas (trabajo {job['_id']})")
+        try:
+            finished = await run_job(db, job)
+        except Exception as e:
+            print(f"Error en el trabajo de propagación {job['_id']}: {e}")
+            await _fail(db, job, e)
+            return completed
+        if finished is None:
+            return completed
+        completed += 1
+        print(f"Trabajo {job['_id']} completado: {finished['modified']} árboles actualizados")
+
+async def run_worker(get_db):
+    """Tarea de fondo de la API: comprueba periódicamente si hay trabajos pendientes"""
+    while True:
+        try:
+            await run_pending_jobs(get_db())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error al comprobar los trabajos de propagación: {e}")
+        await asyncio.sleep(PROPAGATION_POLL_INTERVAL)
+
+async def list_jobs(db, limit: int = 50) -> list:
+    """Progreso de los trabajos más recientes"""
+    cursor = db.propagation_jobs.find({}).sort("created_at", -1).limit(limit)
+    jobs = []
+    async for job in cursor:
+        changes = job_changes(job)
+        for key in ("changes", "template_id", "old", "new"):
+            job.pop(key, None)
+        job["id"] = str(job.pop("_id"))
+        job["template_ids"] = [str(change["template_id"]) for change in changes]
+        job["changes"] = len(changes)
+        if job.get("last_id") is not None:
+            job["last_id"] = str(job["last_id"])
+        jobs.append(job)
+    return jobs
+
+if __name__ == "__main__":
+    from app.database import get_async_db
+
+    completed = asyncio.run(run_pending_jobs(get_async_db()))
+    print(f"{completed} trabajos de propagación completados.")
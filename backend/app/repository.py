@@ -0,0 +1,540 @@
+"""
+Capa de acceso a datos asíncrona.
+
+Todos los routers pasan por este módulo en lugar de usar la base de datos
+directamente, de modo que ninguna consulta a MongoDB bloquea el event loop.
+"""
+import base64
+from datetime import datetime, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.database import get_async_db
+from app import analytics, archive, indexes, propagation
+
+# Campos que se copian de las plantillas a la vista materializada tree_catalog
+TREE_CATALOG_PROJECTION = {"_id": 1, "name": 1, "category": 1, "description": 1, "image_url": 1, "probability": 1}
+
+# Pipeline de respaldo para obtener un árbol por nombre cuando no hay plantillas explícitas
+TEMPLATES_BY_NAME_PIPELINE = [
+    {"$group": {"_id": "$name", "tree": {"$first": "$$ROOT"}}},
+    {"$replaceRoot": {"newRoot": "$tree"}},
+    {"$project": TREE_CATALOG_PROJECTION}
+]
+
+# Usuarios
+
+async def find_user_by_username(username: str, projection=None):
+    return await get_async_db().users.find_one({"username": username}, projection)
+
+async def find_user_by_id(user_id: str, projection=None):
+    return await get_async_db().users.find_one({"_id": ObjectId(user_id)}, projection)
+
+async def insert_user(user_data: dict):
+    """
+    Inserta un usuario en una sola operación.
+    Devuelve None si el nombre ya existe (lo detecta el índice único username_unique).
+    """
+    try:
+        result = await get_async_db().users.insert_one(user_data)
+    except DuplicateKeyError:
+        return None
+    return result.inserted_id
+
+async def set_user_admin(username: str, is_admin: bool):
+    """Cambia el rol del usuario e invalida sus tokens, que incluyen el rol en sus claims"""
+    return await get_async_db().users.update_one(
+        {"username": username},
+        {"$set": {"is_admin": is_admin}, "$inc": {"token_version": 1}}
+    )
+
+async def bump_token_version(username: str, projection=None):
+    """Incrementa token_version, revocando los tokens emitidos hasta ahora"""
+    return await get_async_db().users.find_one_and_update(
+        {"username": username},
+        {"$inc": {"token_version": 1}},
+        projection=projection,
+        return_document=ReturnDocument.AFTER
+    )
+
+async def delete_user(username: str):
+    """Elimina un usuario junto con su bosque y su archivo. Devuelve True si existía"""
+    db = get_async_db()
+    user = await db.users.find_one_and_delete({"username": username}, projection={"_id": 1})
+    if user is None:
+        return False
+    await db.user_trees.delete_many({"user_id": user["_id"]})
+    await db.tree_archive.delete_many({"user_id": user["_id"]})
+    return True
+
+async def update_user_stats(username: str, pomodoros_completed: int, total_focus_minutes: int):
+    return await get_async_db().users.update_one(
+        {"username": username},
+        {"$set": {
+            "pomodoros_completed": pomodoros_completed,
+            "total_focus_minutes": total_focus_minutes
+        }}
+    )
+
+# Mazo de frases del usuario: {s: semilla, c: cursor, d: huella del corpus}
+# (ver app.phrase_deck)
+
+async def advance_phrase_deck(user_id: str, size: int, digest: str):
+    """
+    Avanza el cursor del mazo si sigue siendo válido para el corpus actual.
+    Devuelve el mazo antes de avanzar, o None si hay que barajar uno nuevo.
+    """
+    user = await get_async_db().users.find_one_and_update(
+        {"_id": ObjectId(user_id), "phrase_deck.d": digest, "phrase_deck.c": {"$lt": size}},
+        {"$inc": {"phrase_deck.c": 1}},
+        projection={"_id": 0, "phrase_deck": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    return user["phrase_deck"] if user else None
+
+async def find_phrase_deck(user_id: str):
+    user = await get_async_db().users.find_one({"_id": ObjectId(user_id)}, {"_id": 0, "phrase_deck": 1})
+    return user.get("phrase_deck") if user else None
+
+async def replace_phrase_deck(user_id: str, previous, deck: dict) -> bool:
+    """
+    Sustituye el mazo solo si sigue siendo `previous` (None si no tenía), de
+    modo que si dos workers barajan a la vez solo uno gana
+    """
+    query = {"_id": ObjectId(user_id)}
+    query["phrase_deck"] = previous if previous is not None else {"$exists": False}
+    result = await get_async_db().users.update_one(query, {"$set": {"phrase_deck": deck}})
+    return result.modified_count == 1
+
+# Árboles del usuario
+#
+# Cada árbol es un documento de la colección user_trees, ordenado por
+# (user_id, created_at, _id). Así el documento del usuario no crece con su
+# bosque y listar, borrar o editar cuesta lo mismo con 10 o con 100k árboles.
+
+# Campos que un árbol compacto toma de su plantilla al leerse
+TREE_DETAIL_FIELDS = archive.TREE_DETAIL_FIELDS
+
+def to_object_id(value):
+    """Convierte un identificador a ObjectId o devuelve None si no es válido"""
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+def encode_tree_cursor(tree: dict) -> str:
+    """Cursor opaco que apunta justo después del árbol indicado"""
+    created_ms = int(tree["created_at"].replace(tzinfo=timezone.utc).timestamp() * 1000)
+    raw = f"{created_ms}.{tree['_id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_tree_cursor(cursor: str):
+    """Devuelve (created_at, _id) a partir de un cursor, o None si no es válido"""
+    try:
+        created_ms, tree_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(".")
+        created_at = datetime.fromtimestamp(int(created_ms) / 1000, tz=timezone.utc).replace(tzinfo=None)
+        return created_at, ObjectId(tree_id)
+    except (ValueError, InvalidId, UnicodeDecodeError):
+        return None
+
+def embedded_tree_to_document(user_id: ObjectId, tree: dict) -> dict:
+    """Convierte un árbol del antiguo array users.trees en un documento de user_trees"""
+    tree_id = to_object_id(tree.get("_id")) or ObjectId()
+    return {
+        "_id": tree_id,
+        "user_id": user_id,
+        "created_at": tree.get("created_at") or tree_id.generation_time.replace(tzinfo=None),
+        "name": tree.get("name", "Árbol"),
+        "category": tree.get("category", "General"),
+        "description": tree.get("description", ""),
+        "image_url": tree.get("image_url", "")
+    }
+
+async def add_user_tree(user_id: str, tree: dict):
+    """
+    Añade un árbol al inventario del usuario y actualiza sus contadores.
+
+    En formato compacto el árbol solo lleva template_id; los datos de la
+    plantilla se unen al leer (ver TREE_DETAIL_FIELDS). Además se mantiene en
+    el usuario un resumen tree_counts.<template_id> = {count, first_at, last_at}.
+    """
+    return await add_user_trees(user_id, [tree])
+
+async def add_user_trees(user_id: str, trees: list):
+    """
+    Añade varios árboles (uno por pomodoro completado) con una sola
+    actualización de los contadores y una sola inserción.
+    """
+    db = get_async_db()
+    user_oid = ObjectId(user_id)
+    now = datetime.utcnow()
+
+    update = {"$inc": {"pomodoros_completed": len(trees), "total_trees": len(trees)}}
+    for tree in trees:
+        template_id = tree.get("template_id")
+        if template_id:
+            prefix = f"tree_counts.{template_id}"
+            update["$inc"][f"{prefix}.count"] = update["$inc"].get(f"{prefix}.count", 0) + 1
+            update.setdefault("$min", {})[f"{prefix}.first_at"] = now
+            update.setdefault("$max", {})[f"{prefix}.last_at"] = now
+
+    # Primero los contadores: si el usuario ya no existe no se crean árboles huérfanos
+    result = await db.users.update_one({"_id": user_oid}, update)
+    if result.matched_count:
+        documents = [{**tree, "user_id": user_oid, "created_at": tree.get("created_at") or now} for tree in trees]
+        await db.user_trees.insert_many(documents, ordered=False)
+    return result
+
+async def find_user_trees(user_id: str, limit: int, after=None):
+    """
+    Devuelve una página de árboles del usuario, del más reciente al más antiguo.
+
+    Args:
+        user_id: ID del usuario
+        limit: Número máximo de árboles de la página
+        after: Tupla (created_at, _id) del último árbol de la página anterior
+    """
+    query = {"user_id": ObjectId(user_id)}
+    if after:
+        created_at, tree_id = after
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": tree_id}}
+        ]
+    cursor = get_async_db().user_trees.find(query).sort([("created_at", -1), ("_id", -1)]).limit(limit)
+    return await cursor.to_list(length=limit)
+
+async def delete_user_tree(user_id: str, tree_id: str):
+    """Elimina un árbol del inventario del usuario. Devuelve True si existía"""
+    tree_oid = to_object_id(tree_id)
+    if tree_oid is None:
+        return False
+    db = get_async_db()
+    user_oid = ObjectId(user_id)
+    deleted = await db.user_trees.find_one_and_delete(
+        {"_id": tree_oid, "user_id": user_oid},
+        projection={"template_id": 1}
+    )
+    if deleted is None:
+        return False
+    counters = {"total_trees": -1}
+    if deleted.get("template_id"):
+        counters[f"tree_counts.{deleted['template_id']}.count"] = -1
+    await db.users.update_one({"_id": user_oid}, {"$inc": counters})
+    return True
+
+async def is_archived_tree(user_id: str, tree_id: str) -> bool:
+    """Indica si el árbol del usuario está en el archivo en frío (solo lectura)"""
+    tree_oid = to_object_id(tree_id)
+    if tree_oid is None:
+        return False
+    return await archive.is_archived_tree(get_async_db(), ObjectId(user_id), tree_oid)
+
+async def update_user_tree(user_id: str, tree_id: str, fields: dict):
+    """Actualiza los campos indicados de un árbol del usuario. Devuelve True si existía"""
+    tree_oid = to_object_id(tree_id)
+    if tree_oid is None:
+        return False
+    result = await get_async_db().user_trees.update_one(
+        {"_id": tree_oid, "user_id": ObjectId(user_id)},
+        {"$set": fields}
+    )
+    return result.matched_count > 0
+
+async def find_archived_trees(user_id: str, before: str = None):
+    """
+    Devuelve los árboles del siguiente lote archivado del usuario y el ID del lote.
+
+    Args:
+        user_id: ID del usuario
+        before: ID del lote devuelto en la página anterior
+    """
+    chunk = await archive.find_archive_chunk(get_async_db(), ObjectId(user_id), before)
+    if not chunk:
+        return [], None
+    # Dentro del lote los árboles están del más antiguo al más reciente
+    trees = archive.decompress_trees(chunk["data"])
+    trees.reverse()
+    return trees, chunk["_id"]
+
+async def find_user_tree_counts(user_id: str):
+    """Resumen por plantilla del inventario: {template_id: {count, first_at, last_at}}"""
+    user = await get_async_db().users.find_one({"_id": ObjectId(user_id)}, {"tree_counts": 1})
+    return (user or {}).get("tree_counts", {})
+
+async def detach_template(template: dict):
+    """
+    Copia los datos de una plantilla en los árboles compactos que la referencian,
+    para que sigan mostrándose correctamente cuando la plantilla se elimine.
+    """
+    db = get_async_db()
+    fields = {field: template.get(field, "") for field in TREE_DETAIL_FIELDS}
+    result = await db.user_trees.update_many(
+        {"template_id": template["_id"]},
+        [{"$set": {field: {"$ifNull": [f"${field}", value]} for field, value in fields.items()}},
+         {"$project": {"template_id": 0}}]
+    )
+    # Los árboles desvinculados dejan de contar en el resumen por plantilla
+    await db.users.update_many(
+        {f"tree_counts.{template['_id']}": {"$exists": True}},
+        {"$unset": {f"tree_counts.{template['_id']}": ""}}
+    )
+    return result
+
+async def migrate_embedded_trees(user_id: str):
+    """
+    Mueve el antiguo array users.trees de un usuario a la colección user_trees.
+
+    Es idempotente: los árboles ya migrados se ignoran gracias a su _id.
+    Devuelve el número de árboles movidos.
+    """
+    db = get_async_db()
+    user_oid = ObjectId(user_id)
+    user = await db.users.find_one({"_id": user_oid, "trees.0": {"$exists": True}}, {"trees": 1})
+    if not user:
+        return 0
+
+    documents = [embedded_tree_to_document(user_oid, tree) for tree in user["trees"]]
+    try:
+        await db.user_trees.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        # Solo toleramos duplicados (árboles migrados en un intento anterior)
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+    total = await db.user_trees.count_documents({"user_id": user_oid})
+    await db.users.update_one(
+        {"_id": user_oid},
+        {"$unset": {"trees": ""}, "$set": {"total_trees": total}}
+    )
+    return len(documents)
+
+# Plantillas de árboles
+
+async def find_tree_templates():
+    return await get_async_db().trees.find({"is_template": True}).to_list(length=None)
+
+# Vista materializada de los tipos de árbol
+#
+# tree_catalog contiene las plantillas (is_template: True) o, solo si no existe
+# ninguna, un árbol por nombre tomado de los árboles antiguos de la colección
+# trees (is_template: False). Se actualiza con $merge al cambiar una plantilla,
+# así que leerla no depende de cuántos árboles antiguos queden en trees.
+
+def tree_catalog_merge(refreshed_at: datetime, is_template: bool) -> list:
+    """Etapas finales que copian los documentos del pipeline a tree_catalog"""
+    return [
+        {"$project": TREE_CATALOG_PROJECTION},
+        {"$set": {"is_template": is_template, "refreshed_at": refreshed_at}},
+        {"$merge": {"into": "tree_catalog", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+async def refresh_tree_catalog(template_ids=None):
+    """
+    Actualiza tree_catalog a partir de la colección trees.
+
+    Args:
+        template_ids: Plantillas que han cambiado (creadas, editadas o borradas).
+            Si es None se reconstruye la vista entera.
+    """
+    db = get_async_db()
+    # MongoDB guarda las fechas con precisión de milisegundos
+    now = datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+    match = {"is_template": True}
+    if template_ids is not None:
+        match["_id"] = {"$in": list(template_ids)}
+    await db.trees.aggregate([{"$match": match}] + tree_catalog_merge(now, True)).to_list(length=None)
+
+    # Se eliminan las entradas cuya plantilla ya no existe. Se comprueba contra
+    # trees y no por refreshed_at: así una actualización parcial que coincide
+    # con una completa (y escribe otro refreshed_at) no pierde su entrada
+    listed_query = {"is_template": True}
+    if template_ids is not None:
+        listed_query["_id"] = {"$in": list(template_ids)}
+    listed = await db.tree_catalog.distinct("_id", listed_query)
+    if listed:
+        existing = set(await db.trees.distinct("_id", {"_id": {"$in": listed}, "is_template": True}))
+        removed = [template_id for template_id in listed if template_id not in existing]
+        if removed:
+            await db.tree_catalog.delete_many({"_id": {"$in": removed}})
+
+    if await db.tree_catalog.find_one({"is_template": True}, {"_id": 1}):
+        # Con plantillas, los árboles agrupados por nombre dejan de usarse
+        await db.tree_catalog.delete_many({"is_template": False})
+    elif template_ids is None or not await db.tree_catalog.find_one({}, {"_id": 1}):
+        # Plan B: sin plantillas, un árbol por nombre (única lectura completa de trees)
+        pipeline = TEMPLATES_BY_NAME_PIPELINE + tree_catalog_merge(now, False)
+        await db.trees.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+        # Los nombres que no se han reescrito ahora ya no existen
+        await db.tree_catalog.delete_many({"is_template": False, "refreshed_at": {"$ne": now}})
+
+async def find_tree_catalog():
+    """Tipos de árbol disponibles, leídos de la vista materializada"""
+    return await get_async_db().tree_catalog.find({}).sort("_id", 1).to_list(length=None)
+
+async def ensure_tree_catalog():
+    """Construye tree_catalog si todavía no existe (primer arranque tras desplegar)"""
+    if not await get_async_db().tree_catalog.find_one({}, {"_id": 1}):
+        await refresh_tree_catalog()
+
+async def find_templates_by_ids(template_ids):
+    """Devuelve {_id: plantilla} con los campos de detalle de las plantillas indicadas"""
+    projection = {field: 1 for field in TREE_DETAIL_FIELDS}
+    cursor = get_async_db().trees.find({"_id": {"$in": list(template_ids)}}, projection)
+    return {template["_id"]: template async for template in cursor}
+
+async def upsert_template_by_name(name: str, fields: dict, owner_id: str):
+    """
+    Crea la plantilla con ese nombre o actualiza la existente en una sola operación.
+    Devuelve (_id de la plantilla, documento anterior); el documento anterior es
+    None si la plantilla se acaba de crear.
+    """
+    now = datetime.utcnow()
+    new_id = ObjectId()
+    previous = await get_async_db().trees.find_one_and_update(
+        {"name": name, "is_template": True},
+        {
+            "$set": {**fields, "updated_at": now},
+            "$setOnInsert": {"_id": new_id, "user_id": owner_id, "created_at": now}
+        },
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is None:
+        return new_id, None
+    return previous["_id"], previous
+
+async def update_template(template_id: ObjectId, fields: dict):
+    """Actualiza una plantilla. Devuelve el documento anterior, o None si no existía"""
+    return await get_async_db().trees.find_one_and_update(
+        {"_id": template_id},
+        {"$set": fields},
+        return_document=ReturnDocument.BEFORE
+    )
+
+async def delete_template(template_id: ObjectId):
+    """
+    Elimina una plantilla y devuelve el documento borrado, o None si no existía.
+
+    Antes de borrarla se desvinculan los árboles compactos que la referencian,
+    así que ningún árbol apunta nunca a una plantilla inexistente. Tras el
+    borrado se repite la desvinculación para los árboles conseguidos mientras
+    tanto con un catálogo aún sin actualizar.
+    """
+    db = get_async_db()
+    template = await db.trees.find_one({"_id": template_id})
+    if template is None:
+        return None
+    await detach_template(template)
+    deleted = await db.trees.find_one_and_delete({"_id": template_id})
+    if deleted is not None:
+        await detach_template(deleted)
+    return deleted
+
+async def find_templates_by_names(names: list):
+    """Devuelve {nombre: plantilla} de las plantillas existentes con esos nombres"""
+    cursor = get_async_db().trees.find({"is_template": True, "name": {"$in": list(names)}})
+    return {template["name"]: template async for template in cursor}
+
+# Número de plantillas por bulk_write al importar
+TEMPLATE_IMPORT_BATCH_SIZE = 500
+
+async def bulk_upsert_templates(templates: list, owner_id: str) -> dict:
+    """
+    Crea o actualiza por nombre un conjunto de plantillas con un bulk_write por lote.
+
+    Returns:
+        Número de plantillas creadas y actualizadas.
+    """
+    db = get_async_db()
+    now = datetime.utcnow()
+    inserted = 0
+    updated = 0
+    for start in range(0, len(templates), TEMPLATE_IMPORT_BATCH_SIZE):
+        operations = [
+            UpdateOne(
+                {"name": template["name"], "is_template": True},
+                {
+                    "$set": {**{key: value for key, value in template.items() if key != "name"}, "updated_at": now},
+                    "$setOnInsert": {"user_id": owner_id, "created_at": now}
+                },
+                upsert=True
+            )
+            for template in templates[start:start + TEMPLATE_IMPORT_BATCH_SIZE]
+        ]
+        result = await db.trees.bulk_write(operations, ordered=False)
+        inserted += result.upserted_count
+        updated += result.matched_count
+    return {"inserted": inserted, "updated": updated}
+
+async def iter_templates(projection: dict):
+    """Recorre las plantillas ordenadas por nombre sin cargarlas todas en memoria"""
+    cursor = get_async_db().trees.find({"is_template": True}, projection).sort("name", 1)
+    async for template in cursor:
+        yield template
+
+# Versión del catálogo
+#
+# Un único documento catalog_meta {_id: "trees", version} que se incrementa con
+# cada cambio de plantillas. Los workers comparan su versión con esta para
+# saber si deben recargar su catálogo en memoria (ver app.catalog).
+
+CATALOG_VERSION_ID = "trees"
+
+async def find_catalog_version() -> int:
+    meta = await get_async_db().catalog_meta.find_one({"_id": CATALOG_VERSION_ID}, {"version": 1})
+    return meta["version"] if meta else 0
+
+async def bump_catalog_version() -> int:
+    """Incrementa la versión del catálogo y devuelve la nueva"""
+    meta = await get_async_db().catalog_meta.find_one_and_update(
+        {"_id": CATALOG_VERSION_ID},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        projection={"version": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return meta["version"]
+
+async def publish_tree_catalog(template_ids=None) -> int:
+    """
+    Actualiza tree_catalog y publica una versión nueva del catálogo.
+    Devuelve la versión publicada.
+    """
+    await refresh_tree_catalog(template_ids)
+    return await bump_catalog_version()
+
+def watch_catalog_version():
+    """Change stream sobre el documento de versión (requiere un replica set)"""
+    pipeline = [{"$match": {"documentKey._id": CATALOG_VERSION_ID}}]
+    return get_async_db().catalog_meta.watch(pipeline)
+
+# Tareas de administración y analítica
+#
+# Los módulos analytics, propagation e indexes reciben la base de datos como
+# argumento (también se usan desde scripts); los routers los llaman a través
+# de estas funciones.
+
+async def record_drops(user_id: str, tree_catalog, entries: list, tree_ids: list):
+    """Registra los árboles otorgados en un pomodoro (ver app.analytics)"""
+    await analytics.record_drops(get_async_db(), user_id, tree_catalog, entries, tree_ids)
+
+async def find_drop_report(hours: int):
+    return await analytics.drop_report(get_async_db(), hours)
+
+async def enqueue_propagation(template_id: ObjectId, old: dict, new: dict):
+    """Programa la propagación de una edición de plantilla a los árboles (ver app.propagation)"""
+    return await propagation.enqueue(get_async_db(), template_id, old, new)
+
+async def enqueue_propagations(edits: list):
+    """Programa en un solo trabajo la propagación de varias ediciones [(template_id, old, new)]"""
+    return await propagation.enqueue_many(get_async_db(), edits)
+
+async def find_propagation_jobs():
+    return await propagation.list_jobs(get_async_db())
+
+async def find_index_report():
+    return await indexes.index_report(get_async_db())
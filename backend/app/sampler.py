@@ -0,0 +1,126 @@
+"""
+Muestreo ponderado con el método alias de Vose.
+
+La tabla se construye una vez en O(n) y cada extracción cuesta O(1): un índice
+uniforme y una comparación. Se usa para elegir los árboles que se otorgan al
+completar pomodoros (ver app.catalog).
+
+Todas las extracciones aceptan un generador `rng`; con make_rng se obtiene uno
+reproducible para pruebas y simulaciones.
+
+ShuffledDeck es el caso sin reemplazo: una permutación barajada de n elementos
+definida solo por una semilla, de la que se lee cualquier posición en O(1) sin
+construir la lista (ver app.phrase_deck).
+"""
+import hashlib
+import random
+
+class AliasSampler:
+    __slots__ = ("size", "prob", "alias")
+
+    def __init__(self, weights):
+        weights = [max(float(weight), 0.0) for weight in weights]
+        if not weights:
+            raise ValueError("El muestreador necesita al menos un peso")
+        total = sum(weights)
+        self.size = len(weights)
+        if total <= 0:
+            # Sin pesos positivos todas las opciones son igual de probables
+            weights = [1.0] * self.size
+            total = float(self.size)
+
+        # Probabilidades escaladas para que la media sea 1
+        scaled = [weight * self.size / total for weight in weights]
+        prob = [0.0] * self.size
+        alias = list(range(self.size))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            # La opción grande cede a la pequeña lo que le falta para llegar a 1
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        # Lo que queda vale 1 salvo por errores de redondeo
+        for i in small + large:
+            prob[i] = 1.0
+
+        self.prob = tuple(prob)
+        self.alias = tuple(alias)
+
+    def draw(self, rng=random) -> int:
+        """Devuelve el índice de una opción elegida según los pesos"""
+        column = rng.randrange(self.size)
+        return column if rng.random() < self.prob[column] else self.alias[column]
+
+    def draw_many(self, k: int, rng=random) -> list:
+        """Devuelve k índices elegidos de forma independiente"""
+        size, prob, alias = self.size, self.prob, self.alias
+        randrange, uniform = rng.randrange, rng.random
+        result = []
+        for _ in range(k):
+            column = randrange(size)
+            result.append(column if uniform() < prob[column] else alias[column])
+        return result
+
+class ShuffledDeck:
+    """
+    Permutación pseudoaleatoria de range(size) a partir de una semilla.
+
+    Es una red de Feistel sobre el menor dominio de 2^(2k) valores que contiene
+    a size; las posiciones que caen fuera se vuelven a cifrar hasta entrar
+    (cycle-walking). Como el dominio es menor que 4·size, cada lectura cuesta
+    de media menos de 4 cifrados.
+    """
+    __slots__ = ("size", "key", "half_bits", "mask")
+
+    ROUNDS = 4
+
+    def __init__(self, size: int, seed: int):
+        if size <= 0:
+            raise ValueError("El mazo necesita al menos un elemento")
+        bits = max((size - 1).bit_length(), 2)
+        bits += bits % 2
+        self.size = size
+        self.key = seed.to_bytes(8, "big", signed=True)
+        self.half_bits = bits // 2
+        self.mask = (1 << self.half_bits) - 1
+
+    def _round(self, value: int, round_number: int) -> int:
+        digest = hashlib.blake2b(f"{round_number}:{value}".encode(), key=self.key, digest_size=8).digest()
+        return int.from_bytes(digest, "big") & self.mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.mask
+        for round_number in range(self.ROUNDS):
+            left, right = right, left ^ self._round(right, round_number)
+        return (left << self.half_bits) | right
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, position: int) -> int:
+        """Elemento que ocupa `position` en el mazo barajado"""
+        if not 0 <= position < self.size:
+            raise IndexError("Posición fuera del mazo")
+        value = self._encrypt(position)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+def make_rng(seed=None, user_id=None) -> random.Random:
+    """
+    Crea un generador independiente.
+
+    Con la misma semilla (y el mismo usuario) la secuencia es siempre la misma;
+    sin semilla se inicializa con entropía del sistema.
+    """
+    if seed is None:
+        return random.Random()
+    if user_id is None:
+        return random.Random(seed)
+    return random.Random(f"{seed}:{user_id}")
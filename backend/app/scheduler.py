@@ -0,0 +1,97 @@
+"""
+Planificador de tareas periódicas de la API.
+
+Refresca en segundo plano el contenido que viene de páginas de terceros, de
+modo que ninguna petición de usuario espera a una descarga:
+
+- phrases: frases motivacionales (solo descarga si la caché no es de hoy).
+- audio: pool de audios de bosque de tree.fm.
+
+Las peticiones siempre leen los datos en caché, aunque estén caducados,
+mientras el refresco está en curso o si falla (stale-while-revalidate).
+
+Cada tarea arranca tras un retraso aleatorio de hasta SCHEDULER_STARTUP_DELAY
+segundos y su intervalo varía ±SCHEDULER_JITTER, para que varias réplicas no
+consulten la misma página a la vez. Una tarea no se solapa consigo misma.
+"""
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, NamedTuple
+from app.scrapers import audio_pool, frases_scraper
+
+# Segundos entre comprobaciones de la caché de frases
+PHRASES_REFRESH_INTERVAL = float(os.getenv("PHRASES_REFRESH_INTERVAL", "3600"))
+
+# Variación aleatoria de los intervalos (fracción) y retraso máximo al arrancar
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))
+SCHEDULER_STARTUP_DELAY = float(os.getenv("SCHEDULER_STARTUP_DELAY", "10"))
+
+class ScheduledJob(NamedTuple):
+    name: str
+    run: Callable[[], Awaitable]
+    interval: float
+
+JOBS = (
+    ScheduledJob("phrases", frases_scraper.refrescar_frases, PHRASES_REFRESH_INTERVAL),
+    ScheduledJob("audio", audio_pool.refresh_pool, audio_pool.AUDIO_POOL_REFRESH_INTERVAL),
+)
+
+# Estado de cada tarea para el panel de administración
+_status: dict = {}
+
+def next_delay(interval: float, rng=random) -> float:
+    """Intervalo con jitter: entre interval·(1 - SCHEDULER_JITTER) y interval·(1 + SCHEDULER_JITTER)"""
+    return max(interval * (1 + rng.uniform(-SCHEDULER_JITTER, SCHEDULER_JITTER)), 0.0)
+
+async def run_once(job: ScheduledJob):
+    """Ejecuta una tarea y guarda su resultado; los errores no detienen el planificador"""
+    status = _status.setdefault(job.name, {"runs": 0, "failures": 0})
+    status.update(running=True, last_started=datetime.utcnow())
+    try:
+        result = await job.run()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        status["failures"] += 1
+        status["last_error"] = str(e)
+        print(f"Error en la tarea programada {job.name} (se sigue sirviendo la caché): {e}")
+    else:
+        status["last_success"] = datetime.utcnow()
+        status["last_result"] = result
+        status.pop("last_error", None)
+    finally:
+        status["runs"] += 1
+        status["running"] = False
+
+async def run_job(job: ScheduledJob):
+    """Bucle de una tarea: retraso inicial aleatorio y después cada intervalo con jitter"""
+    await asyncio.sleep(random.uniform(0, SCHEDULER_STARTUP_DELAY))
+    while True:
+        await run_once(job)
+        delay = next_delay(job.interval)
+        _status[job.name]["next_run"] = datetime.utcnow() + timedelta(seconds=delay)
+        await asyncio.sleep(delay)
+
+def start() -> list:
+    """Lanza las tareas programadas (lifespan de la API)"""
+    return [asyncio.create_task(run_job(job)) for job in JOBS]
+
+async def stop(tasks: list):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def scheduler_status() -> list:
+    return [
+        {
+            "name": job.name,
+            "interval": job.interval,
+            **{
+                key: value.isoformat() if isinstance(value, datetime) else value
+                for key, value in _status.get(job.name, {}).items()
+            }
+        }
+        for job in JOBS
+    ]
@@ -0,0 +1,101 @@
+"""
+Catálogo en memoria de los audios de bosque de tree.fm.
+
+En lugar de descargar una página de tree.fm en cada inicio de pomodoro, una
+tarea programada de la API (app.scheduler) resuelve todos los bosques (FOREST_IDS), comprueba que
+el mp3 responde y guarda las URLs válidas con la fecha en que se comprobaron.
+start_pomodoro elige una URL del pool sin salir a la red.
+
+- El pool se recorre de nuevo cada AUDIO_POOL_REFRESH_INTERVAL segundos.
+- Si un bosque falla en una vuelta se conserva su URL anterior hasta
+  AUDIO_POOL_MAX_AGE segundos; después se descarta.
+- Mientras el pool está vacío (arranque o tree.fm caído) se usa FALLBACK_AUDIO_URL.
+
+Ejecución manual (resuelve todos los bosques y muestra el resultado):
+
+    python -m app.scrapers.audio_pool
+"""
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta
+from typing import NamedTuple
+from app.scrapers import http_client
+from app.scrapers.audio_scraper import FOREST_IDS, obtener_audio_de_bosque
+
+# Segundos entre vueltas completas por los bosques
+AUDIO_POOL_REFRESH_INTERVAL = float(os.getenv("AUDIO_POOL_REFRESH_INTERVAL", "21600"))
+
+# Antigüedad máxima (segundos) de una URL que ya no se ha podido comprobar
+AUDIO_POOL_MAX_AGE = float(os.getenv("AUDIO_POOL_MAX_AGE", "172800"))
+
+FALLBACK_AUDIO_URL = "https://assets.mixkit.co/sfx/preview/mixkit-forest-stream-ambience-loop-542.mp3"
+
+class AudioEntry(NamedTuple):
+    forest_id: int
+    url: str
+    refreshed_at: datetime
+
+# forest_id -> AudioEntry. Se sustituye entero en cada cambio, así que las
+# peticiones siempre leen un diccionario completo
+_pool: dict = {}
+_last_refresh = None
+
+async def is_valid_audio(url: str) -> bool:
+    """Comprueba que la URL es un mp3 https que responde"""
+    if not url or not url.startswith("https://") or not url.lower().endswith(".mp3"):
+        return False
+    try:
+        response = await http_client.fetch(url, method="HEAD")
+        return response.status_code < 400
+    except Exception:
+        return False
+
+async def resolve_forest(forest_id: int):
+    """URL validada del audio de un bosque, o None"""
+    url = await obtener_audio_de_bosque(forest_id)
+    return url if await is_valid_audio(url) else None
+
+async def refresh_pool() -> int:
+    """
+    Resuelve todos los bosques (el cliente HTTP limita las peticiones
+    simultáneas a tree.fm) y publica el pool actualizado. Devuelve cuántas URLs tiene.
+    """
+    global _pool, _last_refresh
+    urls = await asyncio.gather(*(resolve_forest(forest_id) for forest_id in FOREST_IDS))
+    now = datetime.utcnow()
+    pool = {**_pool, **{
+        forest_id: AudioEntry(forest_id, url, now)
+        for forest_id, url in zip(FOREST_IDS, urls) if url
+    }}
+
+    # Descartar las URLs que llevan demasiado tiempo sin poder comprobarse
+    oldest = now - timedelta(seconds=AUDIO_POOL_MAX_AGE)
+    _pool = {forest_id: entry for forest_id, entry in pool.items() if entry.refreshed_at >= oldest}
+    _last_refresh = now
+    print(f"Pool de audios de bosque actualizado: {len(_pool)} de {len(FOREST_IDS)} bosques disponibles")
+    return len(_pool)
+
+def pick_audio_url(rng=random) -> str:
+    """URL de un audio de bosque al azar, sin acceder a la red"""
+    pool = _pool
+    if not pool:
+        return FALLBACK_AUDIO_URL
+    return rng.choice(list(pool.values())).url
+
+def pool_status() -> dict:
+    """Estado del pool para el panel de administración"""
+    return {
+        "available": len(_pool),
+        "forests": len(FOREST_IDS),
+        "last_refresh": _last_refresh.isoformat() if _last_refresh else None,
+        "entries": [
+            {"forest_id": entry.forest_id, "url": entry.url, "refreshed_at": entry.refreshed_at.isoformat()}
+            for entry in sorted(_pool.values())
+        ]
+    }
+
+if __name__ == "__main__":
+    asyncio.run(refresh_pool())
+    for entry in sorted(_pool.values()):
+        print(f"{entry.forest_id}: {entry.url}")
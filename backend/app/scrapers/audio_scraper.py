@@ -1,50 +1,59 @@
-import requests
+import asyncio
 import random
 import re
+from app.scrapers import http_client
 
-def obtener_audio_bosque():
+# Bosques de tree.fm que se usan como sonido ambiente
+FOREST_IDS = range(40, 66)
+
+def extraer_audio(html):
+    """Busca la URL del mp3 en el HTML de la página de un bosque"""
+    # Buscar la URL del audio en el HTML usando expresiones regulares
+    pattern = r'<audio[^>]*>.*?<source\s+src="([^"]+\.mp3)"[^>]*>.*?</audio>'
+    match = re.search(pattern, html, re.DOTALL)
+
+    if match:
+        return match.group(1)
+
+    # Si no se encuentra con la expresión regular anterior, intentar con otra más simple
+    pattern2 = r'<source\s+src="([^"]+\.mp3)"'
+    match2 = re.search(pattern2, html)
+
+    if match2:
+        return match2.group(1)
+
+    return None
+
+async def obtener_audio_de_bosque(id_bosque):
     """
-    Extrae la URL del audio de un bosque aleatorio de tree.fm
-    con ID entre 40 y 65, sin guardar el HTML.
+    Extrae la URL del audio del bosque indicado de tree.fm, sin guardar el HTML.
+    Devuelve None si la página no responde o no contiene audio.
     """
-    # Generar un ID aleatorio para el bosque
-    id_bosque = random.randint(40, 65)
-    
     # URL de la página web con el sonido del bosque
     url = f"https://www.tree.fm/forest/{id_bosque}"
-    
-    # Realizar la solicitud a la página web
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
+
     try:
-        response = requests.get(url, headers=headers)
-        
+        response = await http_client.fetch(url)
+
         # Verificar si la solicitud fue exitosa
         if response.status_code == 200:
-            
-            # Buscar la URL del audio en el HTML usando expresiones regulares
-            pattern = r'<audio[^>]*>.*?<source\s+src="([^"]+\.mp3)"[^>]*>.*?</audio>'
-            match = re.search(pattern, response.text, re.DOTALL)
-            
-            if match:
-                return match.group(1)
-            
-            # Si no se encuentra con la expresión regular anterior, intentar con otra más simple
-            pattern2 = r'<source\s+src="([^"]+\.mp3)"'
-            match2 = re.search(pattern2, response.text)
-            
-            if match2:
-                return match2.group(1)
-        
+            return extraer_audio(response.text)
+
         return None
-    
+
     except Exception:
         return None
 
+async def obtener_audio_bosque():
+    """
+    Extrae la URL del audio de un bosque aleatorio de tree.fm
+    con ID entre 40 y 65, sin guardar el HTML.
+    """
+    # Generar un ID aleatorio para el bosque
+    return await obtener_audio_de_bosque(random.choice(FOREST_IDS))
+
 if __name__ == "__main__":
-    url_audio = obtener_audio_bosque()
+    url_audio = asyncio.run(obtener_audio_bosque())
     if url_audio:
         print(url_audio)
     else:
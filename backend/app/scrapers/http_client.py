@@ -0,0 +1,127 @@
+"""
+Cliente HTTP asíncrono compartido por los scrapers.
+
+- Un único httpx.AsyncClient por proceso, con conexiones keep-alive
+  reutilizadas entre peticiones (límites SCRAPER_MAX_CONNECTIONS).
+- Como mucho SCRAPER_PER_HOST_LIMIT peticiones simultáneas a un mismo host,
+  para no saturar páginas de terceros.
+- Timeouts de conexión y de lectura: una página colgada nunca retiene un worker.
+- Hasta SCRAPER_MAX_RETRIES reintentos ante errores de red, 429 y 5xx, con
+  espera exponencial y jitter aleatorio.
+- Las respuestas se leen en streaming y se cortan en SCRAPER_MAX_BYTES.
+"""
+import asyncio
+import os
+import random
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+import httpx
+
+SCRAPER_CONNECT_TIMEOUT = float(os.getenv("SCRAPER_CONNECT_TIMEOUT", "5"))
+SCRAPER_READ_TIMEOUT = float(os.getenv("SCRAPER_READ_TIMEOUT", "10"))
+SCRAPER_MAX_RETRIES = int(os.getenv("SCRAPER_MAX_RETRIES", "2"))
+SCRAPER_MAX_BYTES = int(os.getenv("SCRAPER_MAX_BYTES", str(2 * 1024 * 1024)))
+SCRAPER_MAX_CONNECTIONS = int(os.getenv("SCRAPER_MAX_CONNECTIONS", "20"))
+SCRAPER_PER_HOST_LIMIT = int(os.getenv("SCRAPER_PER_HOST_LIMIT", "4"))
+
+# Espera base (segundos) antes del primer reintento; se duplica en cada intento
+SCRAPER_RETRY_BACKOFF = 0.5
+
+SCRAPER_USER_AGENT = os.getenv(
+    "SCRAPER_USER_AGENT",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class ScraperError(Exception):
+    """La petición no se pudo completar tras los reintentos"""
+
+class ResponseTooLarge(ScraperError):
+    """La respuesta supera SCRAPER_MAX_BYTES"""
+
+class FetchResult(NamedTuple):
+    url: str
+    status_code: int
+    headers: httpx.Headers
+    content: bytes
+    encoding: Optional[str]
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+_client: Optional[httpx.AsyncClient] = None
+_host_limits: dict = {}
+
+def get_client() -> httpx.AsyncClient:
+    """Cliente del proceso, creado la primera vez que se usa"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(SCRAPER_READ_TIMEOUT, connect=SCRAPER_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=SCRAPER_MAX_CONNECTIONS,
+                max_keepalive_connections=SCRAPER_MAX_CONNECTIONS
+            ),
+            headers={"User-Agent": SCRAPER_USER_AGENT},
+            follow_redirects=True
+        )
+    return _client
+
+def _host_limit(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).hostname or ""
+    if host not in _host_limits:
+        _host_limits[host] = asyncio.Semaphore(SCRAPER_PER_HOST_LIMIT)
+    return _host_limits[host]
+
+async def _read(response: httpx.Response, max_bytes: int) -> bytes:
+    length = response.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes:
+        raise ResponseTooLarge(f"{response.url} ocupa {length} bytes (máximo {max_bytes})")
+    content = bytearray()
+    async for chunk in response.aiter_bytes():
+        content.extend(chunk)
+        if len(content) > max_bytes:
+            raise ResponseTooLarge(f"{response.url} supera {max_bytes} bytes")
+    return bytes(content)
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: entre 0 y la espera exponencial del intento
+    return random.uniform(0, SCRAPER_RETRY_BACKOFF * 2 ** attempt)
+
+async def fetch(url: str, method: str = "GET", max_bytes: int = SCRAPER_MAX_BYTES,
+                retries: int = SCRAPER_MAX_RETRIES) -> FetchResult:
+    """
+    Descarga una URL. Las respuestas 4xx (salvo 429) se devuelven sin reintentar;
+    lanza ScraperError si no hay respuesta válida tras los reintentos.
+    """
+    client = get_client()
+    last_error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            await asyncio.sleep(_backoff(attempt - 1))
+        try:
+            async with _host_limit(url):
+                async with client.stream(method, url) as response:
+                    content = b"" if method == "HEAD" else await _read(response, max_bytes)
+                    result = FetchResult(str(response.url), response.status_code, response.headers,
+                                         content, response.encoding)
+        except ResponseTooLarge:
+            raise
+        except httpx.HTTPError as e:
+            last_error = e
+            continue
+        if result.status_code in RETRY_STATUS_CODES:
+            last_error = f"HTTP {result.status_code}"
+            continue
+        return result
+    raise ScraperError(f"No se pudo obtener {url} tras {retries + 1} intentos: {last_error}")
+
+async def close():
+    """Cierra las conexiones del cliente (apagado de la API)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_limits.clear()
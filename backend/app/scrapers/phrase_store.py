@@ -0,0 +1,110 @@
+"""
+Almacén en memoria de las frases motivacionales.
+
+Las frases se leen de frases_cache.json una sola vez y se guardan en una
+instantánea inmutable (tupla). Las peticiones leen esa instantánea sin tocar
+el disco; solo cada PHRASES_CHECK_INTERVAL segundos se hace un stat del
+fichero y, si su mtime o tamaño han cambiado (lo ha reescrito otro worker o a
+mano), se vuelve a cargar.
+
+Las escrituras se hacen en un fichero temporal que luego se renombra, así que
+ningún lector ve nunca un JSON a medias. Cada escritura incrementa "version".
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+# Segundos entre comprobaciones de cambios en el fichero
+PHRASES_CHECK_INTERVAL = float(os.getenv("PHRASES_CHECK_INTERVAL", "30"))
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frases_cache.json")
+
+class PhraseSnapshot(NamedTuple):
+    phrases: tuple
+    fecha: str
+    version: int
+    # (mtime_ns, tamaño) del fichero del que se cargó, o None si no existía
+    signature: Optional[tuple]
+    # Huella del contenido: cambia si cambian las frases o su orden
+    digest: str
+
+EMPTY = PhraseSnapshot((), "", 0, None, "")
+
+def phrases_digest(phrases) -> str:
+    return hashlib.sha1("\n".join(phrases).encode("utf-8")).hexdigest()[:16]
+
+def _signature(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+class PhraseStore:
+    def __init__(self, path: str = CACHE_PATH, check_interval: float = PHRASES_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot: Optional[PhraseSnapshot] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> PhraseSnapshot:
+        signature = _signature(self.path)
+        if signature is None:
+            return EMPTY
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except Exception as e:
+            print(f"Error al leer las frases de {self.path}: {e}")
+            # Se conserva lo que ya había en memoria
+            return self._snapshot or EMPTY
+        phrases = tuple(data.get("frases", []))
+        return PhraseSnapshot(
+            phrases,
+            data.get("fecha", ""),
+            int(data.get("version", 0)),
+            signature,
+            phrases_digest(phrases)
+        )
+
+    def snapshot(self) -> PhraseSnapshot:
+        """Instantánea actual; solo accede al disco si toca comprobar cambios"""
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._last_check < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            if self._snapshot is None or now - self._last_check >= self.check_interval:
+                if self._snapshot is None or _signature(self.path) != self._snapshot.signature:
+                    self._snapshot = self._load()
+                self._last_check = now
+        return self._snapshot
+
+    def phrases(self) -> tuple:
+        return self.snapshot().phrases
+
+    def save(self, phrases) -> PhraseSnapshot:
+        """Guarda las frases con la fecha actual de forma atómica y las publica en memoria"""
+        with self._lock:
+            current = self._snapshot or self._load()
+            fecha = datetime.now().strftime("%Y-%m-%d")
+            data = {"fecha": fecha, "version": current.version + 1, "frases": list(phrases)}
+            temporary = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(temporary, "w", encoding="utf-8") as file:
+                    json.dump(data, file, ensure_ascii=False, indent=4)
+                os.replace(temporary, self.path)
+            finally:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+            phrases = tuple(data["frases"])
+            self._snapshot = PhraseSnapshot(phrases, fecha, data["version"], _signature(self.path), phrases_digest(phrases))
+            self._last_check = time.monotonic()
+            return self._snapshot
+
+# Almacén compartido por las peticiones del worker
+store = PhraseStore()
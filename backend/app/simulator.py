@@ -0,0 +1,158 @@
+"""
+Simulador de la distribución de árboles otorgados.
+
+Permite a los administradores ver el efecto de cambiar las probabilidades de
+las plantillas antes de guardarlas. Las extracciones se hacen con NumPy sobre
+la misma tabla alias que usa la API (app.sampler), en bloques vectorizados.
+
+Ejecución manual:
+
+    python -m app.simulator                              # Catálogo actual, 1M de extracciones
+    python -m app.simulator --draws 10000000 --seed 1    # 10M de extracciones reproducibles
+    python -m app.simulator --set Pino=50 --set Roble=5  # Probabilidades propuestas
+"""
+import math
+import time
+import numpy as np
+from app.catalog import Catalog
+
+# Número de extracciones por bloque (limita la memoria de los arrays temporales)
+SIMULATION_CHUNK_SIZE = 1_000_000
+
+# Máximo de extracciones por simulación
+MAX_SIMULATION_DRAWS = 50_000_000
+
+# Cuantil de la normal para los intervalos de confianza del 95%
+Z_95 = 1.959963984540054
+
+def entry_key(entry) -> str:
+    """Clave de una entrada del catálogo: su id o, si no tiene, su nombre"""
+    return str(entry.id) if entry.id is not None else entry.name
+
+def with_probabilities(catalog: Catalog, probabilities: dict) -> Catalog:
+    """
+    Devuelve un catálogo propuesto con las probabilidades indicadas
+    ({id o nombre: probabilidad}); el catálogo original no se modifica.
+    """
+    unknown = set(probabilities) - {entry_key(entry) for entry in catalog.entries} - {entry.name for entry in catalog.entries}
+    if unknown:
+        raise ValueError(f"Plantillas desconocidas: {', '.join(sorted(unknown))}")
+    invalid = [key for key, probability in probabilities.items() if not math.isfinite(probability) or probability < 0]
+    if invalid:
+        raise ValueError(f"Probabilidades no válidas (deben ser números finitos no negativos): {', '.join(sorted(invalid))}")
+    entries = []
+    for entry in catalog.entries:
+        probability = probabilities.get(entry_key(entry), probabilities.get(entry.name, entry.probability))
+        entries.append(entry._replace(probability=float(probability)))
+    return Catalog(entries)
+
+def draw_counts(catalog: Catalog, draws: int, seed=None) -> np.ndarray:
+    """Cuenta cuántas veces sale cada entrada en `draws` extracciones"""
+    sampler = catalog.sampler
+    prob = np.asarray(sampler.prob)
+    alias = np.asarray(sampler.alias)
+    rng = np.random.default_rng(seed)
+    counts = np.zeros(sampler.size, dtype=np.int64)
+
+    remaining = draws
+    while remaining > 0:
+        size = min(remaining, SIMULATION_CHUNK_SIZE)
+        columns = rng.integers(0, sampler.size, size=size)
+        picks = np.where(rng.random(size) < prob[columns], columns, alias[columns])
+        counts += np.bincount(picks, minlength=sampler.size)
+        remaining -= size
+    return counts
+
+def wilson_interval(hits: np.ndarray, draws: int, z: float = Z_95):
+    """Intervalo de confianza de Wilson para cada proporción"""
+    p = hits / draws
+    denominator = 1 + z * z / draws
+    center = (p + z * z / (2 * draws)) / denominator
+    margin = z * np.sqrt(p * (1 - p) / draws + z * z / (4 * draws * draws)) / denominator
+    return center - margin, center + margin
+
+def expected_pomodoros_to_collect_all(probabilities: np.ndarray, steps: int = 20_000) -> float:
+    """
+    Número esperado de pomodoros para conseguir al menos un árbol de cada tipo
+    (problema del coleccionista con probabilidades distintas).
+
+    Se integra numéricamente E = ∫ 1 - Π(1 - e^(-p·t)) dt, la forma continua
+    (poissonizada) del problema, que da el mismo valor esperado.
+    """
+    probabilities = probabilities[probabilities > 0]
+    if probabilities.size == 0:
+        return math.inf
+    # A partir de t_max la probabilidad de que falte algún tipo es despreciable
+    t_max = math.log(probabilities.size * 1e12) / probabilities.min()
+    t = np.linspace(0.0, t_max, steps)
+    missing = 1.0 - np.prod(-np.expm1(-np.outer(t, probabilities)), axis=1)
+    return float(np.trapezoid(missing, t))
+
+def simulate(catalog: Catalog, draws: int = 1_000_000, seed=None) -> dict:
+    """
+    Simula `draws` árboles otorgados con el catálogo indicado.
+
+    Returns:
+        Frecuencias observadas y esperadas por plantilla, con su intervalo de
+        confianza del 95%, y el número esperado de pomodoros para conseguir
+        todos los tipos.
+    """
+    if not 1 <= draws <= MAX_SIMULATION_DRAWS:
+        raise ValueError(f"El número de extracciones debe estar entre 1 y {MAX_SIMULATION_DRAWS}")
+    if not len(catalog):
+        raise ValueError("El catálogo está vacío")
+
+    started = time.perf_counter()
+    counts = draw_counts(catalog, draws, seed)
+    elapsed = time.perf_counter() - started
+
+    weights = np.array([max(entry.probability, 0.0) for entry in catalog.entries])
+    expected = weights / weights.sum() if weights.sum() > 0 else np.full(len(catalog), 1 / len(catalog))
+    low, high = wilson_interval(counts, draws)
+
+    templates = []
+    for i, entry in enumerate(catalog.entries):
+        templates.append({
+            "id": str(entry.id) if entry.id is not None else None,
+            "name": entry.name,
+            "probability": entry.probability,
+            "expected_frequency": float(expected[i]),
+            "count": int(counts[i]),
+            "frequency": float(counts[i] / draws),
+            "ci_low": float(low[i]),
+            "ci_high": float(high[i]),
+            "expected_pomodoros": float(1 / expected[i]) if expected[i] > 0 else None
+        })
+
+    collect_all = expected_pomodoros_to_collect_all(expected)
+    return {
+        "draws": draws,
+        "seed": seed,
+        "elapsed_seconds": elapsed,
+        "templates": templates,
+        "expected_pomodoros_to_collect_all": collect_all,
+        "uncollectable": [entry.name for entry, p in zip(catalog.entries, expected) if p <= 0]
+    }
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import json
+    from app.catalog import load_catalog
+
+    parser = argparse.ArgumentParser(description="Simula la distribución de árboles otorgados")
+    parser.add_argument("--draws", type=int, default=1_000_000, help="Número de extracciones")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla para repetir la simulación")
+    parser.add_argument("--set", action="append", default=[], metavar="PLANTILLA=PROBABILIDAD",
+                        help="Probabilidad propuesta para una plantilla (id o nombre)")
+    args = parser.parse_args()
+
+    proposed = {}
+    for item in args.set:
+        key, _, value = item.rpartition("=")
+        proposed[key] = float(value)
+
+    catalog = asyncio.run(load_catalog())
+    if proposed:
+        catalog = with_probabilities(catalog, proposed)
+    print(json.dumps(simulate(catalog, args.draws, args.seed), indent=4, ensure_ascii=False))
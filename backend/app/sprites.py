@@ -0,0 +1,203 @@
+"""
+Atlas de sprites del catálogo de árboles.
+
+En lugar de que cada tarjeta del inventario descargue su image_url del CDN de
+iconos, todas las imágenes del catálogo se empaquetan en una sola imagen
+(atlas) que sirve el backend:
+
+- Cada imagen se descarga una sola vez y se guarda en SPRITE_CACHE_DIR/sources
+  (las rutas locales como /img/arbol.png se leen del directorio frontend).
+- Se normalizan a SPRITE_SIZE x SPRITE_SIZE píxeles (sin deformarlas, con
+  fondo transparente) y se colocan en una rejilla de SPRITE_COLUMNS columnas.
+- El nombre del atlas es el hash de su contenido, así que se puede servir con
+  caché de un año: si cambia alguna imagen, cambia la URL.
+
+El atlas se regenera en segundo plano cuando el catálogo cambia y alguna
+image_url es nueva. Mientras tanto (o si una imagen no se puede descargar) la
+entrada se sirve sin coordenadas y el frontend usa la image_url original.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import re
+from typing import NamedTuple, Optional
+import requests
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from PIL import Image
+
+# Tamaño (px) de cada imagen dentro del atlas y columnas de la rejilla
+SPRITE_SIZE = int(os.getenv("SPRITE_SIZE", "192"))
+SPRITE_COLUMNS = 8
+
+# Imágenes originales descargadas y atlas generados
+SPRITE_CACHE_DIR = os.getenv(
+    "SPRITE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "sprite_cache")
+)
+
+# Descarga de las imágenes originales
+SPRITE_FETCH_TIMEOUT = 10
+SPRITE_MAX_BYTES = 2 * 1024 * 1024
+
+# Los atlas no cambian nunca (el nombre depende del contenido)
+ATLAS_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "frontend")
+
+ATLAS_NAME = re.compile(r"^atlas-[0-9a-f]{16}\.png$")
+
+router = APIRouter()
+
+class SpriteAtlas(NamedTuple):
+    name: str
+    width: int
+    height: int
+    # image_url -> (x, y) de la esquina superior izquierda
+    positions: dict
+
+    @property
+    def url(self) -> str:
+        return f"/api/catalog/sprites/{self.name}"
+
+    def coordinates(self, image_url: str) -> Optional[dict]:
+        """Posición de una imagen en el atlas, o None si no está"""
+        position = self.positions.get(image_url)
+        if position is None:
+            return None
+        return {
+            "url": self.url,
+            "x": position[0],
+            "y": position[1],
+            "width": SPRITE_SIZE,
+            "height": SPRITE_SIZE,
+            "atlas_width": self.width,
+            "atlas_height": self.height
+        }
+
+_atlas: Optional[SpriteAtlas] = None
+_pending = None
+_task: Optional[asyncio.Task] = None
+
+def get_atlas() -> Optional[SpriteAtlas]:
+    return _atlas
+
+def _write_atomic(path: str, data: bytes):
+    """Escribe el fichero de una vez: otro worker nunca ve un fichero a medias"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+def _local_path(image_url: str) -> Optional[str]:
+    """Ruta dentro del frontend de una image_url local (/img/...), si lo es"""
+    if not image_url.startswith("/") or image_url.startswith("//"):
+        return None
+    path = os.path.realpath(os.path.join(FRONTEND_DIR, image_url.lstrip("/")))
+    if not path.startswith(os.path.realpath(FRONTEND_DIR) + os.sep):
+        return None
+    return path
+
+def load_source(image_url: str) -> bytes:
+    """Bytes de la imagen original: local, de la caché en disco o descargada una vez"""
+    local = _local_path(image_url)
+    if local:
+        with open(local, "rb") as f:
+            return f.read()
+
+    digest = hashlib.sha1(image_url.encode("utf-8")).hexdigest()
+    cached = os.path.join(SPRITE_CACHE_DIR, "sources", digest)
+    if os.path.exists(cached):
+        with open(cached, "rb") as f:
+            return f.read()
+
+    with requests.get(image_url, timeout=SPRITE_FETCH_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        data = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            data.extend(chunk)
+            if len(data) > SPRITE_MAX_BYTES:
+                raise ValueError(f"La imagen supera {SPRITE_MAX_BYTES} bytes")
+    _write_atomic(cached, bytes(data))
+    return bytes(data)
+
+def normalize(data: bytes) -> Image.Image:
+    """Ajusta la imagen a un cuadrado de SPRITE_SIZE px conservando la proporción"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGBA")
+    image.thumbnail((SPRITE_SIZE, SPRITE_SIZE), Image.LANCZOS)
+    tile = Image.new("RGBA", (SPRITE_SIZE, SPRITE_SIZE), (0, 0, 0, 0))
+    tile.paste(image, ((SPRITE_SIZE - image.width) // 2, (SPRITE_SIZE - image.height) // 2))
+    return tile
+
+def build_atlas(image_urls) -> SpriteAtlas:
+    """Genera el atlas de las imágenes indicadas y lo guarda en SPRITE_CACHE_DIR"""
+    sources = frozenset(url for url in image_urls if url)
+    tiles = {}
+    for image_url in sorted(sources):
+        try:
+            tiles[image_url] = normalize(load_source(image_url))
+        except Exception as e:
+            print(f"No se pudo añadir la imagen {image_url} al atlas: {e}")
+
+    columns = max(min(SPRITE_COLUMNS, len(tiles)), 1)
+    rows = max((len(tiles) + columns - 1) // columns, 1)
+    atlas = Image.new("RGBA", (columns * SPRITE_SIZE, rows * SPRITE_SIZE), (0, 0, 0, 0))
+    positions = {}
+    for index, (image_url, tile) in enumerate(tiles.items()):
+        position = ((index % columns) * SPRITE_SIZE, (index // columns) * SPRITE_SIZE)
+        atlas.paste(tile, position)
+        positions[image_url] = position
+
+    buffer = io.BytesIO()
+    atlas.save(buffer, format="PNG", optimize=True)
+    data = buffer.getvalue()
+    name = f"atlas-{hashlib.sha1(data).hexdigest()[:16]}.png"
+    path = os.path.join(SPRITE_CACHE_DIR, name)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+    return SpriteAtlas(name, atlas.width, atlas.height, positions)
+
+async def refresh(tree_catalog) -> Optional[SpriteAtlas]:
+    """
+    Regenera el atlas si las image_url del catálogo no coinciden con las del
+    atlas actual (las que no se pudieron cargar se reintentan en el siguiente cambio)
+    """
+    global _atlas
+    image_urls = frozenset(entry.image_url for entry in tree_catalog.entries if entry.image_url)
+    if _atlas is not None and _atlas.positions.keys() == image_urls:
+        return _atlas
+    # La descarga y el empaquetado bloquean: se hacen fuera del bucle de eventos
+    _atlas = await run_in_threadpool(build_atlas, image_urls)
+    print(f"Atlas de sprites {_atlas.name} generado con {len(_atlas.positions)} imágenes")
+    return _atlas
+
+async def _refresh_pending():
+    global _pending
+    while _pending is not None:
+        tree_catalog, _pending = _pending, None
+        try:
+            await refresh(tree_catalog)
+        except Exception as e:
+            print(f"Error al generar el atlas de sprites: {e}")
+
+def schedule_refresh(tree_catalog):
+    """
+    Programa la regeneración del atlas sin bloquear a quien cambia el catálogo.
+    Si ya hay una en curso, al terminar se procesa el catálogo más reciente.
+    """
+    global _pending, _task
+    _pending = tree_catalog
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_refresh_pending())
+
+@router.get("/catalog/sprites/{name}", include_in_schema=False)
+async def get_sprite_atlas(name: str):
+    """Imagen del atlas de sprites, cacheable indefinidamente"""
+    path = os.path.join(SPRITE_CACHE_DIR, name)
+    if not ATLAS_NAME.match(name) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Atlas no encontrado")
+    return FileResponse(path, media_type="image/png", headers={"Cache-Control": ATLAS_CACHE_CONTROL})
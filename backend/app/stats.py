@@ -1,33 +1,28 @@
 from fastapi import APIRouter, Depends
 from typing import Dict
-from app.auth import get_current_user
-from app.database import db
+from app.auth import get_current_identity, load_user_fields
+from app import repository
 
 router = APIRouter()
 
 @router.post("/user/stats/update")
-async def update_user_stats(stats: Dict, current_user = Depends(get_current_user)):
+async def update_user_stats(stats: Dict, current_user = Depends(get_current_identity)):
     # Actualizar las estadísticas del usuario
-    db.users.update_one(
-        {"username": current_user["username"]},
-        {"$set": {
-            "pomodoros_completed": stats.get("pomodoros_completed", 0),
-            "total_focus_minutes": stats.get("total_focus_minutes", 0)
-        }}
+    await repository.update_user_stats(
+        current_user["username"],
+        stats.get("pomodoros_completed", 0),
+        stats.get("total_focus_minutes", 0)
     )
     return {"status": "Estadísticas actualizadas correctamente"}
 
 @router.get("/user/stats")
-async def get_user_stats(current_user = Depends(get_current_user)):
-    # Obtener información del usuario
-    user = db.users.find_one({"username": current_user["username"]})
-    
-    # Contar los árboles
-    trees = user.get("trees", [])
-    total_trees = len(trees)
+async def get_user_stats(current_user = Depends(get_current_identity)):
+    # Obtener solo los contadores del usuario
+    user = await load_user_fields(current_user, "total_trees", "pomodoros_completed", "total_focus_minutes")
     
+    # El contador se mantiene al crear y borrar árboles, sin cargar el bosque
     return {
-        "total_trees": total_trees,
+        "total_trees": user.get("total_trees", 0),
         "pomodoros_completed": user.get("pomodoros_completed", 0),
         "total_focus_minutes": user.get("total_focus_minutes", 0)
     }
@@ -1,10 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, File, Query, UploadFile
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from bson import ObjectId
 from app.auth import get_current_user
-from app.database import db
+from app import repository, catalog
 from datetime import datetime
+import csv
+import io
+import json
+import math
 
 router = APIRouter()
 
@@ -18,6 +23,86 @@ class TreeTemplate(BaseModel):
 class TreeTemplateInDB(TreeTemplate):
     id: str
 
+# Límites de la importación masiva
+MAX_IMPORT_BYTES = 5 * 1024 * 1024
+MAX_IMPORT_TEMPLATES = 5000
+MAX_IMPORT_ERRORS = 50
+
+# Columnas de la exportación (también son las que acepta la importación)
+TEMPLATE_EXPORT_FIELDS = ("name", "category", "description", "image_url", "probability")
+
+def parse_template_file(filename: str, content: bytes) -> list:
+    """
+    Lee las filas de un fichero de plantillas JSON (lista de objetos o
+    {"templates": [...]}) o CSV (con cabecera). Lanza ValueError si el formato
+    no es válido.
+    """
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("El fichero debe estar codificado en UTF-8")
+
+    if filename.lower().endswith(".csv"):
+        rows = list(csv.DictReader(io.StringIO(text)))
+        # En CSV una probabilidad vacía significa "usar el valor por defecto"
+        for row in rows:
+            if not (row.get("probability") or "").strip():
+                row.pop("probability", None)
+        return rows
+
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON no válido: {e}")
+    if isinstance(data, dict):
+        data = data.get("templates")
+    if not isinstance(data, list):
+        raise ValueError("El JSON debe ser una lista de plantillas o un objeto con la clave 'templates'")
+    return data
+
+def validate_templates(rows: list):
+    """
+    Valida las filas importadas.
+
+    Returns:
+        Tupla (plantillas válidas, errores). Cada error indica la fila (empezando en 1).
+    """
+    templates = []
+    errors = []
+    seen = set()
+    for row_number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({"row": row_number, "error": "La fila debe ser un objeto"})
+            continue
+        values = {key: value.strip() if isinstance(value, str) else value for key, value in row.items() if key}
+        try:
+            template = TreeTemplate(**values)
+        except ValidationError as e:
+            fields = ", ".join(".".join(str(part) for part in error["loc"]) for error in e.errors())
+            errors.append({"row": row_number, "error": f"Campos no válidos: {fields}"})
+            continue
+        if not template.name:
+            errors.append({"row": row_number, "error": "El nombre no puede estar vacío"})
+        elif not math.isfinite(template.probability):
+            errors.append({"row": row_number, "error": "La probabilidad debe ser un número finito"})
+        elif template.probability < 0:
+            errors.append({"row": row_number, "error": "La probabilidad no puede ser negativa"})
+        elif template.name in seen:
+            errors.append({"row": row_number, "error": f"Nombre repetido en el fichero: {template.name}"})
+        else:
+            seen.add(template.name)
+            templates.append(template.dict())
+    return templates, errors
+
+def check_probability(template: TreeTemplate):
+    """
+    Rechaza probabilidades NaN o infinitas con un 400. No se valida en el modelo
+    porque FastAPI devolvería el valor en el cuerpo del 422 y no podría
+    serializarlo a JSON.
+    """
+    if not math.isfinite(template.probability):
+        raise HTTPException(status_code=400, detail="La probabilidad debe ser un número finito")
+
 # Función auxiliar para verificar si un usuario es administrador
 async def is_admin(current_user = Depends(get_current_user)):
     # Esta es una implementación simple, podrías expandirla según tus necesidades
@@ -30,33 +115,13 @@ async def get_tree_templates(current_user = Depends(is_admin)):
     """
     Obtiene todos los templates de árboles disponibles (solo admin)
     """
-    # Primero buscamos los marcados explícitamente como plantillas
-    templates = list(db.trees.find({"is_template": True}))
-      # Si tenemos plantillas explícitas, las devolvemos
-    if templates and len(templates) > 0:
-        result = []
-        for tree in templates:
-            result.append({
-                "id": str(tree["_id"]),
-                "name": tree["name"],
-                "category": tree["category"],
-                "description": tree["description"],
-                "image_url": tree["image_url"],
-                "probability": tree.get("probability", 20.0)  # Usar valor por defecto si no existe
-            })
-        return result
+    # La vista tree_catalog ya contiene las plantillas o, si no hay ninguna,
+    # un árbol por nombre de los árboles antiguos
+    templates = await repository.find_tree_catalog()
     
-    # Plan B: Si no hay plantillas explícitas, usamos agrupación por nombre
-    pipeline = [
-        {"$group": {"_id": "$name", "tree": {"$first": "$$ROOT"}}},
-        {"$replaceRoot": {"newRoot": "$tree"}},
-        {"$project": {"_id": 1, "name": 1, "category": 1, "description": 1, "image_url": 1, "probability": 1}}
-    ]
-    
-    tree_templates = list(db.trees.aggregate(pipeline))
-      # Transformar los objetos ObjectId a string para serialización JSON
+    # Transformar los objetos ObjectId a string para serialización JSON
     result = []
-    for tree in tree_templates:
+    for tree in templates:
         result.append({
             "id": str(tree["_id"]),
             "name": tree["name"],
@@ -80,68 +145,135 @@ async def create_tree_template(template: TreeTemplate, current_user = Depends(is
     
     if not current_user.get("id"):
         raise HTTPException(status_code=400, detail="ID de administrador no encontrado")
+    check_probability(template)
         
-    # Verificar si ya existe un template con el mismo nombre
-    existing = db.trees.find_one({
-        "name": template.name,
-        "is_template": True
-    })
-    
-    if existing:        # Actualizar en lugar de crear duplicado
-        db.trees.update_one(
-            {"_id": existing["_id"]},
-            {"$set": {
-                "category": template.category,
-                "description": template.description,
-                "image_url": template.image_url,
-                "probability": template.probability,  # Incluimos la probabilidad
-                "updated_at": datetime.utcnow()
-            }}
-        )
-        return {**template.dict(), "id": str(existing["_id"])}
-      # Si no existe, crear nuevo
-    new_template = {
-        "name": template.name,
+    # Crear la plantilla o, si ya existe una con el mismo nombre, actualizarla
+    fields = {
         "category": template.category,
         "description": template.description,
         "image_url": template.image_url,
-        "probability": template.probability,  # Incluimos la probabilidad
-        "is_template": True,  # Marcamos como plantilla
-        "user_id": current_user["id"],  # Asignamos al administrador como propietario
-        "created_at": datetime.utcnow()
+        "probability": template.probability  # Incluimos la probabilidad
     }
+    template_id, previous = await repository.upsert_template_by_name(template.name, fields, current_user["id"])
+    await catalog.publish_change([template_id])
     
-    # Insertamos directamente en la colección trees
-    result = db.trees.insert_one(new_template)
-    new_id = str(result.inserted_id)
+    # Si la plantilla ya existía, sus cambios se propagan a los árboles antiguos
+    if previous is not None:
+        await repository.enqueue_propagation(template_id, previous, {**fields, "name": template.name})
     
-    return {**template.dict(), "id": new_id}
+    return {**template.dict(), "id": str(template_id)}
+
+@router.post("/admin/tree-templates/import")
+async def import_tree_templates(file: UploadFile = File(...), current_user = Depends(is_admin)):
+    """
+    Importa un conjunto de plantillas desde un fichero JSON o CSV (solo admin).
+    Las plantillas se crean o se actualizan por nombre; si alguna fila no es
+    válida no se importa ninguna.
+    """
+    content = await file.read(MAX_IMPORT_BYTES + 1)
+    if len(content) > MAX_IMPORT_BYTES:
+        raise HTTPException(status_code=413, detail="El fichero de plantillas es demasiado grande")
+
+    try:
+        rows = parse_template_file(file.filename or "", content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not rows:
+        raise HTTPException(status_code=400, detail="El fichero no contiene plantillas")
+    if len(rows) > MAX_IMPORT_TEMPLATES:
+        raise HTTPException(status_code=400, detail=f"Como máximo se pueden importar {MAX_IMPORT_TEMPLATES} plantillas")
+
+    templates, errors = validate_templates(rows)
+    if errors:
+        raise HTTPException(status_code=400, detail={
+            "message": "Hay plantillas no válidas; no se ha importado ninguna",
+            "errors": errors[:MAX_IMPORT_ERRORS],
+            "total_errors": len(errors)
+        })
+
+    previous = await repository.find_templates_by_names([template["name"] for template in templates])
+    result = await repository.bulk_upsert_templates(templates, current_user["id"])
+    # Una sola actualización de tree_catalog y del catálogo para todo el lote
+    await catalog.publish_change()
+    
+    # Las plantillas que ya existían propagan sus cambios a los árboles antiguos,
+    # todas en el mismo trabajo para recorrer los árboles una sola vez
+    await repository.enqueue_propagations([
+        (previous[template["name"]]["_id"], previous[template["name"]], template)
+        for template in templates if template["name"] in previous
+    ])
+
+    return {"received": len(templates), **result}
+
+@router.get("/admin/tree-templates/export")
+async def export_tree_templates(
+    format: str = Query("json", pattern="^(json|csv)$"),
+    current_user = Depends(is_admin)
+):
+    """
+    Exporta todas las plantillas en JSON o CSV (solo admin). La respuesta se
+    genera a medida que se leen las plantillas, sin cargarlas todas en memoria.
+    """
+    projection = {field: 1 for field in TEMPLATE_EXPORT_FIELDS}
+    projection["_id"] = 0
+
+    async def export_json():
+        yield "[\n"
+        first = True
+        async for template in repository.iter_templates(projection):
+            yield ("" if first else ",\n") + json.dumps(template, ensure_ascii=False)
+            first = False
+        yield "\n]\n"
+
+    async def export_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=TEMPLATE_EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        async for template in repository.iter_templates(projection):
+            writer.writerow(template)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+
+    if format == "csv":
+        body, media_type = export_csv(), "text/csv"
+    else:
+        body, media_type = export_json(), "application/json"
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="tree-templates.{format}"'
+    })
 
 @router.put("/admin/tree-templates/{template_id}", response_model=TreeTemplateInDB)
 async def update_tree_template(template_id: str, template: TreeTemplate, current_user = Depends(is_admin)):
     """
     Actualiza un template de árbol existente (solo admin)
     """
+    check_probability(template)
     try:
         object_id = ObjectId(template_id)
         
-    # Verificar que el template existe
-        existing = db.trees.find_one({"_id": object_id})
-        if not existing:
+        fields = {
+            "name": template.name,
+            "category": template.category,
+            "description": template.description,
+            "image_url": template.image_url,
+            "probability": template.probability  # Incluimos la probabilidad
+        }
+        
+        # Actualizar el template; si no existe no se modifica ningún documento
+        previous = await repository.update_template(object_id, fields)
+        
+        if previous is None:
             raise HTTPException(status_code=404, detail="Template de árbol no encontrado")
-          # Actualizar el template
-        db.trees.update_one(
-            {"_id": object_id},
-            {"$set": {
-                "name": template.name,
-                "category": template.category,
-                "description": template.description,
-                "image_url": template.image_url,
-                "probability": template.probability  # Incluimos la probabilidad
-            }}
-        )
+        await catalog.publish_change([object_id])
+        
+        # Las copias completas de los árboles antiguos se actualizan en segundo plano
+        await repository.enqueue_propagation(object_id, previous, fields)
         
         return {**template.dict(), "id": template_id}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error al actualizar template: {str(e)}")
 
@@ -152,12 +284,18 @@ async def delete_tree_template(template_id: str, current_user = Depends(is_admin
     """
     try:
         object_id = ObjectId(template_id)
-          # Eliminar el template
-        result = db.trees.delete_one({"_id": object_id})
         
-        if result.deleted_count == 0:
+        # Eliminar el template; los árboles compactos de los usuarios conservan
+        # antes una copia de sus datos
+        deleted = await repository.delete_template(object_id)
+        
+        if deleted is None:
             raise HTTPException(status_code=404, detail="Template de árbol no encontrado")
+        
+        await catalog.publish_change([object_id])
             
         return {"message": "Template de árbol eliminado correctamente"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error al eliminar template: {str(e)}")
\ No newline at end of file
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional
+from datetime import datetime
 from pydantic import BaseModel
 from bson import ObjectId
 from bson.errors import InvalidId
-from app.auth import get_current_user
-from app.database import db
+from app.auth import get_current_identity
+from app import repository, catalog
 
 router = APIRouter()
 
@@ -16,60 +17,165 @@ class Tree(BaseModel):
 
 class TreeInDB(Tree):
     id: str
+    # Los árboles del archivo en frío no se pueden editar ni eliminar
+    archived: bool = False
+
+class TreePage(BaseModel):
+    trees: List[TreeInDB]
+    next_cursor: Optional[str] = None
+
+class TreeSummary(BaseModel):
+    template_id: str
+    name: str
+    category: str
+    image_url: str
+    description: str
+    count: int
+    first_at: Optional[datetime] = None
+    last_at: Optional[datetime] = None
+
+# Tamaño máximo de página para GET /trees
+MAX_PAGE_SIZE = 500
+
+# Respuesta a las ediciones y borrados de árboles archivados
+ARCHIVED_TREE_DETAIL = "Los árboles archivados son de solo lectura y no se pueden modificar ni eliminar"
+
+# Valores por defecto si un árbol no tiene plantilla ni datos propios
+DEFAULT_TREE = {
+    "name": "Árbol",
+    "category": "General",
+    "description": "Un nuevo árbol en tu bosque",
+    "image_url": "https://cdn-icons-png.flaticon.com/512/628/628283.png"
+}
+
+async def find_templates(template_ids) -> dict:
+    """
+    Datos de detalle de las plantillas: se toman del catálogo en memoria y solo
+    se consultan en la base de datos las que no estén en él.
+    """
+    tree_catalog = await catalog.get_catalog()
+    templates = tree_catalog.details(template_ids)
+    missing = [template_id for template_id in template_ids if template_id not in templates]
+    if missing:
+        templates.update(await repository.find_templates_by_ids(missing))
+    return templates
+
+def tree_details(tree: dict, templates: dict) -> dict:
+    """
+    Construye la respuesta de un árbol del usuario.
+
+    Los campos guardados en el propio árbol (formato antiguo o ediciones del
+    usuario) tienen prioridad sobre los de su plantilla.
+    """
+    template = templates.get(tree.get("template_id"), {})
+    details = {"id": str(tree["_id"])}
+    for field in repository.TREE_DETAIL_FIELDS:
+        details[field] = tree.get(field, template.get(field, DEFAULT_TREE[field]))
+    return details
+
+@router.get("/trees", response_model=TreePage)
+async def get_trees(
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    archived: bool = False,
+    current_user = Depends(get_current_identity)
+):
+    """
+    Obtiene una página del bosque del usuario, del árbol más reciente al más antiguo.
+    Para pedir la siguiente página se envía el next_cursor de la respuesta anterior.
+
+    Con archived=true se leen los árboles antiguos del archivo en frío; cada
+    página corresponde a un lote archivado y el parámetro limit no se aplica.
+    Estos árboles llevan archived=true y son de solo lectura.
+    """
+    if archived:
+        return await get_archived_trees(current_user, cursor)
+
+    after = None
+    if cursor:
+        after = repository.decode_tree_cursor(cursor)
+        if after is None:
+            raise HTTPException(status_code=400, detail="Cursor de paginación no válido")
 
-@router.get("/trees", response_model=List[TreeInDB])
-async def get_trees(current_user = Depends(get_current_user)):
     try:
-        user_id = current_user.get("id")
-        if not user_id and "_id" in current_user:
-            user_id = str(current_user["_id"])
-        
-        # Buscar el usuario por ID
-        user = db.users.find_one({"_id": ObjectId(user_id)})
-        
-        trees = []
-        if user and "trees" in user:
-            # Obtener los árboles directamente del campo trees del usuario
-            for tree in user.get("trees", []):
-                trees.append({
-                    "id": tree["_id"],
-                    "name": tree["name"],
-                    "category": tree["category"],
-                    "image_url": tree["image_url"],
-                    "description": tree["description"]
-                })
-        
+        user_id = current_user["id"]
+
+        # Usuarios que aún tienen el antiguo array embebido se migran en su primera lectura
+        if not cursor:
+            await repository.migrate_embedded_trees(user_id)
+
+        documents = await repository.find_user_trees(user_id, limit, after)
+
+        # Los árboles compactos solo guardan template_id: unimos los datos de la plantilla
+        template_ids = {tree["template_id"] for tree in documents if tree.get("template_id")}
+        templates = await find_templates(template_ids) if template_ids else {}
+
+        trees = [tree_details(tree, templates) for tree in documents]
+
+        next_cursor = None
+        if len(documents) == limit:
+            next_cursor = repository.encode_tree_cursor(documents[-1])
+
         # Registramos información para depuración
         print(f"Obtenidos {len(trees)} árboles para el usuario {user_id}")
-        return trees
+        return {"trees": trees, "next_cursor": next_cursor}
     except Exception as e:
         print(f"Error en get_trees: {e}")
-        return []
+        return {"trees": [], "next_cursor": None}
+
+async def get_archived_trees(current_user, cursor: Optional[str]):
+    user_id = current_user["id"]
+
+    documents, chunk_id = await repository.find_archived_trees(user_id, cursor)
+
+    template_ids = {tree["template_id"] for tree in documents if tree.get("template_id")}
+    templates = await find_templates(template_ids) if template_ids else {}
+
+    return {
+        "trees": [{**tree_details(tree, templates), "archived": True} for tree in documents],
+        "next_cursor": chunk_id
+    }
+
+@router.get("/trees/summary", response_model=List[TreeSummary])
+async def get_trees_summary(current_user = Depends(get_current_identity)):
+    """
+    Resumen compacto del inventario: cuántos árboles de cada plantilla tiene el
+    usuario y cuándo consiguió el primero y el último.
+    """
+    user_id = current_user["id"]
+
+    counts = await repository.find_user_tree_counts(user_id)
+    template_ids = [ObjectId(template_id) for template_id in counts]
+    templates = await find_templates(template_ids) if template_ids else {}
+
+    summary = []
+    for template_id, entry in counts.items():
+        template = templates.get(ObjectId(template_id))
+        if not template or entry.get("count", 0) <= 0:
+            continue
+        summary.append({
+            "template_id": template_id,
+            **{field: template.get(field, DEFAULT_TREE[field]) for field in repository.TREE_DETAIL_FIELDS},
+            "count": entry["count"],
+            "first_at": entry.get("first_at"),
+            "last_at": entry.get("last_at")
+        })
+    return summary
 
 @router.delete("/trees/{tree_id}")
-async def delete_tree(tree_id: str, current_user = Depends(get_current_user)):
+async def delete_tree(tree_id: str, current_user = Depends(get_current_identity)):
     try:
-        # Asegurarnos de que tenemos un ID de usuario válido
-        user_id = current_user.get("id")
-        if not user_id:
-            # Si no hay un id, intentamos usar _id como respaldo
-            user_id = str(current_user.get("_id", ""))
-            if not user_id:
-                raise HTTPException(status_code=400, detail="ID de usuario no encontrado")
-            
+        user_id = current_user["id"]
+        
         # Registrar información para depuración
         print(f"Intentando eliminar árbol: {tree_id}, Usuario: {user_id}")
         
-        # Eliminar el árbol del array trees del usuario
-        result = db.users.update_one(
-            {"_id": ObjectId(user_id)},
-            {
-                "$pull": {"trees": {"_id": tree_id}},
-                "$inc": {"total_trees": -1}  # Actualizar contador de árboles
-            }
-        )
+        # Eliminar el árbol del inventario del usuario
+        deleted = await repository.delete_user_tree(user_id, tree_id)
         
-        if result.modified_count == 0:
+        if not deleted:
+            if await repository.is_archived_tree(user_id, tree_id):
+                raise HTTPException(status_code=409, detail=ARCHIVED_TREE_DETAIL)
             raise HTTPException(status_code=404, detail="Árbol no encontrado o no tienes permiso para eliminarlo")
             
         # Registrar éxito
@@ -83,39 +189,22 @@ async def delete_tree(tree_id: str, current_user = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=f"Error al eliminar árbol: {str(e)}")
 
 @router.put("/trees/{tree_id}")
-async def update_tree(tree_id: str, tree: Tree, current_user = Depends(get_current_user)):
+async def update_tree(tree_id: str, tree: Tree, current_user = Depends(get_current_identity)):
     # Obtenemos el ID del usuario
-    user_id = current_user.get("id")
-    if not user_id and "_id" in current_user:
-        user_id = str(current_user["_id"])
-    
-    # Buscar el usuario por ID
-    user = db.users.find_one({"_id": ObjectId(user_id)})
-    tree_exists = False
+    user_id = current_user["id"]
     
-    # Verificar si el árbol existe en el array trees del usuario
-    if user and "trees" in user:
-        for t in user["trees"]:
-            if str(t.get("_id")) == tree_id:
-                tree_exists = True
-                break
+    # Actualizar el árbol en el inventario del usuario
+    updated = await repository.update_user_tree(user_id, tree_id, {
+        "name": tree.name,
+        "category": tree.category,
+        "image_url": tree.image_url,
+        "description": tree.description
+    })
     
-    if not tree_exists:
+    if not updated:
+        if await repository.is_archived_tree(user_id, tree_id):
+            raise HTTPException(status_code=409, detail=ARCHIVED_TREE_DETAIL)
         raise HTTPException(status_code=404, detail="Árbol no encontrado en tu inventario")
     
-    # Actualizar el árbol en el array trees del usuario
-    result = db.users.update_one(
-        {"_id": ObjectId(user_id), "trees._id": tree_id},
-        {"$set": {
-            "trees.$.name": tree.name,
-            "trees.$.category": tree.category,
-            "trees.$.image_url": tree.image_url,
-            "trees.$.description": tree.description
-        }}
-    )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=500, detail="No se pudo actualizar el árbol")
-    
     print(f"Árbol {tree_id} del usuario {user_id} actualizado correctamente")
     return {"message": "Árbol actualizado correctamente"}
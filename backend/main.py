@@ -8,8 +8,6 @@ from datetime import datetime, timedelta
 from pydantic import BaseModel
 from typing import Optional, List
 from dotenv import load_dotenv
-import pymongo
-from pymongo import MongoClient
 from bson import ObjectId
 
 # Importar componentes adicionales para servir archivos estáticos
@@ -18,18 +16,13 @@ from fastapi.responses import FileResponse, HTMLResponse
 
 # Importar tus rutas y modelos
 from app import auth, trees, pomodoro, stats
+from app.lifespan import lifespan
 
 # Load environment variables
 load_dotenv()
 
-# MongoDB connection
-MONGO_URI = os.getenv("MONGO_URI")
-if not MONGO_URI:
-    print("ADVERTENCIA: MONGO_URI no está configurada. Usando una conexión de respaldo.")
-    MONGO_URI = "mongodb://localhost:27017/"
-
-client = MongoClient(MONGO_URI)
-db = client["pomodoro_forest"]
+# La conexión a MongoDB (un único cliente por proceso) la gestiona app.database
+# y se abre y se cierra en el lifespan
 
 # JWT configuration
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -47,7 +40,7 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Initialize FastAPI
-app = FastAPI(title="Pomodoro Forest API")
+app = FastAPI(title="Pomodoro Forest API", lifespan=lifespan)
 
 # Configurar CORS
 origins = [
@@ -72,8 +65,11 @@ app.include_router(pomodoro.router, prefix="/api", tags=["Pomodoro"])
 app.include_router(stats.router, prefix="/api", tags=["User Statistics"])
 
 # Importar tree_templates para administración de plantillas
-from app import tree_templates
+from app import tree_templates, admin, health, sprites
 app.include_router(tree_templates.router, prefix="/api", tags=["Tree Templates"])
+app.include_router(admin.router, prefix="/api", tags=["Administration"])
+app.include_router(health.router, prefix="/api", tags=["Health"])
+app.include_router(sprites.router, prefix="/api", tags=["Tree Types"])
 
 # Sección para servir archivos estáticos - Más robusta
 try:
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Script de migración al formato compacto del inventario:
+1. Los árboles de user_trees que son una copia exacta de una plantilla pasan a
+   guardar solo su template_id (los editados por el usuario se dejan como están)
+2. Se recalcula el resumen users.tree_counts con el número de árboles de cada
+   plantilla y las fechas del primero y el último
+
+La API lee los dos formatos, así que el script se puede ejecutar en cualquier
+momento y tantas veces como se quiera.
+"""
+from app.database import db
+from app.migrations import run_migrations
+
+def compact_user_trees():
+    # Migración 5 de app.migrations
+    run_migrations(db, versions=[5], rerun=True)
+
+def rebuild_tree_counts():
+    # Migración 6 de app.migrations
+    run_migrations(db, versions=[6], rerun=True)
+
+if __name__ == "__main__":
+    print("Iniciando migración al inventario compacto...")
+    compact_user_trees()
+    rebuild_tree_counts()
+    print("Migración completada exitosamente!")
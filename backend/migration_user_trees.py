@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Script de migración para mover el bosque de cada usuario desde el array
+embebido 'users.trees' a la colección 'user_trees'.
+
+Cada árbol pasa a ser un documento {_id, user_id, created_at, name, category,
+description, image_url}; después se elimina el array del usuario y se
+recalcula su contador total_trees.
+
+El script es idempotente: se puede ejecutar varias veces sin duplicar árboles.
+La API también migra de forma perezosa a los usuarios que aún tengan el array
+la primera vez que consultan su inventario.
+"""
+from app.database import db
+from app.migrations import run_migrations
+
+def migrate_user_trees():
+    print("Iniciando migración de árboles de usuario a la colección user_trees...")
+    # Migración 3 de app.migrations: por lotes de usuarios y reanudable
+    run_migrations(db, versions=[3], rerun=True)
+
+if __name__ == "__main__":
+    migrate_user_trees()
@@ -0,0 +1,381 @@
+"""
+Base de datos en memoria para las pruebas.
+
+Implementa solo la parte de la API de pymongo/motor que usa la aplicación:
+consultas con los operadores habituales, actualizaciones con $set, $inc,
+$unset y $setOnInsert, bulk_write y las etapas de agregación de tree_catalog
+y de los recuentos de las migraciones.
+FakeDatabase es síncrona (como pymongo en app.migrations) y FakeAsyncDatabase
+la envuelve con la interfaz asíncrona de motor.
+"""
+import copy
+from bson import ObjectId
+from pymongo import InsertOne, ReturnDocument, UpdateMany, UpdateOne
+
+MISSING = object()
+
+def get_path(document, path: str):
+    value = document
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return MISSING
+    return value
+
+def set_path(document, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+def unset_path(document, path: str):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(parts[-1], None)
+
+def _compare(value, operator: str, expected) -> bool:
+    if operator == "$exists":
+        return (value is not MISSING) == bool(expected)
+    if operator == "$in":
+        return (None if value is MISSING else value) in expected
+    if operator == "$nin":
+        return (None if value is MISSING else value) not in expected
+    if operator == "$ne":
+        return (None if value is MISSING else value) != expected
+    if operator == "$elemMatch":
+        return isinstance(value, list) and any(matches(element, expected) for element in value)
+    if value is MISSING or value is None:
+        return False
+    if operator == "$gt":
+        return value > expected
+    if operator == "$gte":
+        return value >= expected
+    if operator == "$lt":
+        return value < expected
+    if operator == "$lte":
+        return value <= expected
+    raise NotImplementedError(operator)
+
+def matches(document, query) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(document, option) for option in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, option) for option in condition):
+                return False
+        else:
+            value = get_path(document, key)
+            if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+                if not all(_compare(value, op, expected) for op, expected in condition.items()):
+                    return False
+            elif isinstance(value, list) and not isinstance(condition, list):
+                if condition not in value:
+                    return False
+            elif (None if value is MISSING else value) != condition:
+                return False
+    return True
+
+def project(document, projection):
+    if not projection:
+        return copy.deepcopy(document)
+    include = {key for key, value in projection.items() if value and key != "_id"}
+    if include:
+        result = {key: copy.deepcopy(document[key]) for key in include if key in document}
+        if projection.get("_id", 1) and "_id" in document:
+            result["_id"] = document["_id"]
+        return result
+    return {key: copy.deepcopy(value) for key, value in document.items() if projection.get(key, 1)}
+
+def _sort_key(sort):
+    if isinstance(sort, str):
+        return [(sort, 1)]
+    return list(sort)
+
+def sort_documents(documents: list, sort) -> list:
+    for field, direction in reversed(_sort_key(sort)):
+        documents = sorted(documents, key=lambda document: get_path(document, field), reverse=direction < 0)
+    return documents
+
+def apply_update(document: dict, update: dict, inserting: bool = False):
+    for operator, fields in update.items():
+        if operator == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            if operator in ("$set", "$setOnInsert"):
+                set_path(document, path, copy.deepcopy(value))
+            elif operator == "$inc":
+                current = get_path(document, path)
+                set_path(document, path, (0 if current is MISSING else current) + value)
+            elif operator == "$unset":
+                unset_path(document, path)
+            else:
+                raise NotImplementedError(operator)
+
+class Result:
+    def __init__(self, **values):
+        self.inserted_id = None
+        self.matched_count = 0
+        self.modified_count = 0
+        self.upserted_count = 0
+        self.inserted_count = 0
+        self.deleted_count = 0
+        self.__dict__.update(values)
+
+class FakeCursor:
+    def __init__(self, documents: list):
+        self.documents = documents
+        self._skip = 0
+        self._limit = None
+
+    def sort(self, key, direction=None):
+        self.documents = sort_documents(self.documents, [(key, direction)] if direction is not None else key)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count or None
+        return self
+
+    def _results(self) -> list:
+        end = None if self._limit is None else self._skip + self._limit
+        return self.documents[self._skip:end]
+
+    def __iter__(self):
+        return iter(self._results())
+
+class FakeCollection:
+    def __init__(self, database, name: str):
+        self.database = database
+        self.name = name
+        self.documents = []
+
+    def _matching(self, query) -> list:
+        return [document for document in self.documents if matches(document, query)]
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([project(document, projection) for document in self._matching(query)])
+
+    def find_one(self, query=None, projection=None, sort=None):
+        documents = self._matching(query)
+        if sort:
+            documents = sort_documents(documents, sort)
+        return project(documents[0], projection) if documents else None
+
+    def count_documents(self, query) -> int:
+        return len(self._matching(query))
+
+    def distinct(self, field: str, query=None) -> list:
+        values = []
+        for document in self._matching(query):
+            value = get_path(document, field)
+            if value is not MISSING and value not in values:
+                values.append(value)
+        return values
+
+    def insert_one(self, document: dict):
+        document.setdefault("_id", ObjectId())
+        if any(existing["_id"] == document["_id"] for existing in self.documents):
+            raise ValueError(f"_id duplicado: {document['_id']}")
+        self.documents.append(copy.deepcopy(document))
+        return Result(inserted_id=document["_id"])
+
+    def insert_many(self, documents: list, ordered: bool = True):
+        for document in documents:
+            self.insert_one(document)
+        return Result(inserted_ids=[document["_id"] for document in documents])
+
+    def _upsert(self, query: dict, update: dict) -> dict:
+        document = {key: value for key, value in query.items() if not key.startswith("$") and not isinstance(value, dict)}
+        apply_update(document, update, inserting=True)
+        self.insert_one(document)
+        return document
+
+    def update_one(self, query, update, upsert: bool = False):
+        documents = self._matching(query)[:1]
+        if not documents:
+            if upsert:
+                document = self._upsert(query, update)
+                return Result(upserted_count=1, upserted_id=document["_id"])
+            return Result()
+        before = copy.deepcopy(documents[0])
+        apply_update(documents[0], update)
+        return Result(matched_count=1, modified_count=int(documents[0] != before))
+
+    def update_many(self, query, update, upsert: bool = False):
+        modified = 0
+        documents = self._matching(query)
+        for document in documents:
+            before = copy.deepcopy(document)
+            apply_update(document, update)
+            modified += document != before
+        return Result(matched_count=len(documents), modified_count=modified)
+
+    def replace_one(self, query, replacement, upsert: bool = False):
+        documents = self._matching(query)[:1]
+        if documents:
+            replacement = {**copy.deepcopy(replacement), "_id": documents[0]["_id"]}
+            self.documents[self.documents.index(documents[0])] = replacement
+            return Result(matched_count=1, modified_count=1)
+        if upsert:
+            self.insert_one(copy.deepcopy(replacement))
+            return Result(upserted_count=1)
+        return Result()
+
+    def find_one_and_update(self, query, update, projection=None, sort=None, upsert: bool = False,
+                            return_document=ReturnDocument.BEFORE):
+        documents = self._matching(query)
+        if sort:
+            documents = sort_documents(documents, sort)
+        if not documents:
+            if not upsert:
+                return None
+            document = self._upsert(query, update)
+            return project(document, projection) if return_document == ReturnDocument.AFTER else None
+        before = copy.deepcopy(documents[0])
+        apply_update(documents[0], update)
+        return project(documents[0] if return_document == ReturnDocument.AFTER else before, projection)
+
+    def find_one_and_delete(self, query, projection=None):
+        documents = self._matching(query)[:1]
+        if not documents:
+            return None
+        self.documents.remove(documents[0])
+        return project(documents[0], projection)
+
+    def delete_many(self, query):
+        documents = self._matching(query)
+        self.documents = [document for document in self.documents if document not in documents]
+        return Result(deleted_count=len(documents))
+
+    def bulk_write(self, operations: list, ordered: bool = True):
+        result = Result()
+        for operation in operations:
+            if isinstance(operation, InsertOne):
+                self.insert_one(copy.deepcopy(operation._doc))
+                result.inserted_count += 1
+                continue
+            write = self.update_many if isinstance(operation, UpdateMany) else self.update_one
+            outcome = write(operation._filter, operation._doc, upsert=operation._upsert)
+            result.matched_count += outcome.matched_count
+            result.modified_count += outcome.modified_count
+            result.upserted_count += outcome.upserted_count
+        return result
+
+    def aggregate(self, pipeline: list, **kwargs):
+        documents = [copy.deepcopy(document) for document in self.documents]
+        for stage in pipeline:
+            (operator, spec), = stage.items()
+            if operator == "$match":
+                documents = [document for document in documents if matches(document, spec)]
+            elif operator == "$project":
+                documents = [project(document, spec) for document in documents]
+            elif operator == "$set":
+                for document in documents:
+                    document.update(copy.deepcopy(spec))
+            elif operator == "$sort":
+                documents = sort_documents(documents, list(spec.items()))
+            elif operator == "$group":
+                groups = {}
+                for document in documents:
+                    key = get_path(document, spec["_id"][1:])
+                    group = groups.setdefault(key, {"_id": key})
+                    for field, accumulator in spec.items():
+                        if field == "_id":
+                            continue
+                        if accumulator == {"$first": "$$ROOT"}:
+                            group.setdefault(field, document)
+                        elif "$sum" in accumulator:
+                            value = accumulator["$sum"]
+                            value = get_path(document, value[1:]) if isinstance(value, str) else value
+                            group[field] = group.get(field, 0) + value
+                        else:
+                            raise NotImplementedError(accumulator)
+                documents = list(groups.values())
+            elif operator == "$replaceRoot":
+                documents = [get_path(document, spec["newRoot"][1:]) for document in documents]
+            elif operator == "$merge":
+                target = self.database[spec["into"]]
+                for document in documents:
+                    target.replace_one({"_id": document["_id"]}, document, upsert=True)
+                documents = []
+            else:
+                raise NotImplementedError(operator)
+        return FakeCursor(documents)
+
+class FakeDatabase:
+    """Base de datos síncrona: cada colección se crea al usarla"""
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self, name)
+        return self.collections[name]
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+class FakeAsyncCursor:
+    def __init__(self, cursor: FakeCursor):
+        self.cursor = cursor
+
+    def sort(self, *args):
+        self.cursor.sort(*args)
+        return self
+
+    def skip(self, count: int):
+        self.cursor.skip(count)
+        return self
+
+    def limit(self, count: int):
+        self.cursor.limit(count)
+        return self
+
+    async def to_list(self, length=None):
+        documents = list(self.cursor)
+        return documents if length is None else documents[:length]
+
+    def __aiter__(self):
+        async def iterate():
+            for document in self.cursor:
+                yield document
+        return iterate()
+
+class FakeAsyncCollection:
+    # Métodos que devuelven un cursor en lugar de una corrutina
+    CURSORS = ("find", "aggregate")
+
+    def __init__(self, collection: FakeCollection):
+        self.sync = collection
+
+    def __getattr__(self, name: str):
+        method = getattr(self.sync, name)
+        if name in self.CURSORS:
+            return lambda *args, **kwargs: FakeAsyncCursor(method(*args, **kwargs))
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+class FakeAsyncDatabase:
+    """La misma base de datos con la interfaz asíncrona de motor"""
+    def __init__(self, sync: FakeDatabase = None):
+        self.sync = sync or FakeDatabase()
+
+    def __getitem__(self, name: str) -> FakeAsyncCollection:
+        return FakeAsyncCollection(self.sync[name])
+
+    def __getattr__(self, name: str) -> FakeAsyncCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timedelta
+from app.analytics import chi_square_p_value, drop_report, hour_bucket
+from app.catalog import CatalogEntry
+
+def test_chi_square_p_value_matches_reference_values():
+    # Valores críticos de tablas: P(X² ≥ x) para k grados de libertad
+    assert abs(chi_square_p_value(11.07, 5) - 0.05) < 0.002
+    assert abs(chi_square_p_value(29.59, 10) - 0.001) < 0.0005
+    assert chi_square_p_value(0.0, 3) > 0.99
+    assert chi_square_p_value(5.0, 0) == 1.0
+
+def test_entry_key_is_a_valid_field_name():
+    assert CatalogEntry.from_document({"name": "Pino.del $sur"}).key == "Pino_del _sur"
+
+class FakeDropStats:
+    def __init__(self, buckets):
+        self.buckets = buckets
+
+    async def find(self, query):
+        for bucket in self.buckets:
+            if bucket["hour"] >= query["hour"]["$gte"]:
+                yield bucket
+
+class FakeDb:
+    def __init__(self, buckets):
+        self.drop_stats = FakeDropStats(buckets)
+
+def bucket(hours_ago, version, counts, probabilities):
+    return {
+        "hour": hour_bucket(datetime.utcnow() - timedelta(hours=hours_ago)),
+        "version": version,
+        "total": sum(counts.values()),
+        "counts": counts,
+        "catalog": {key: {"name": key, "p": p} for key, p in probabilities.items()}
+    }
+
+def test_drop_report_uses_the_probabilities_of_each_catalog_version():
+    db = FakeDb([
+        bucket(2, 1, {"Pino": 500, "Roble": 500}, {"Pino": 0.5, "Roble": 0.5}),
+        # El catálogo cambió dentro de la ventana
+        bucket(1, 2, {"Pino": 900, "Roble": 100}, {"Pino": 0.9, "Roble": 0.1}),
+        # Fuera de la ventana
+        bucket(30, 1, {"Pino": 1000}, {"Pino": 0.5, "Roble": 0.5})
+    ])
+    report = asyncio.run(drop_report(db, hours=24))
+
+    expected = {template["key"]: template["expected"] for template in report["templates"]}
+    assert report["total"] == 2000
+    assert expected == {"Pino": 1400.0, "Roble": 600.0}
+    assert report["chi_square"] == 0.0
+    assert not report["deviation"]
+
+def test_drop_report_flags_real_deviations_but_not_low_counts():
+    skewed = asyncio.run(drop_report(FakeDb([bucket(0, 1, {"Pino": 700, "Roble": 300}, {"Pino": 0.5, "Roble": 0.5})])))
+    assert skewed["deviation"]
+
+    # Cada entrada rara espera 0,1 árboles: que salga una no es una desviación
+    probabilities = {"Pino": 0.99, **{f"Rara{i}": 0.001 for i in range(10)}}
+    rare = asyncio.run(drop_report(FakeDb([bucket(0, 1, {"Pino": 98, "Rara0": 2}, probabilities)])))
+    assert rare["low_counts"]
+    assert not rare["deviation"]
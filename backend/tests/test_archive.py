@@ -0,0 +1,25 @@
+from datetime import datetime
+from bson import ObjectId
+from app import archive
+
+def test_build_chunk_copies_template_details():
+    template_id = ObjectId()
+    user_id = ObjectId()
+    templates = {template_id: {"_id": template_id, "name": "Pino", "category": "Coníferas", "description": "d", "image_url": "i"}}
+    trees = [
+        {"_id": ObjectId(), "user_id": user_id, "created_at": datetime(2024, 1, 1), "template_id": template_id},
+        {"_id": ObjectId(), "user_id": user_id, "created_at": datetime(2024, 1, 2), "template_id": template_id, "name": "Mi pino"},
+        {"_id": ObjectId(), "user_id": user_id, "created_at": datetime(2024, 1, 3), "template_id": ObjectId()},
+    ]
+
+    chunk = archive.build_chunk(user_id, "2024-01", trees, templates)
+    stored = archive.decompress_trees(chunk["data"])
+
+    assert chunk["count"] == 3
+    assert chunk["tree_ids"] == [tree["_id"] for tree in trees]
+    assert stored[0]["name"] == "Pino" and stored[0]["image_url"] == "i"
+    assert "template_id" not in stored[0] and "user_id" not in stored[0]
+    # Los campos propios del árbol tienen prioridad
+    assert stored[1]["name"] == "Mi pino" and stored[1]["category"] == "Coníferas"
+    # Sin plantilla conocida el árbol se guarda tal cual
+    assert stored[2]["template_id"] == trees[2]["template_id"]
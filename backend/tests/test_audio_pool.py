@@ -0,0 +1,23 @@
+import asyncio
+import random
+from datetime import datetime
+from app.scrapers import audio_pool
+from app.scrapers.audio_scraper import extraer_audio
+
+def test_extract_audio_from_forest_page():
+    html = '<audio controls>\n  <source src="https://cdn.tree.fm/forest-41.mp3" type="audio/mpeg">\n</audio>'
+    assert extraer_audio(html) == "https://cdn.tree.fm/forest-41.mp3"
+    assert extraer_audio("<html></html>") is None
+
+def test_pick_uses_pool_and_falls_back_when_empty(monkeypatch):
+    monkeypatch.setattr(audio_pool, "_pool", {})
+    assert audio_pool.pick_audio_url() == audio_pool.FALLBACK_AUDIO_URL
+
+    entry = audio_pool.AudioEntry(41, "https://cdn.tree.fm/forest-41.mp3", datetime.utcnow())
+    monkeypatch.setattr(audio_pool, "_pool", {41: entry})
+    assert audio_pool.pick_audio_url(random.Random(1)) == entry.url
+
+def test_invalid_urls_are_rejected_without_network():
+    assert not asyncio.run(audio_pool.is_valid_audio(None))
+    assert not asyncio.run(audio_pool.is_valid_audio("http://cdn.tree.fm/forest.mp3"))
+    assert not asyncio.run(audio_pool.is_valid_audio("https://cdn.tree.fm/forest.html"))
@@ -0,0 +1,41 @@
+import asyncio
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from app import auth, repository
+
+def make_token(user):
+    return auth.create_access_token(auth.token_claims(user))
+
+def use_users(monkeypatch, users):
+    """Usuarios en memoria en lugar de MongoDB; el principal se carga en cada fallo de caché"""
+    async def find_user_by_username(username, projection=None):
+        user = users.get(username)
+        return dict(user) if user else None
+    monkeypatch.setattr(repository, "find_user_by_username", find_user_by_username)
+    auth.principal_cache.clear()
+
+def identity(token):
+    return asyncio.run(auth.get_current_identity(token))
+
+def test_identity_checks_revocation_and_role_on_a_cold_cache(monkeypatch):
+    user = {"_id": ObjectId(), "username": "ana", "is_admin": True, "token_version": 0}
+    token = make_token(user)
+    users = {"ana": user}
+    use_users(monkeypatch, users)
+
+    # Rol retirado y tokens revocados: el worker sin caché no se fía de los claims
+    users["ana"] = {**user, "is_admin": False}
+    assert identity(token)["is_admin"] is False
+
+    auth.principal_cache.clear()
+    users["ana"] = {**user, "token_version": 1}
+    with pytest.raises(HTTPException):
+        identity(token)
+
+def test_identity_rejects_deleted_users(monkeypatch):
+    user = {"_id": ObjectId(), "username": "bob", "token_version": 0}
+    token = make_token(user)
+    use_users(monkeypatch, {})
+    with pytest.raises(HTTPException):
+        identity(token)
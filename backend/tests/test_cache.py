@@ -0,0 +1,44 @@
+from app.cache import TTLCache
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_get_returns_value_until_ttl_expires():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=10, ttl=30, timer=timer)
+    cache.set("ana", {"id": "1"})
+
+    timer.now = 29
+    assert cache.get("ana") == {"id": "1"}
+
+    timer.now = 30
+    assert cache.get("ana") is None
+    assert cache.stats()["size"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_invalidate_and_counters():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("ana", 1)
+    assert cache.get("ana") == 1
+    cache.invalidate("ana")
+    assert cache.get("ana") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
@@ -0,0 +1,26 @@
+import random
+from collections import Counter
+from bson import ObjectId
+from app.catalog import Catalog, CatalogEntry
+
+def entry(name, probability, template_id=None):
+    return CatalogEntry.from_document({"_id": template_id, "name": name, "probability": probability, "is_template": template_id is not None})
+
+def test_pick_follows_weights():
+    catalog = Catalog([entry("Pino", 70), entry("Roble", 20), entry("Cerezo", 10), entry("Nunca", 0)])
+    rng = random.Random(42)
+    counts = Counter(catalog.pick(rng).name for _ in range(20000))
+
+    assert counts["Nunca"] == 0
+    assert abs(counts["Pino"] / 20000 - 0.7) < 0.02
+    assert abs(counts["Cerezo"] / 20000 - 0.1) < 0.02
+
+def test_missing_probability_uses_default_and_ids_are_indexed():
+    template_id = ObjectId()
+    catalog = Catalog([entry("Pino", None, template_id)])
+
+    assert catalog.total == 20.0
+    assert catalog.pick().name == "Pino"
+    assert catalog.details([template_id, ObjectId()]) == {
+        template_id: {"name": "Pino", "category": "General", "description": "Un nuevo árbol en tu bosque", "image_url": "https://cdn-icons-png.flaticon.com/512/628/628283.png"}
+    }
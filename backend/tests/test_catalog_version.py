@@ -0,0 +1,82 @@
+import asyncio
+from contextlib import asynccontextmanager
+from bson import ObjectId
+from app import catalog, repository, sprites
+from tests.fakes import FakeAsyncDatabase
+
+def use_db(monkeypatch):
+    db = FakeAsyncDatabase()
+    monkeypatch.setattr(repository, "get_async_db", lambda: db)
+    monkeypatch.setattr(sprites, "schedule_refresh", lambda tree_catalog: None)
+    monkeypatch.setattr(catalog, "_catalog", None)
+    monkeypatch.setattr(catalog, "_watching", False)
+    return db
+
+def add_template(db, name):
+    template_id = ObjectId()
+    db.sync.trees.insert_one({"_id": template_id, "name": name, "category": "c", "description": "d",
+                              "image_url": "i", "probability": 10, "is_template": True})
+    return template_id
+
+def names(tree_catalog):
+    return sorted(entry.name for entry in tree_catalog.entries)
+
+def test_publish_bumps_the_version_and_other_workers_reload(monkeypatch):
+    db = use_db(monkeypatch)
+    add_template(db, "Pino")
+
+    async def main():
+        published = await catalog.publish_change()
+        assert published.version == 1 and names(published) == ["Pino"]
+
+        # Otro worker publica una plantilla nueva
+        add_template(db, "Roble")
+        await repository.publish_tree_catalog()
+        assert names(await catalog.get_catalog()) == ["Pino"]
+
+        # Pasado CATALOG_CHECK_INTERVAL se compara la versión y se recarga
+        monkeypatch.setattr(catalog, "_last_check", 0)
+        reloaded = await catalog.get_catalog()
+        assert reloaded.version == 2 and names(reloaded) == ["Pino", "Roble"]
+    asyncio.run(main())
+    assert db.sync.catalog_meta.find_one({"_id": "trees"})["version"] == 2
+
+def test_change_stream_rebuilds_on_each_change(monkeypatch):
+    db = use_db(monkeypatch)
+    add_template(db, "Pino")
+    seen = []
+
+    class Stream:
+        def __aiter__(self):
+            async def changes():
+                add_template(db, "Roble")
+                await repository.publish_tree_catalog()
+                seen.append(catalog._watching)
+                yield {"operationType": "update"}
+            return changes()
+
+    @asynccontextmanager
+    async def watch():
+        yield Stream()
+    monkeypatch.setattr(repository, "watch_catalog_version", watch)
+
+    async def main():
+        await catalog.rebuild()
+        await catalog.watch_changes()
+        return await catalog.get_catalog()
+    watched = asyncio.run(main())
+
+    assert seen == [True]
+    assert names(watched) == ["Pino", "Roble"] and watched.version == 1
+    # Al cerrarse el stream se vuelve a comprobar la versión periódicamente
+    assert catalog._watching is False
+
+def test_unavailable_change_stream_falls_back_to_polling(monkeypatch):
+    use_db(monkeypatch)
+
+    def watch():
+        raise RuntimeError("The $changeStream stage is only supported on replica sets")
+    monkeypatch.setattr(repository, "watch_catalog_version", watch)
+
+    asyncio.run(catalog.watch_changes())
+    assert catalog._watching is False
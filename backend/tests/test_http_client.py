@@ -0,0 +1,45 @@
+import asyncio
+import httpx
+import pytest
+from app.scrapers import http_client
+
+def run_with(handler, monkeypatch, coroutine_factory):
+    """Ejecuta una petición con un transporte simulado en lugar de la red"""
+    monkeypatch.setattr(http_client, "SCRAPER_RETRY_BACKOFF", 0)
+
+    async def main():
+        monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        try:
+            return await coroutine_factory()
+        finally:
+            await http_client.close()
+    return asyncio.run(main())
+
+def test_retries_server_errors_and_returns_the_first_good_response(monkeypatch):
+    calls = []
+    def handler(request):
+        calls.append(request.url)
+        return httpx.Response(503 if len(calls) < 3 else 200, text="bosque")
+
+    result = run_with(handler, monkeypatch, lambda: http_client.fetch("https://www.tree.fm/forest/41", retries=2))
+    assert (result.status_code, result.text, len(calls)) == (200, "bosque", 3)
+
+def test_client_errors_are_not_retried(monkeypatch):
+    calls = []
+    def handler(request):
+        calls.append(request.url)
+        return httpx.Response(404)
+
+    result = run_with(handler, monkeypatch, lambda: http_client.fetch("https://www.tree.fm/forest/99"))
+    assert result.status_code == 404 and len(calls) == 1
+
+def test_large_responses_are_cut(monkeypatch):
+    handler = lambda request: httpx.Response(200, content=b"x" * 2048)
+    with pytest.raises(http_client.ResponseTooLarge):
+        run_with(handler, monkeypatch, lambda: http_client.fetch("https://www.tree.fm/forest/41", max_bytes=1024))
+
+def test_gives_up_after_bounded_retries(monkeypatch):
+    def handler(request):
+        raise httpx.ConnectTimeout("sin respuesta")
+    with pytest.raises(http_client.ScraperError):
+        run_with(handler, monkeypatch, lambda: http_client.fetch("https://www.tree.fm/forest/41", retries=1))
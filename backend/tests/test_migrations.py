@@ -0,0 +1,87 @@
+import pytest
+from bson import ObjectId
+from app import migrations
+from tests.fakes import FakeDatabase
+
+TEMPLATE = {"name": "Pino", "category": "Conífera", "description": "Un pino", "image_url": "pino.png"}
+
+def compact_db(copies: int, edited: int):
+    db = FakeDatabase()
+    template_id = db.trees.insert_one({**TEMPLATE, "is_template": True, "probability": 10}).inserted_id
+    user_id = ObjectId()
+    db.user_trees.insert_many([{"user_id": user_id, **TEMPLATE} for _ in range(copies)])
+    db.user_trees.insert_many([{"user_id": user_id, **TEMPLATE, "description": "Editado"} for _ in range(edited)])
+    return db, template_id
+
+class FailingCompact(migrations.CompactUserTrees):
+    """Falla al aplicar el lote número fail_on"""
+    def __init__(self, fail_on: int):
+        self.fail_on = fail_on
+        self.batches = 0
+
+    def apply(self, db, batch, dry_run):
+        self.batches += 1
+        if self.batches == self.fail_on:
+            raise RuntimeError("conexión perdida")
+        return super().apply(db, batch, dry_run)
+
+def test_compact_user_trees_only_compacts_identical_copies():
+    db, template_id = compact_db(copies=3, edited=2)
+
+    summary = migrations.run_migration(db, migrations.CompactUserTrees(), batch_size=2)
+
+    assert summary["processed"] == 5 and summary["written"] == 3
+    compacted = list(db.user_trees.find({"template_id": template_id}))
+    assert len(compacted) == 3
+    assert all("name" not in tree and "image_url" not in tree for tree in compacted)
+    assert db.user_trees.count_documents({"template_id": {"$exists": False}, "description": "Editado"}) == 2
+    state = db.migrations.find_one({"_id": 5})
+    assert state["status"] == "done" and state["last_id"] == db.user_trees.distinct("_id")[-1]
+
+def test_failed_migration_resumes_from_the_last_batch():
+    db, template_id = compact_db(copies=5, edited=0)
+
+    with pytest.raises(RuntimeError):
+        migrations.run_migration(db, FailingCompact(fail_on=2), batch_size=2)
+    state = db.migrations.find_one({"_id": 5})
+    assert state["status"] == "failed" and state["error"] == "conexión perdida"
+    assert state["processed"] == 2 and state["last_id"] == db.user_trees.distinct("_id")[1]
+    assert db.user_trees.count_documents({"template_id": template_id}) == 2
+
+    resumed = migrations.CompactUserTrees()
+    summary = migrations.run_migration(db, resumed, batch_size=2)
+    assert summary["processed"] == 5 and summary["written"] == 5
+    assert db.user_trees.count_documents({"template_id": template_id}) == 5
+
+    # Una migración completada no se repite salvo que se pida
+    assert migrations.run_migration(db, resumed)["status"] == "skipped"
+    assert migrations.run_migration(db, resumed, rerun=True)["processed"] == 0
+
+def test_skipped_documents_are_counted_across_a_resume():
+    db = FakeDatabase()
+    user_id = db.users.insert_one({"username": "ana"}).inserted_id
+    db.trees.insert_many([
+        {"user_id": "no-es-un-id", **TEMPLATE},
+        {"user_id": str(user_id), **TEMPLATE},
+        {"user_id": user_id, **TEMPLATE},
+        {"user_id": 12345, **TEMPLATE},
+    ])
+    legacy = migrations.LegacyTreesToUserTrees()
+    apply = legacy.apply
+    calls = []
+
+    def apply_once(db, batch, dry_run):
+        calls.append(batch)
+        if len(calls) == 2:
+            raise RuntimeError("conexión perdida")
+        return apply(db, batch, dry_run)
+    legacy.apply = apply_once
+
+    with pytest.raises(RuntimeError):
+        migrations.run_migration(db, legacy, batch_size=2)
+    assert db.migrations.find_one({"_id": 2})["skipped"] == 1
+
+    summary = migrations.run_migration(db, migrations.LegacyTreesToUserTrees(), batch_size=2)
+    assert summary["processed"] == 4 and summary["written"] == 2 and summary["skipped"] == 2
+    assert db.user_trees.count_documents({"user_id": user_id}) == 2
+    assert db.users.find_one({"_id": user_id})["total_trees"] == 2
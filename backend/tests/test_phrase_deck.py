@@ -0,0 +1,76 @@
+import asyncio
+import random
+from app import phrase_deck, repository
+
+def use_memory_decks(monkeypatch):
+    """Sustituye las operaciones de MongoDB del mazo por un diccionario"""
+    decks = {}
+
+    async def advance(user_id, size, digest):
+        deck = decks.get(user_id)
+        if deck and deck["d"] == digest and deck["c"] < size:
+            before = dict(deck)
+            deck["c"] += 1
+            return before
+        return None
+
+    async def find(user_id):
+        return dict(decks[user_id]) if user_id in decks else None
+
+    async def replace(user_id, previous, deck):
+        if decks.get(user_id) != previous:
+            return False
+        decks[user_id] = dict(deck)
+        return True
+
+    monkeypatch.setattr(repository, "advance_phrase_deck", advance)
+    monkeypatch.setattr(repository, "find_phrase_deck", find)
+    monkeypatch.setattr(repository, "replace_phrase_deck", replace)
+    return decks
+
+def draw(user_id, phrases, count, rng):
+    async def main():
+        return [await phrase_deck.next_phrase(user_id, phrases, "v1", rng) for _ in range(count)]
+    return asyncio.run(main())
+
+def test_each_user_sees_every_phrase_before_any_repeats(monkeypatch):
+    decks = use_memory_decks(monkeypatch)
+    phrases = tuple(f"Frase {i}" for i in range(10))
+    rng = random.Random(5)
+
+    first_round = draw("ana", phrases, 10, rng)
+    assert sorted(first_round) == sorted(phrases)
+    assert decks["ana"]["c"] == 10
+
+    # Al agotarse se baraja un mazo nuevo sin repetir la última frase
+    second_round = draw("ana", phrases, 10, rng)
+    assert sorted(second_round) == sorted(phrases)
+    assert second_round[0] != first_round[-1]
+
+    # Otro usuario tiene su propio mazo
+    assert sorted(draw("bob", phrases, 10, rng)) == sorted(phrases)
+
+def test_changed_corpus_reshuffles(monkeypatch):
+    decks = use_memory_decks(monkeypatch)
+    rng = random.Random(1)
+    draw("ana", ("a", "b", "c"), 2, rng)
+
+    async def main():
+        return await phrase_deck.next_phrase("ana", ("x", "y", "z", "w"), "v2", rng)
+    assert asyncio.run(main()) in ("x", "y", "z", "w")
+    assert decks["ana"]["d"] == "v2" and decks["ana"]["c"] == 1
+
+def test_new_deck_starting_with_the_last_phrase_swaps_instead_of_skipping(monkeypatch):
+    decks = use_memory_decks(monkeypatch)
+    phrases = tuple(f"Frase {i}" for i in range(5))
+    first_round = draw("ana", phrases, 5, random.Random(2))
+
+    # La siguiente semilla baraja un mazo que empieza por la última frase entregada
+    last = phrases.index(first_round[-1])
+    seed = next(seed for seed in range(1000) if phrase_deck.ShuffledDeck(5, seed)[0] == last)
+    monkeypatch.setattr(phrase_deck, "new_seed", lambda rng: seed)
+
+    second_round = draw("ana", phrases, 5, random.Random(3))
+    assert decks["ana"]["w"] is True
+    assert second_round[0] != first_round[-1]
+    assert sorted(second_round) == sorted(phrases)
@@ -0,0 +1,32 @@
+import json
+import os
+from app.scrapers.phrase_store import PhraseStore
+
+def test_store_reads_once_and_reloads_when_the_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / "frases.json"
+    path.write_text(json.dumps({"fecha": "2024-01-01", "frases": ["Uno", "Dos"]}), encoding="utf-8")
+    store = PhraseStore(str(path), check_interval=3600)
+    assert store.phrases() == ("Uno", "Dos")
+
+    # Dentro del intervalo no se vuelve a mirar el disco
+    monkeypatch.setattr(os, "stat", lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError("stat")))
+    assert store.phrases() == ("Uno", "Dos")
+    monkeypatch.undo()
+
+    store.check_interval = 0
+    path.write_text(json.dumps({"fecha": "2024-01-02", "version": 7, "frases": ["Tres otra vez"]}), encoding="utf-8")
+    snapshot = store.snapshot()
+    assert snapshot.phrases == ("Tres otra vez",) and snapshot.version == 7
+
+def test_save_is_atomic_and_bumps_the_version(tmp_path):
+    path = tmp_path / "frases.json"
+    store = PhraseStore(str(path), check_interval=0)
+    assert store.phrases() == ()
+
+    store.save(["Una frase nueva"])
+    snapshot = store.save(["Una frase nueva", "Otra frase"])
+
+    assert snapshot.version == 2
+    assert json.loads(path.read_text(encoding="utf-8"))["frases"] == ["Una frase nueva", "Otra frase"]
+    assert os.listdir(tmp_path) == ["frases.json"]
+    assert PhraseStore(str(path)).snapshot().version == 2
@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app import propagation
+from tests.fakes import FakeAsyncDatabase
+
+OLD = {"name": "Pino", "category": "c", "description": "d", "image_url": "viejo.png"}
+NEW = {**OLD, "image_url": "nuevo.png"}
+
+def use_db(monkeypatch, user_trees=0, users=0, fail_on=None):
+    """
+    Base de datos con copias completas y un _update_batch que registra los
+    rangos (el fake no implementa actualizaciones con pipeline ni arrayFilters)
+    """
+    monkeypatch.setattr(propagation, "PROPAGATION_BATCH_SIZE", 2)
+    monkeypatch.setattr(propagation, "PROPAGATION_PAUSE", 0)
+    db = FakeAsyncDatabase()
+    db.sync.user_trees.insert_many([{**OLD} for _ in range(user_trees)])
+    db.sync.users.insert_many([{"trees": [{**OLD}]} for _ in range(users)])
+    batches = []
+    failures = []
+
+    async def update_batch(db, job, id_range):
+        # Falla una sola vez, al llegar al lote fail_on
+        if len(batches) == fail_on and not failures:
+            failures.append(id_range)
+            raise RuntimeError("primario caído")
+        ids = [document["_id"] for document in db.sync[job["phase"]].find(id_range, {"_id": 1})]
+        batches.append((job["phase"], ids))
+        return len(ids)
+    monkeypatch.setattr(propagation, "_update_batch", update_batch)
+    return db, batches
+
+def job(db):
+    return db.sync.propagation_jobs.find_one({})
+
+def processed(batches, phase):
+    return [document_id for batch_phase, ids in batches if batch_phase == phase for document_id in ids]
+
+def test_enqueue_coalesces_edits_and_ignores_unchanged_copies(monkeypatch):
+    monkeypatch.setattr(propagation, "PROPAGATION_MAX_CHANGES", 2)
+    db = FakeAsyncDatabase()
+    edits = [(ObjectId(), OLD, NEW), (ObjectId(), OLD, {**OLD, "probability": 5}), (ObjectId(), OLD, NEW),
+             (ObjectId(), OLD, NEW)]
+
+    job_ids = asyncio.run(propagation.enqueue_many(db, edits))
+
+    jobs = [db.sync.propagation_jobs.find_one({"_id": job_id}) for job_id in job_ids]
+    assert [[change["template_id"] for change in job["changes"]] for job in jobs] == \
+        [[edits[0][0], edits[2][0]], [edits[3][0]]]
+    assert jobs[0]["changes"][0]["new"] == NEW and jobs[0]["phase"] == "user_trees"
+    assert asyncio.run(propagation.enqueue(db, ObjectId(), OLD, OLD)) is None
+
+def test_legacy_jobs_have_a_single_change():
+    template_id = ObjectId()
+    legacy = {"template_id": template_id, "old": OLD, "new": NEW}
+    assert propagation.job_changes(legacy) == [legacy]
+
+def test_job_walks_both_collections_in_batches(monkeypatch):
+    db, batches = use_db(monkeypatch, user_trees=5, users=3)
+    asyncio.run(propagation.enqueue(db, ObjectId(), OLD, NEW))
+
+    assert asyncio.run(propagation.run_pending_jobs(db)) == 1
+
+    assert [(phase, len(ids)) for phase, ids in batches] == \
+        [("user_trees", 2), ("user_trees", 2), ("user_trees", 1), ("users", 2), ("users", 1)]
+    assert processed(batches, "user_trees") == db.sync.user_trees.distinct("_id")
+    assert processed(batches, "users") == db.sync.users.distinct("_id")
+    finished = job(db)
+    assert finished["status"] == "done" and finished["phase"] is None
+    assert finished["batches"] == 5 and finished["modified"] == 8
+
+def test_failed_job_resumes_from_its_checkpoint(monkeypatch):
+    db, batches = use_db(monkeypatch, user_trees=5, users=1, fail_on=2)
+    asyncio.run(propagation.enqueue(db, ObjectId(), OLD, NEW))
+
+    assert asyncio.run(propagation.run_pending_jobs(db)) == 0
+    failed = job(db)
+    assert failed["status"] == "running" and failed["attempts"] == 1
+    assert failed["error"] == "primario caído"
+    assert failed["phase"] == "user_trees" and failed["last_id"] == batches[-1][1][-1]
+    assert failed["lease_until"] <= datetime.utcnow()
+
+    # Se reintenta sin esperar al lease y sin repetir los lotes ya aplicados
+    assert asyncio.run(propagation.run_pending_jobs(db)) == 1
+
+    assert processed(batches, "user_trees") == db.sync.user_trees.distinct("_id")
+    assert job(db)["status"] == "done" and job(db)["batches"] == 4
+
+def test_a_leased_job_is_only_taken_over_once_the_lease_expires(monkeypatch):
+    db, _ = use_db(monkeypatch, user_trees=3)
+    job_id = asyncio.run(propagation.enqueue(db, ObjectId(), OLD, NEW))
+    db.sync.propagation_jobs.update_one({"_id": job_id}, {"$set": {
+        "status": "running", "worker": "otro:1", "lease_until": datetime.utcnow() + timedelta(seconds=30)
+    }})
+
+    assert asyncio.run(propagation.claim_next_job(db)) is None
+
+    db.sync.propagation_jobs.update_one({"_id": job_id}, {"$set": {"lease_until": datetime.utcnow()}})
+    claimed = asyncio.run(propagation.claim_next_job(db))
+    assert claimed["_id"] == job_id and claimed["worker"] == propagation.WORKER_ID
+
+def test_worker_stops_when_another_worker_takes_over_its_job(monkeypatch):
+    db, batches = use_db(monkeypatch, user_trees=5)
+    asyncio.run(propagation.enqueue(db, ObjectId(), OLD, NEW))
+    claimed = asyncio.run(propagation.claim_next_job(db))
+    # Mientras se aplica el primer lote caduca el lease y otro worker retoma el trabajo
+    db.sync.propagation_jobs.update_one({"_id": claimed["_id"]}, {"$set": {"worker": "otro:1"}})
+
+    assert asyncio.run(propagation.run_job(db, claimed)) is None
+    assert len(batches) == 1
+    assert job(db)["last_id"] is None and job(db)["batches"] == 0
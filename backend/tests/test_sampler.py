@@ -0,0 +1,40 @@
+from collections import Counter
+from app.sampler import AliasSampler, ShuffledDeck, make_rng
+
+def test_alias_table_matches_weights_exactly():
+    weights = [5, 1, 3, 0, 1]
+    sampler = AliasSampler(weights)
+    total = sum(weights)
+
+    # Probabilidad de cada opción reconstruida a partir de la tabla
+    exact = [0.0] * len(weights)
+    for column in range(sampler.size):
+        exact[column] += sampler.prob[column] / sampler.size
+        exact[sampler.alias[column]] += (1 - sampler.prob[column]) / sampler.size
+
+    for probability, weight in zip(exact, weights):
+        assert abs(probability - weight / total) < 1e-9
+
+def test_draw_many_is_reproducible_with_seed():
+    sampler = AliasSampler([70, 20, 10])
+
+    first = sampler.draw_many(1000, make_rng(7, user_id="ana"))
+    assert first == sampler.draw_many(1000, make_rng(7, user_id="ana"))
+    assert first != sampler.draw_many(1000, make_rng(7, user_id="bob"))
+
+    counts = Counter(sampler.draw_many(20000, make_rng(1)))
+    assert abs(counts[0] / 20000 - 0.7) < 0.02
+
+def test_zero_weights_fall_back_to_uniform():
+    sampler = AliasSampler([0, 0])
+    assert set(sampler.draw_many(200, make_rng(3))) == {0, 1}
+
+def test_shuffled_deck_is_a_seeded_permutation():
+    for size in (1, 2, 7, 64, 1000):
+        deck = ShuffledDeck(size, seed=42)
+        assert sorted(deck[position] for position in range(size)) == list(range(size))
+
+    first = [ShuffledDeck(100, seed=1)[position] for position in range(100)]
+    assert first == [ShuffledDeck(100, seed=1)[position] for position in range(100)]
+    assert first != [ShuffledDeck(100, seed=2)[position] for position in range(100)]
+    assert first != list(range(100))
@@ -0,0 +1,29 @@
+import asyncio
+import random
+from app import scheduler
+
+def test_intervals_are_jittered_within_bounds():
+    rng = random.Random(3)
+    delays = [scheduler.next_delay(100, rng) for _ in range(1000)]
+    spread = 100 * scheduler.SCHEDULER_JITTER
+    assert all(100 - spread <= delay <= 100 + spread for delay in delays)
+    assert len(set(delays)) > 1
+
+def test_failed_refresh_is_recorded_and_cleared_on_success(monkeypatch):
+    monkeypatch.setattr(scheduler, "_status", {})
+    results = iter([RuntimeError("tree.fm no responde"), 26])
+
+    async def refresh():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    job = scheduler.ScheduledJob("audio", refresh, 60)
+    asyncio.run(scheduler.run_once(job))
+    assert scheduler._status["audio"]["last_error"] == "tree.fm no responde"
+
+    asyncio.run(scheduler.run_once(job))
+    status = scheduler._status["audio"]
+    assert (status["runs"], status["failures"], status["last_result"]) == (2, 1, 26)
+    assert "last_error" not in status and not status["running"]
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from app.catalog import Catalog, CatalogEntry
+from app.simulator import simulate, with_probabilities, expected_pomodoros_to_collect_all
+
+def make_catalog(**weights):
+    return Catalog(CatalogEntry.from_document({"name": name, "probability": weight}) for name, weight in weights.items())
+
+def test_simulated_frequencies_fall_inside_confidence_intervals():
+    result = simulate(make_catalog(Pino=70, Roble=20, Cerezo=10), draws=200_000, seed=5)
+
+    for template in result["templates"]:
+        assert template["ci_low"] <= template["expected_frequency"] <= template["ci_high"]
+    assert result["templates"][0]["expected_pomodoros"] == 1 / 0.7
+
+def test_expected_time_to_collect_all_matches_closed_form():
+    # Con n tipos equiprobables es n·H(n)
+    assert abs(expected_pomodoros_to_collect_all(np.full(4, 0.25)) - 4 * (1 + 1/2 + 1/3 + 1/4)) < 1e-6
+
+def test_proposed_probabilities_do_not_change_the_catalog():
+    catalog = make_catalog(Pino=50, Roble=50)
+    proposed = with_probabilities(catalog, {"Roble": 0})
+
+    result = simulate(proposed, draws=1000, seed=1)
+    assert result["uncollectable"] == ["Roble"]
+    assert result["templates"][1]["count"] == 0
+    assert catalog.entries[1].probability == 50
+
+def test_non_finite_or_negative_probabilities_are_rejected():
+    catalog = make_catalog(Pino=50, Roble=50)
+    for value in (float("nan"), float("inf"), -1.0):
+        with pytest.raises(ValueError):
+            with_probabilities(catalog, {"Pino": value})
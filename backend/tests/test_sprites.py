@@ -0,0 +1,33 @@
+import hashlib
+import os
+from PIL import Image
+from app import sprites
+
+def save_image(path, size, color):
+    Image.new("RGBA", size, color).save(path, format="PNG")
+
+def test_atlas_packs_local_and_cached_images(tmp_path, monkeypatch):
+    monkeypatch.setattr(sprites, "FRONTEND_DIR", str(tmp_path / "frontend"))
+    monkeypatch.setattr(sprites, "SPRITE_CACHE_DIR", str(tmp_path / "cache"))
+    os.makedirs(tmp_path / "frontend" / "img")
+    os.makedirs(tmp_path / "cache" / "sources")
+    save_image(tmp_path / "frontend" / "img" / "pino.png", (40, 80), (0, 128, 0, 255))
+    # Una imagen remota ya descargada no se vuelve a pedir al CDN
+    remote = "https://cdn.example/roble.png"
+    save_image(tmp_path / "cache" / "sources" / hashlib.sha1(remote.encode()).hexdigest(), (300, 300), (128, 64, 0, 255))
+
+    atlas = sprites.build_atlas(["/img/pino.png", remote, "/img/no-existe.png"])
+
+    assert (atlas.width, atlas.height) == (2 * sprites.SPRITE_SIZE, sprites.SPRITE_SIZE)
+    assert set(atlas.positions) == {"/img/pino.png", remote}
+    assert atlas.coordinates("/img/no-existe.png") is None
+    with Image.open(tmp_path / "cache" / atlas.name) as image:
+        x, y = atlas.positions[remote]
+        assert image.getpixel((x + sprites.SPRITE_SIZE // 2, y + sprites.SPRITE_SIZE // 2)) == (128, 64, 0, 255)
+    # El mismo contenido genera el mismo nombre (caché inmutable)
+    assert sprites.build_atlas(["/img/pino.png", remote]).name == atlas.name
+
+def test_local_paths_cannot_leave_the_frontend(tmp_path, monkeypatch):
+    monkeypatch.setattr(sprites, "FRONTEND_DIR", str(tmp_path))
+    assert sprites._local_path("/../secret.png") is None
+    assert sprites._local_path("//cdn.example/a.png") is None
@@ -0,0 +1,40 @@
+import json
+from app.tree_templates import parse_template_file, validate_templates
+
+def test_csv_rows_use_default_probability_when_empty():
+    content = "name,category,description,image_url,probability\nHaya, Caducifolios ,d,i,\nAbeto,Coníferas,d,i,7\n".encode()
+    templates, errors = validate_templates(parse_template_file("plantillas.csv", content))
+
+    assert errors == []
+    assert templates[0]["category"] == "Caducifolios"
+    assert templates[0]["probability"] == 20.0
+    assert templates[1]["probability"] == 7.0
+
+def test_invalid_rows_are_reported_with_their_position():
+    rows = [
+        {"name": "Pino", "category": "c", "description": "d", "image_url": "i"},
+        {"name": "Pino", "category": "c", "description": "d", "image_url": "i"},
+        {"name": "Roble"}
+    ]
+    templates, errors = validate_templates(parse_template_file("plantillas.json", json.dumps({"templates": rows}).encode()))
+
+    assert [template["name"] for template in templates] == ["Pino"]
+    assert [error["row"] for error in errors] == [2, 3]
+
+def test_non_finite_probabilities_are_rejected():
+    rows = [
+        {"name": "Pino", "category": "c", "description": "d", "image_url": "i", "probability": float("nan")},
+        {"name": "Roble", "category": "c", "description": "d", "image_url": "i", "probability": float("inf")},
+        {"name": "Haya", "category": "c", "description": "d", "image_url": "i", "probability": 5}
+    ]
+    templates, errors = validate_templates(parse_template_file("plantillas.json", json.dumps(rows).encode()))
+
+    assert [template["name"] for template in templates] == ["Haya"]
+    assert [error["row"] for error in errors] == [1, 2]
+
+def test_non_finite_probabilities_in_csv_are_rejected():
+    content = "name,category,description,image_url,probability\nPino,c,d,i,nan\nRoble,c,d,i,-inf\n".encode()
+    templates, errors = validate_templates(parse_template_file("plantillas.csv", content))
+
+    assert templates == []
+    assert [error["row"] for error in errors] == [1, 2]
@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app import repository
+from tests.fakes import FakeAsyncDatabase
+
+class Clock(datetime):
+    """Reloj que avanza un segundo en cada lectura: dos reconstrucciones nunca comparten refreshed_at"""
+    current = datetime(2024, 1, 1)
+
+    @classmethod
+    def utcnow(cls):
+        cls.current += timedelta(seconds=1)
+        return cls.current
+
+def use_db(monkeypatch):
+    db = FakeAsyncDatabase()
+    monkeypatch.setattr(repository, "get_async_db", lambda: db)
+    monkeypatch.setattr(repository, "datetime", Clock)
+    return db
+
+def tree(name, is_template=False, **fields):
+    return {"_id": ObjectId(), "name": name, "category": "c", "description": "d", "image_url": "i",
+            "is_template": is_template, **fields}
+
+def catalog_names(db):
+    return sorted((entry["name"], entry["is_template"]) for entry in db.sync.tree_catalog.find())
+
+def test_without_templates_the_catalog_has_one_tree_per_name(monkeypatch):
+    db = use_db(monkeypatch)
+    db.sync.trees.insert_many([tree("Pino"), tree("Pino"), tree("Roble")])
+
+    asyncio.run(repository.refresh_tree_catalog())
+    assert catalog_names(db) == [("Pino", False), ("Roble", False)]
+
+    # Un nombre que ya no existe desaparece en la siguiente reconstrucción
+    db.sync.trees.delete_many({"name": "Roble"})
+    asyncio.run(repository.refresh_tree_catalog())
+    assert catalog_names(db) == [("Pino", False)]
+
+def test_templates_replace_the_fallback_and_deleted_templates_are_removed(monkeypatch):
+    db = use_db(monkeypatch)
+    db.sync.trees.insert_many([tree("Pino"), tree("Roble")])
+    asyncio.run(repository.refresh_tree_catalog())
+
+    cedro = tree("Cedro", is_template=True, probability=5)
+    haya = tree("Haya", is_template=True, probability=5)
+    db.sync.trees.insert_many([cedro, haya])
+    asyncio.run(repository.refresh_tree_catalog([cedro["_id"]]))
+    assert catalog_names(db) == [("Cedro", True)]
+
+    asyncio.run(repository.refresh_tree_catalog())
+    assert catalog_names(db) == [("Cedro", True), ("Haya", True)]
+
+    # Plantilla editada y plantilla borrada, con una actualización parcial
+    db.sync.trees.update_one({"_id": cedro["_id"]}, {"$set": {"description": "nueva"}})
+    db.sync.trees.delete_many({"_id": haya["_id"]})
+    asyncio.run(repository.refresh_tree_catalog([cedro["_id"], haya["_id"]]))
+    assert catalog_names(db) == [("Cedro", True)]
+    assert db.sync.tree_catalog.find_one({"_id": cedro["_id"]})["description"] == "nueva"
+
+def test_full_refresh_keeps_entries_written_by_a_concurrent_partial_refresh(monkeypatch):
+    db = use_db(monkeypatch)
+    db.sync.trees.insert_one(tree("Pino", is_template=True))
+    created = tree("Cedro", is_template=True)
+    aggregate = db.sync.trees.aggregate
+
+    def aggregate_then_publish(pipeline, **kwargs):
+        # Justo después de que la reconstrucción completa copie las plantillas,
+        # un administrador crea otra y su actualización parcial la publica con
+        # un refreshed_at distinto
+        result = aggregate(pipeline, **kwargs)
+        if not db.sync.trees.find_one({"_id": created["_id"]}):
+            db.sync.trees.insert_one(created)
+            db.sync.tree_catalog.insert_one({**created, "refreshed_at": datetime(2000, 1, 1)})
+        return result
+    monkeypatch.setattr(db.sync.trees, "aggregate", aggregate_then_publish)
+
+    asyncio.run(repository.refresh_tree_catalog())
+    assert catalog_names(db) == [("Cedro", True), ("Pino", True)]
@@ -0,0 +1,47 @@
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app import repository, trees
+from tests.fakes import FakeAsyncDatabase
+
+def use_db(monkeypatch):
+    db = FakeAsyncDatabase()
+    monkeypatch.setattr(repository, "get_async_db", lambda: db)
+    return db
+
+def test_cursor_round_trip_and_invalid_cursors():
+    tree = {"_id": ObjectId(), "created_at": datetime(2024, 5, 1, 12, 30, 15, 123000)}
+    cursor = repository.encode_tree_cursor(tree)
+
+    assert repository.decode_tree_cursor(cursor) == (tree["created_at"], tree["_id"])
+    assert repository.decode_tree_cursor("no-es-un-cursor") is None
+    assert repository.decode_tree_cursor(repository.encode_tree_cursor({**tree, "_id": "x"})) is None
+
+def test_pages_follow_next_cursor_without_gaps_or_repeats(monkeypatch):
+    db = use_db(monkeypatch)
+    user_id = ObjectId()
+    start = datetime(2024, 1, 1)
+    # Varios árboles comparten created_at: el _id desempata
+    documents = [
+        {"_id": ObjectId(), "user_id": user_id, "created_at": start + timedelta(seconds=i // 3),
+         "name": f"Árbol {i}", "category": "c", "description": "d", "image_url": "i"}
+        for i in range(10)
+    ]
+    db.sync.user_trees.insert_many(documents)
+    db.sync.user_trees.insert_one({"_id": ObjectId(), "user_id": ObjectId(), "created_at": start, "name": "Ajeno"})
+
+    async def get_page(cursor):
+        return await trees.get_trees(limit=4, cursor=cursor, archived=False, current_user={"id": str(user_id)})
+
+    pages = []
+    cursor = None
+    while True:
+        page = asyncio.run(get_page(cursor))
+        pages.append([tree["name"] for tree in page["trees"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    expected = [tree["name"] for tree in sorted(documents, key=lambda tree: (tree["created_at"], tree["_id"]), reverse=True)]
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert sum(pages, []) == expected
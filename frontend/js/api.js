@@ -171,23 +171,42 @@ const api = {
      * Función para obtener la lista de árboles del usuario
      */async getTrees() {
         try {
-            const response = await this.fetchAPI('/trees');
-            console.log("Respuesta de API trees:", response);
+            // Primero los árboles recientes y después los del archivo en frío
+            const trees = await this.getTreePages('/trees');
+            const archived = await this.getTreePages('/trees?archived=true');
+            return trees.concat(archived);
+        } catch (error) {
+            console.error("Error en getTrees:", error);
+            return []; // Devuelve un array vacío en caso de error
+        }
+    },
+    /**
+     * Recorre todas las páginas de un listado de árboles siguiendo next_cursor
+     */
+    async getTreePages(baseEndpoint) {
+        const trees = [];
+        const separator = baseEndpoint.includes('?') ? '&' : '?';
+        let cursor = null;
+        
+        do {
+            const endpoint = cursor ? `${baseEndpoint}${separator}cursor=${encodeURIComponent(cursor)}` : baseEndpoint;
+            const response = await this.fetchAPI(endpoint);
+            console.log(`Respuesta de API ${baseEndpoint}:`, response);
             
             // Verifica si la respuesta contiene un arreglo directamente o dentro de un objeto
             if (Array.isArray(response)) {
                 return response;
             } else if (response && Array.isArray(response.trees)) {
-                return response.trees;
+                trees.push(...response.trees);
+                cursor = response.next_cursor;
+            } else {
+                // Si no se encontró un arreglo, devuelve lo obtenido hasta ahora
+                console.warn("Formato de respuesta inesperado");
+                cursor = null;
             }
-            
-            // Si no se encontró un arreglo, devuelve un arreglo vacío
-            console.warn("Formato de respuesta inesperado, se devuelve array vacío");
-            return [];
-        } catch (error) {
-            console.error("Error en getTrees:", error);
-            return []; // Devuelve un array vacío en caso de error
-        }
+        } while (cursor);
+        
+        return trees;
     },    /**
      * Función para eliminar un árbol
      */    async deleteTree(treeId) {
@@ -282,6 +301,28 @@ const api = {
             console.error("Error al obtener tipos de árboles:", error);
             return []; // En caso de error, devuelve un array vacío
         }
+    },
+    
+    /**
+     * Posiciones de las imágenes del catálogo en el atlas de sprites, por image_url.
+     * Se piden una sola vez por página; las imágenes sin posición se cargan con su image_url.
+     */
+    getTreeSprites() {
+        if (!this._treeSprites) {
+            this._treeSprites = this.getTreeTypes().then(treeTypes => {
+                const sprites = {};
+                (Array.isArray(treeTypes) ? treeTypes : []).forEach(treeType => {
+                    if (treeType.sprite) {
+                        sprites[treeType.image_url] = {
+                            ...treeType.sprite,
+                            url: buildApiPath(treeType.sprite.url.replace(/^\/api\//, ''))
+                        };
+                    }
+                });
+                return sprites;
+            });
+        }
+        return this._treeSprites;
     },/**
      * Función para obtener información del usuario actual
      */    async getCurrentUser() {
@@ -1,10 +1,26 @@
+/**
+ * Imagen de un árbol: un recorte del atlas de sprites si la imagen está en él
+ * (una sola descarga para todo el inventario) o la image_url original si no
+ */
+function treeImageHtml(tree, sprite) {
+    if (!sprite) {
+        return `<img src="${tree.image_url}" alt="${tree.name}" class="tree-image">`;
+    }
+    const columns = sprite.atlas_width / sprite.width;
+    const rows = sprite.atlas_height / sprite.height;
+    const left = columns > 1 ? (sprite.x / sprite.width) / (columns - 1) * 100 : 0;
+    const top = rows > 1 ? (sprite.y / sprite.height) / (rows - 1) * 100 : 0;
+    return `<div role="img" aria-label="${tree.name}" class="tree-image tree-sprite"
+                 style="background-image: url('${sprite.url}'); background-size: ${columns * 100}% ${rows * 100}%; background-position: ${left}% ${top}%;"></div>`;
+}
+
 /**
  * Carga y muestra el inventario de árboles del usuario
  */
 async function loadInventory() {
     try {
-        // Obtener la lista de árboles
-        const trees = await api.getTrees();
+        // Obtener la lista de árboles y el atlas de imágenes del catálogo
+        const [trees, sprites] = await Promise.all([api.getTrees(), api.getTreeSprites()]);
         console.log("Árboles recuperados:", trees);
         
         // Obtener el contenedor de inventario
@@ -51,7 +67,7 @@ async function loadInventory() {
             treeCard.innerHTML = `
                 <div class="tree-card">
                     <div class="tree-image-container">
-                        <img src="${tree.image_url}" alt="${tree.name}" class="tree-image">
+                        ${treeImageHtml(tree, sprites[tree.image_url])}
                         <div class="tree-badge">
                             <span class="badge">${tree.category}</span>
                         </div>
@@ -59,6 +75,12 @@ async function loadInventory() {
                     <div class="tree-content">
                         <h3 class="tree-name">${tree.name} #${treeNumber}</h3>
                         <p class="tree-description">${tree.description}</p>
+                        ${tree.archived ? `
+                        <div class="tree-actions mt-3">
+                            <span class="badge bg-secondary" title="Los árboles archivados son de solo lectura">
+                                <i class="bi bi-archive-fill"></i> Archivado
+                            </span>
+                        </div>` : `
                         <div class="tree-actions mt-3">
                             <button class="btn btn-sm btn-outline-success me-2" onclick="editDescription('${treeId}', '${tree.name}', '${tree.category}', '${tree.image_url}', '${tree.description.replace(/'/g, "\\'")}')">
                                 <i class="bi bi-pencil-fill"></i> Personalizar
@@ -66,7 +88,7 @@ async function loadInventory() {
                             <button class="btn btn-sm btn-outline-danger" onclick="confirmDeleteTree('${treeId}', '${tree.name} #${treeNumber}')">
                                 <i class="bi bi-trash-fill"></i> Eliminar
                             </button>
-                        </div>
+                        </div>`}
                     </div>
                 </div>
             `;
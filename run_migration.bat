@@ -1,5 +1,7 @@
 @echo off
 echo Ejecutando script de migración para árboles...
 python -m backend.migration_tree_templates
+python -m backend.migration_user_trees
+python -m backend.migration_compact_inventory
 echo Migración completada!
 pause